@@ -101,11 +101,118 @@ def create_app(config_class=Config):
     # Import messaging events to register socket handlers
     from . import messaging_events
 
+    # Load the NLP pipeline once so requests never pay for it
+    try:
+        from .utils.nlp_processor import NLPProcessor
+        NLPProcessor.warm_up()
+    except Exception as exc:
+        app.logger.error(f'Failed to load NLP resources: {exc}')
+
+    # Load sector geometry once so ride creation never reads the data file
+    try:
+        from .utils.sector_index import SectorIndex
+        SectorIndex.load_default(app.config.get('SECTOR_DATA_FILE'))
+    except Exception as exc:
+        app.logger.error(f'Failed to load sector geometry: {exc}')
+
+    # Load the compiled road network once so distance and fare queries never read the data file;
+    # it is built ahead of a deploy by migrations/road_graph.py, never here
+    try:
+        from .utils.road_graph import RoadGraph
+        from .utils.routing import Routing
+        Routing.configure(app.config)
+        RoadGraph.load_default(Routing.GRAPH_FILE)
+    except Exception as exc:
+        app.logger.error(f'Failed to load road graph: {exc}')
+
+    # Apply ride settings
+    try:
+        from .models.ride import Ride
+        from .models.pickup_geofence import PickupGeofence
+        Ride.configure(app.config)
+        PickupGeofence.configure(app.config)
+        Ride.ensure_indexes()
+    except Exception as exc:
+        app.logger.error(f'Failed to configure rides: {exc}')
+
+    # Apply driver trail settings
+    try:
+        from .models.ride_trail import RideTrail
+        RideTrail.configure(app.config)
+        RideTrail.ensure_indexes()
+    except Exception as exc:
+        app.logger.error(f'Failed to configure ride trails: {exc}')
+
+    # Apply dispatch settings
+    try:
+        from .models.dispatch import Dispatch
+        Dispatch.configure(app.config)
+        Dispatch.ensure_indexes()
+    except Exception as exc:
+        app.logger.error(f'Failed to configure dispatch: {exc}')
+
+    # Ensure indexes used by the matching engine
+    try:
+        from .models.match import Match
+        from .models.match_job import MatchJob
+        Match.configure(app.config)
+        Match.ensure_indexes()
+        MatchJob.ensure_indexes()
+    except Exception as exc:
+        app.logger.error(f'Failed to create match indexes: {exc}')
+
     # Start periodic interest updater in background
     try:
         from .tasks.interest_updater import start_interest_updater
-        start_interest_updater()
+        start_interest_updater(full_recompute_days=app.config.get('MATCH_FULL_RECOMPUTE_DAYS', 7))
     except Exception as exc:
         app.logger.error(f'Failed to start interest updater: {exc}')
 
+    # Start incremental match maintenance in background
+    try:
+        from .tasks.match_maintainer import start_match_maintainer
+        start_match_maintainer()
+    except Exception as exc:
+        app.logger.error(f'Failed to start match maintainer: {exc}')
+
+    # Start match job workers in background
+    try:
+        from .tasks.match_jobs import start_match_job_workers
+        start_match_job_workers(workers=app.config.get('MATCH_JOB_WORKERS', 2))
+    except Exception as exc:
+        app.logger.error(f'Failed to start match job workers: {exc}')
+
+    # Load and periodically reconcile the in-memory ride index and pickup geofences
+    try:
+        from .tasks.ride_index_reconciler import start_ride_index_reconciler
+        start_ride_index_reconciler(interval_seconds=app.config.get('RIDE_INDEX_RECONCILE_SECONDS', 30))
+    except Exception as exc:
+        app.logger.error(f'Failed to start ride index reconciler: {exc}')
+
+    # Start batched persistence of driver locations in background
+    try:
+        from .tasks.location_flusher import start_location_flusher
+        start_location_flusher(interval_seconds=app.config.get('DRIVER_LOCATION_FLUSH_SECONDS', 2))
+    except Exception as exc:
+        app.logger.error(f'Failed to start driver location flusher: {exc}')
+
+    # Build and hot-reload learned ETA tables in background
+    try:
+        from .models.eta_profile import EtaProfile
+        from .tasks.eta_profiles import start_eta_profiles
+        EtaProfile.configure(app.config)
+        start_eta_profiles(
+            rebuild_hours=app.config.get('ETA_REBUILD_HOURS', 6),
+            reload_seconds=app.config.get('ETA_RELOAD_SECONDS', 60)
+        )
+    except Exception as exc:
+        app.logger.error(f'Failed to start ETA profiles: {exc}')
+
+    # Start batched dispatch windows in background
+    try:
+        from .tasks.dispatcher import start_dispatcher
+        start_dispatcher(window_seconds=app.config.get('DISPATCH_WINDOW_SECONDS', 3))
+    except Exception as exc:
+        app.logger.error(f'Failed to start dispatcher: {exc}')
+
     return app
@@ -24,6 +24,77 @@ class Config:
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max file size
 
+    # Companion matching: 'exact' scores every keyword-sharing user,
+    # 'lsh' only scores users found through MinHash LSH buckets
+    MATCH_ENGINE = os.environ.get('MATCH_ENGINE') or 'exact'
+    # More bands or fewer rows per band find more true matches but read more candidates.
+    # benchmarks/lsh_recall.py, 3000 users, recall@50 (mean candidates):
+    # 16x2 0.26 (13), 32x2 0.37 (18), 48x1 0.99 (54), 64x1 0.996 (55), 96x1 1.0 (55)
+    MATCH_LSH_BANDS = int(os.environ.get('MATCH_LSH_BANDS') or 64)
+    MATCH_LSH_ROWS = int(os.environ.get('MATCH_LSH_ROWS') or 1)
+
+    # Only score users who share at least one hobby category with the user
+    MATCH_CATEGORY_PREFILTER = (os.environ.get('MATCH_CATEGORY_PREFILTER') or 'true').lower() == 'true'
+
+    # Companion lists older than this are served but refreshed in the background
+    MATCH_FRESH_MINUTES = int(os.environ.get('MATCH_FRESH_MINUTES') or 60)
+
+    # Sector outlines (GeoJSON); defaults to app/data/sectors.geojson
+    SECTOR_DATA_FILE = os.environ.get('SECTOR_DATA_FILE')
+
+    # Time budget for local search when ordering a ride's pickups
+    ROUTE_OPTIMIZER_BUDGET_MS = int(os.environ.get('ROUTE_OPTIMIZER_BUDGET_MS') or 50)
+
+    # How often each process rebuilds its in-memory ride index from Mongo
+    RIDE_INDEX_RECONCILE_SECONDS = int(os.environ.get('RIDE_INDEX_RECONCILE_SECONDS') or 30)
+
+    # How often buffered driver positions are written to Mongo
+    DRIVER_LOCATION_FLUSH_SECONDS = float(os.environ.get('DRIVER_LOCATION_FLUSH_SECONDS') or 2)
+
+    # Learned ETA tables: days of ride_history used, rebuild period and reload polling
+    ETA_HISTORY_DAYS = int(os.environ.get('ETA_HISTORY_DAYS') or 90)
+    ETA_REBUILD_HOURS = float(os.environ.get('ETA_REBUILD_HOURS') or 6)
+    ETA_RELOAD_SECONDS = int(os.environ.get('ETA_RELOAD_SECONDS') or 60)
+
+    # Batched dispatch: window length, how long an intent waits, and assignment limits
+    DISPATCH_WINDOW_SECONDS = float(os.environ.get('DISPATCH_WINDOW_SECONDS') or 3)
+    DISPATCH_INTENT_TTL_SECONDS = int(os.environ.get('DISPATCH_INTENT_TTL_SECONDS') or 120)
+    DISPATCH_MAX_PICKUP_KM = float(os.environ.get('DISPATCH_MAX_PICKUP_KM') or 3)
+    DISPATCH_MAX_DETOUR_KM = float(os.environ.get('DISPATCH_MAX_DETOUR_KM') or 5)
+
+    # Road network for distances and fares: an OSM extract (.osm/.osm.gz/.osm.bz2) compiled
+    # with python -m migrations.road_graph, or the .npz it wrote; without one, distances
+    # are straight lines
+    ROAD_GRAPH_FILE = os.environ.get('ROAD_GRAPH_FILE')
+    ROUTE_CACHE_CELL_METRES = float(os.environ.get('ROUTE_CACHE_CELL_METRES') or 150)
+    ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE') or 200000)
+    ROUTE_MAX_SNAP_METRES = float(os.environ.get('ROUTE_MAX_SNAP_METRES') or 500)
+
+    # Fares in rupees: base plus per-km rate, never below the minimum, scaled by car type
+    FARE_BASE = float(os.environ.get('FARE_BASE') or 50)
+    FARE_PER_KM = float(os.environ.get('FARE_PER_KM') or 25)
+    FARE_MINIMUM = float(os.environ.get('FARE_MINIMUM') or 50)
+
+    # Limits on what one join may add to a ride's route; JOIN_DETOUR_POLICY is 'reject' or 'flag'
+    JOIN_MAX_ADDED_KM = float(os.environ.get('JOIN_MAX_ADDED_KM') or 3)
+    JOIN_MAX_ADDED_MINUTES = float(os.environ.get('JOIN_MAX_ADDED_MINUTES') or 10)
+    JOIN_DETOUR_POLICY = os.environ.get('JOIN_DETOUR_POLICY') or 'reject'
+
+    # Distance from a pickup at which the driver counts as arrived
+    PICKUP_ARRIVAL_RADIUS_METRES = float(os.environ.get('PICKUP_ARRIVAL_RADIUS_METRES') or 75)
+
+    # Driver trails: raw pings are kept this many days unless the ride's trail is compressed
+    # sooner; compression drops points within TRAIL_SIMPLIFY_METRES of the kept path
+    TRAIL_SIMPLIFY_METRES = float(os.environ.get('TRAIL_SIMPLIFY_METRES') or 10)
+    TRAIL_RAW_TTL_DAYS = float(os.environ.get('TRAIL_RAW_TTL_DAYS') or 7)
+    TRAIL_FINALIZE_DELAY_SECONDS = float(os.environ.get('TRAIL_FINALIZE_DELAY_SECONDS') or 30)
+
+    # Days between full rebuilds of every stored match list; 0 leaves it to migrations.recompute_matches
+    MATCH_FULL_RECOMPUTE_DAYS = float(os.environ.get('MATCH_FULL_RECOMPUTE_DAYS') or 7)
+
+    # Threads per process consuming the match_jobs queue
+    MATCH_JOB_WORKERS = int(os.environ.get('MATCH_JOB_WORKERS') or 2)
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
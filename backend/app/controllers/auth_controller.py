@@ -3,6 +3,7 @@ from flask import jsonify, request
 from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity
 from ..models.user import User
 from ..models.match import Match
+from ..models.match_job import MatchJob
 from ..schemas.auth_schema import RegisterSchema, LoginSchema, ProfileSchema
 from ..utils.security import SecurityUtils
 from marshmallow import ValidationError
@@ -77,15 +78,10 @@ class AuthController:
             # Create user profile
             profile_id = User.create_profile(user_id, data)
             
-            # Process hobbies for matching
+            # Process hobbies and compute initial matches in the background
             description = data.get('likes', '') + ' ' + data.get('dislikes', '')
             if description.strip():
-                keywords = Match.store_hobbies(user_id, description)
-                
-                # Only compute matches if we have keywords to match on
-                if keywords and len(keywords) > 0:
-                    # Compute initial matches
-                    Match.compute_matches(user_id)
+                MatchJob.enqueue(user_id, description)
             
             return jsonify({
                 'message': 'Profile created successfully',
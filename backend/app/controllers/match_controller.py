@@ -2,8 +2,8 @@
 from flask import jsonify, request
 from flask_jwt_extended import get_jwt_identity
 from ..models.match import Match
+from ..models.match_job import MatchJob
 from ..models.user import User
-from ..utils.nlp_processor import NLPProcessor
 from marshmallow import Schema, fields, ValidationError
 from .. import mongo
 import logging
@@ -28,18 +28,23 @@ class MatchController:
                 return jsonify({'error': 'User not found'}), 404
                 
             # Get the best matches for the user
-            matches = Match.get_best_matches(user_id)
+            matches, fresh = Match.get_best_matches_with_freshness(user_id)
+            status = 'fresh' if fresh else 'stale'
             
-            # If no matches found, compute them now
             if not matches:
                 # Get user hobbies
-                hobbies = mongo.db.user_hobbies.find_one({'user_id': user_id})
-                if hobbies and 'extracted_keywords' in hobbies and hobbies['extracted_keywords']:
-                    # Compute matches if we have hobbies data
-                    matches = Match.compute_matches(user_id)
-                else:
+                hobbies = mongo.db.user_hobbies.find_one({'user_id': user_id}, {'keyword_ids': 1})
+                if not (hobbies and hobbies.get('keyword_ids')):
                     # Return empty list if no hobby data to match on
                     return jsonify([]), 200
+
+                # Answer from the popular-interest pool while the full list is computed
+                matches = Match.quick_matches(user_id)
+                status = 'partial'
+
+            # Stale or missing lists are served as-is and recomputed in the background
+            if not fresh:
+                MatchJob.schedule_refresh(user_id)
             
             # Enhance with user details
             enhanced_matches = []
@@ -59,7 +64,9 @@ class MatchController:
                     }
                     enhanced_matches.append(enhanced_match)
             
-            return jsonify(enhanced_matches), 200
+            response = jsonify(enhanced_matches)
+            response.headers['X-Matches-Status'] = status
+            return response, 200
             
         except Exception as e:
             logger.error(f"Error getting companions: {str(e)}")
@@ -90,25 +97,41 @@ class MatchController:
             if not description or not description.strip():
                 return jsonify({'error': 'Description cannot be empty'}), 400
             
-            # Process and store hobbies
-            keywords = Match.store_hobbies(user_id, description)
-            categories = NLPProcessor.categorize_keywords(keywords)
-            
-            if not keywords or len(keywords) == 0:
-                return jsonify({
-                    'message': 'No keywords extracted from description',
-                    'keywords': []
-                }), 200
-            
-            # Compute matches
-            Match.compute_matches(user_id)
+            # Extraction and matching run in the background job queue
+            job = MatchJob.enqueue(user_id, description)
 
             return jsonify({
-                'message': 'Hobbies processed successfully',
-                'keywords': keywords,
-                'categories': categories
-            }), 200
+                'message': 'Hobbies queued for processing',
+                'job_id': str(job['_id']),
+                'status': job.get('status')
+            }), 202
             
         except Exception as e:
             logger.error(f"Error processing hobbies: {str(e)}")
-            return jsonify({'error': 'Failed to process hobbies', 'details': str(e)}), 500
\ No newline at end of file
+            return jsonify({'error': 'Failed to process hobbies', 'details': str(e)}), 500
+
+    @staticmethod
+    def get_match_status():
+        try:
+            user_id = get_jwt_identity()
+
+            job = MatchJob.get_latest(user_id)
+            if not job:
+                return jsonify({'status': 'none'}), 200
+
+            result = job.get('result') or {}
+            return jsonify({
+                'job_id': str(job['_id']),
+                'status': job.get('status'),
+                'submissions': job.get('submissions', 1),
+                'requested_at': job['requested_at'].isoformat() if job.get('requested_at') else None,
+                'started_at': job['started_at'].isoformat() if job.get('started_at') else None,
+                'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None,
+                'keywords': result.get('keywords', []),
+                'match_count': result.get('match_count', 0),
+                'error': job.get('error')
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error getting match status: {str(e)}")
+            return jsonify({'error': 'Failed to get match status', 'details': str(e)}), 500
@@ -3,11 +3,16 @@ from flask import jsonify, request
 from flask_jwt_extended import get_jwt_identity
 from ..models.ride import Ride
 from ..models.user import User
-from ..schemas.ride_schema import CreateRideSchema, JoinRideSchema, ArrivalStatusSchema, RideStatusSchema
+from ..models.driver_location import DriverLocation
+from ..models.pickup_geofence import PickupGeofence
+from ..models.dispatch import Dispatch
+from ..schemas.ride_schema import CreateRideSchema, JoinRideSchema, ArrivalStatusSchema, RideStatusSchema, DriverLocationSchema, JoinIntentSchema, RideQuoteSchema
 from ..utils.geo_utils import GeoUtils
+from ..utils.geo_point import Point
+from ..utils.routing import Routing
 from marshmallow import ValidationError
 from bson import ObjectId
-from .. import mongo
+from .. import mongo, socketio
 import logging
 
 # Configure logging
@@ -34,25 +39,56 @@ class RideController:
             # Add user ID to the data
             validated_data['creator_user_id'] = user_id
             
-            # Add sector information if not provided
-            if not validated_data.get('sector') and 'pickup_location' in validated_data:
+            # Derive the sector from the pickup point; the client's guess is only a fallback
+            if 'pickup_location' in validated_data:
                 pickup_coords = validated_data['pickup_location'].get('coordinates', {})
                 if pickup_coords:
                     sector = GeoUtils.get_sector_from_coordinates(pickup_coords)
-                    validated_data['sector'] = sector
+                    if sector != 'unknown' or not validated_data.get('sector'):
+                        validated_data['sector'] = sector
+
+            # Distance and fare come from the road network, not the client
+            quote = Routing.quote(validated_data['pickup_location'], validated_data['dropoff_location'],
+                                  validated_data['car_type'])
+            validated_data['distance'] = quote['distance_km']
+            validated_data['fare'] = quote['fare']
+            validated_data['estimated_minutes'] = quote['minutes']
             
             # Create the ride
             ride_id = Ride.create(validated_data)
             
             return jsonify({
                 'message': 'Ride created successfully',
-                'ride_id': ride_id
+                'ride_id': ride_id,
+                'distance': validated_data['distance'],
+                'fare': validated_data['fare']
             }), 201
             
         except Exception as e:
             logger.error(f"Error creating ride: {str(e)}")
             return jsonify({'error': 'Failed to create ride', 'details': str(e)}), 500
     
+    @staticmethod
+    def quote_ride():
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        schema = RideQuoteSchema()
+        try:
+            validated = schema.load(data)
+        except ValidationError as err:
+            return jsonify({'error': 'Validation error', 'details': err.messages}), 400
+
+        quote = Routing.quote(validated['pickup_location'], validated['dropoff_location'], validated['car_type'])
+        return jsonify({
+            'distance': quote['distance_km'],
+            'estimated_minutes': quote['minutes'],
+            'fare': quote['fare'],
+            'car_type': validated['car_type'],
+            'source': quote['source']
+        }), 200
+
     @staticmethod
     def get_available_rides():
         sector = request.args.get('sector', '')
@@ -87,6 +123,62 @@ class RideController:
         
         return jsonify(enhanced_rides), 200
     
+    @staticmethod
+    def get_nearby_rides():
+        try:
+            lat = float(request.args.get('lat'))
+            lng = float(request.args.get('lng'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'lat and lng query params required'}), 400
+
+        try:
+            radius = float(request.args.get('radius', 5))
+            limit = int(request.args.get('limit', 20))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'radius, limit and offset must be numbers'}), 400
+
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({'error': 'lat/lng out of range'}), 400
+
+        # Radius is in kilometres, like every other distance the API returns
+        radius = min(max(radius, 0), 50)
+        limit = min(max(limit, 1), 100)
+        offset = max(offset, 0)
+
+        try:
+            # One extra row tells us whether another page exists
+            rides = Ride.get_nearby_rides(lat, lng, radius, limit + 1, offset)
+        except Exception as e:
+            logger.error(f"Error finding nearby rides: {str(e)}")
+            return jsonify({'error': 'Failed to find nearby rides', 'details': str(e)}), 500
+
+        has_more = len(rides) > limit
+        rides = rides[:limit]
+
+        # Fetch ride details and creators in two queries instead of two per ride
+        ride_ids = [ObjectId(r['ride_id']) for r in rides if ObjectId.is_valid(r.get('ride_id'))]
+        details = {str(r['_id']): r for r in mongo.db.rides.find({'_id': {'$in': ride_ids}}, {'fare': 1, 'distance': 1})}
+        creator_ids = [ObjectId(r['creator_user_id']) for r in rides if ObjectId.is_valid(r.get('creator_user_id'))]
+        creators = {str(u['_id']): u.get('name') for u in mongo.db.users.find({'_id': {'$in': creator_ids}}, {'name': 1})}
+
+        results = []
+        for ride in rides:
+            ride_details = details.get(ride.get('ride_id'), {})
+            ride['_id'] = str(ride.get('_id'))
+            ride['creator_name'] = creators.get(ride.get('creator_user_id'), 'Unknown Driver')
+            ride['fare'] = ride_details.get('fare')
+            ride['distance'] = ride_details.get('distance')
+            ride['distance_km'] = round(ride.pop('distance_m', 0) / 1000, 2)
+            results.append(ride)
+
+        return jsonify({
+            'rides': results,
+            'offset': offset,
+            'limit': limit,
+            'next_offset': offset + limit if has_more else None
+        }), 200
+
     @staticmethod
     def join_ride():
         try:
@@ -122,19 +214,88 @@ class RideController:
             available_ride = mongo.db.available_rides.find_one({'ride_id': ride_id})
             if available_ride and available_ride.get('passenger_slots', 0) < seat_count:
                 return jsonify({'error': 'Not enough seats available'}), 400
+
+            # Price the new pickup against everyone already on the ride
+            insertion = Ride.plan_insertion(ride, pickup_location)
+            flagged = Ride.detour_exceeded(insertion)
+            if flagged and Ride.JOIN_DETOUR_POLICY == 'reject':
+                return jsonify({
+                    'error': 'Pickup is too far out of the way for this ride',
+                    'added_distance_km': insertion['added_km'],
+                    'added_minutes': insertion['added_minutes']
+                }), 400
             
             # Add the passenger to the ride
-            passenger_id = Ride.join_ride(ride_id, user_id, pickup_location, group_join, seat_count, is_group_leader)
+            passenger_id = Ride.join_ride(ride_id, user_id, pickup_location, group_join, seat_count, is_group_leader,
+                                          insertion)
+            if passenger_id is None:
+                # Taken by a concurrent join or dispatch window since the check above
+                return jsonify({'error': 'Not enough seats available'}), 400
             
-            return jsonify({
+            response = {
                 'message': 'Ride joined successfully',
                 'passenger_id': passenger_id
-            }), 200
+            }
+            if insertion:
+                response['added_distance_km'] = insertion['added_km']
+                response['added_minutes'] = insertion['added_minutes']
+                response['detour_flagged'] = flagged
+            return jsonify(response), 200
             
         except Exception as e:
             logger.error(f"Error joining ride: {str(e)}")
             return jsonify({'error': 'Failed to join ride', 'details': str(e)}), 500
     
+    @staticmethod
+    def submit_join_intent():
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        schema = JoinIntentSchema()
+        try:
+            validated = schema.load(data)
+        except ValidationError as err:
+            return jsonify({'error': 'Validation error', 'details': err.messages}), 400
+
+        user_id = get_jwt_identity()
+        intent = Dispatch.submit(
+            user_id,
+            validated['pickup_location'],
+            validated['seat_count'],
+            validated.get('car_type'),
+            validated['group_join']
+        )
+
+        return jsonify({
+            'message': 'Looking for a ride',
+            'intent_id': str(intent['_id']),
+            'expires_at': intent['expires_at'].isoformat()
+        }), 202
+
+    @staticmethod
+    def get_join_intent():
+        intent = Dispatch.get_latest(get_jwt_identity())
+        if not intent:
+            return jsonify({'error': 'No ride request found'}), 404
+
+        return jsonify({
+            'intent_id': str(intent['_id']),
+            'status': intent.get('status'),
+            'ride_id': intent.get('ride_id'),
+            'passenger_id': intent.get('passenger_id'),
+            'detour_km': intent.get('detour_km'),
+            'seat_count': intent.get('seat_count'),
+            'car_type': intent.get('car_type'),
+            'windows': intent.get('windows', 0)
+        }), 200
+
+    @staticmethod
+    def cancel_join_intent():
+        if not Dispatch.cancel(get_jwt_identity()):
+            return jsonify({'error': 'No pending ride request'}), 404
+        return jsonify({'message': 'Ride request cancelled'}), 200
+
     @staticmethod
     def set_arrival_status():
         data = request.get_json()
@@ -183,7 +344,7 @@ class RideController:
         except (TypeError, ValueError):
             return jsonify({'error': 'lat and lng query params required'}), 400
 
-        route = Ride.get_route_order(ride_id, {'latitude': lat, 'longitude': lng})
+        route = Ride.get_route_order(ride_id, Point(lat, lng))
 
         formatted_route = []
         for p in route:
@@ -248,7 +409,13 @@ class RideController:
         ride_id = validated.get('ride_id')
         location = validated.get('location')
 
-        Ride.update_driver_location(ride_id, location)
+        entry = Ride.update_driver_location(ride_id, location)
+        if not entry:
+            return jsonify({'error': 'Invalid coordinates'}), 400
+
+        socketio.emit('driver_location', DriverLocation.payload(ride_id, entry), room=f"ride_{ride_id}")
+        for arrival in PickupGeofence.check(ride_id, entry['location']):
+            socketio.emit('pickup_arrival', arrival, room=[f"ride_{ride_id}", f"user_{arrival['user_id']}"])
         return jsonify({'message': 'Location updated'}), 200
 
     @staticmethod
@@ -1,10 +1,12 @@
 # /backend/app/controllers/ride_history_controller.py
-from flask import jsonify, request
+from flask import jsonify, request, Response, stream_with_context
 from flask_jwt_extended import get_jwt_identity
 from ..models.ride_history import RideHistory
 from ..models.ride import Ride
+from ..models.ride_trail import RideTrail
 from marshmallow import Schema, fields, ValidationError
 from datetime import datetime
+import json
 import logging
 
 # Configure logging
@@ -111,6 +113,38 @@ class RideHistoryController:
             return jsonify({'error': 'Ride not found'}), 404
         return jsonify(receipt), 200
 
+    @staticmethod
+    def get_ride_trail(ride_id, participants_only=True):
+        """
+        Replay the driver's trail of a ride as newline-delimited JSON points
+
+        Limited to the ride's driver and passengers unless participants_only is
+        False, which the admin review route passes. With ?encoded=1 a finished
+        ride's compressed trail is returned as is instead.
+        """
+        user_id = get_jwt_identity()
+        ride = RideHistory.get_ride_details(ride_id)
+        if not ride:
+            return jsonify({'error': 'Ride not found'}), 404
+
+        if participants_only and ride['driver']['id'] != user_id and not Ride.get_passenger(ride_id, user_id):
+            return jsonify({'error': 'You were not part of this ride'}), 403
+
+        trail = RideTrail.get(ride_id)
+        if request.args.get('encoded') in ('1', 'true'):
+            if trail is None:
+                return jsonify({'error': 'Trail is not compressed yet'}), 404
+            for key in ('started_at', 'ended_at', 'finalized_at'):
+                if trail.get(key):
+                    trail[key] = trail[key].isoformat()
+            return jsonify(trail), 200
+
+        def generate():
+            for when, lat, lng in RideTrail.points(ride_id, trail):
+                yield json.dumps({'latitude': lat, 'longitude': lng, 'timestamp': when.isoformat()}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     @staticmethod
     def reuse_ride(ride_id):
         user_id = get_jwt_identity()
@@ -4,12 +4,20 @@ from flask_jwt_extended import decode_token
 from flask_socketio import emit, join_room, leave_room
 from . import socketio
 from .models.messaging import Message, Conversation
+from .models.driver_location import DriverLocation
+from .models.pickup_geofence import PickupGeofence
+from . import mongo
+from bson import ObjectId
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Store active connections
 active_connections = {}
+# Reverse of active_connections, for per-ping lookups
+connection_users = {}
+# Rides each connection has been verified to drive
+driver_rides = {}
 
 @socketio.on('connect')
 def handle_connect():
@@ -31,6 +39,9 @@ def handle_disconnect():
     if user_id:
         del active_connections[user_id]
 
+    connection_users.pop(request.sid, None)
+    driver_rides.pop(request.sid, None)
+
 @socketio.on('authenticate')
 def handle_authenticate(data):
     """Authenticate user with JWT token"""
@@ -46,6 +57,7 @@ def handle_authenticate(data):
         
         # Store the connection
         active_connections[user_id] = request.sid
+        connection_users[request.sid] = user_id
         
         # Join user to their personal room
         join_room(f"user_{user_id}")
@@ -183,4 +195,82 @@ def handle_typing(data):
         }, room=f"conversation_{conversation_id}", include_self=False)
         
     except Exception as e:
-        logger.error(f'Error handling typing: {str(e)}') 
\ No newline at end of file
+        logger.error(f'Error handling typing: {str(e)}')
+
+def _ride_participant(ride_id, user_id):
+    """Return 'driver', 'passenger' or None for a user's role in an ongoing ride"""
+    if not ObjectId.is_valid(ride_id):
+        return None
+    ride = mongo.db.rides.find_one({'_id': ObjectId(ride_id)}, {'creator_user_id': 1})
+    if not ride:
+        return None
+    if ride.get('creator_user_id') == user_id:
+        return 'driver'
+    if mongo.db.ride_passengers.find_one({'ride_id': ride_id, 'user_id': user_id}, {'_id': 1}):
+        return 'passenger'
+    return None
+
+@socketio.on('join_ride')
+def handle_join_ride(data):
+    """Join a ride room to receive the driver's live location"""
+    try:
+        user_id = connection_users.get(request.sid)
+        if not user_id:
+            emit('error', {'message': 'User not authenticated'})
+            return
+
+        ride_id = data.get('ride_id')
+        role = _ride_participant(ride_id, user_id)
+        if not role:
+            emit('error', {'message': 'Not part of this ride'})
+            return
+
+        if role == 'driver':
+            driver_rides.setdefault(request.sid, set()).add(ride_id)
+
+        join_room(f"ride_{ride_id}")
+        emit('joined_ride', {'ride_id': ride_id, 'role': role})
+
+        # Send the last known position straight away
+        latest = DriverLocation.latest(ride_id)
+        if latest:
+            emit('driver_location', DriverLocation.payload(ride_id, latest))
+
+    except Exception as e:
+        logger.error(f'Error joining ride: {str(e)}')
+        emit('error', {'message': 'Failed to join ride'})
+
+@socketio.on('leave_ride')
+def handle_leave_ride(data):
+    """Stop receiving a ride's live location"""
+    ride_id = data.get('ride_id')
+    if ride_id:
+        leave_room(f"ride_{ride_id}")
+        driver_rides.get(request.sid, set()).discard(ride_id)
+
+@socketio.on('driver_location')
+def handle_driver_location(data):
+    """Handle a GPS ping from a driver who has joined their ride"""
+    try:
+        ride_id = data.get('ride_id')
+        if ride_id not in driver_rides.get(request.sid, ()):
+            emit('error', {'message': 'Join the ride as its driver first'})
+            return
+
+        point = DriverLocation.parse(data.get('location'))
+        if not point:
+            emit('error', {'message': 'Invalid coordinates'})
+            return
+
+        # Kept in memory and fanned out now; Mongo is written by the location flusher
+        entry = DriverLocation.record(ride_id, point)
+        socketio.emit('driver_location', DriverLocation.payload(ride_id, entry),
+                      room=f"ride_{ride_id}", include_self=False)
+
+        # One grid probe per ping; passengers whose pickup was reached are told, driver included
+        for arrival in PickupGeofence.check(ride_id, point):
+            socketio.emit('pickup_arrival', arrival, room=[f"ride_{ride_id}", f"user_{arrival['user_id']}"])
+
+    except Exception as e:
+        logger.error(f'Error handling driver location: {str(e)}')
+        emit('error', {'message': 'Failed to update location'})
@@ -0,0 +1,287 @@
+from .. import mongo
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from ..utils.dispatch_solver import DispatchSolver
+from ..utils.geo_point import Point, PointArray
+from .ride import Ride
+from .ride_index import RideIndex
+from .pickup_geofence import PickupGeofence
+import time
+
+# task_state document holding the dispatcher lease
+LEASE_ID = 'dispatch'
+
+
+class Dispatch:
+    """Join intents collected into short windows and assigned to rides in bulk"""
+
+    SOLVER = DispatchSolver()
+    WINDOW_SECONDS = 3
+    INTENT_TTL = timedelta(seconds=120)
+    # Most intents considered in one window, oldest first
+    MAX_BATCH = 5000
+
+    @staticmethod
+    def configure(config):
+        """Apply dispatch settings from the Flask config"""
+        Dispatch.SOLVER = DispatchSolver(
+            max_pickup_km=config.get('DISPATCH_MAX_PICKUP_KM', 3),
+            max_detour_km=config.get('DISPATCH_MAX_DETOUR_KM', 5)
+        )
+        Dispatch.WINDOW_SECONDS = config.get('DISPATCH_WINDOW_SECONDS', 3)
+        Dispatch.INTENT_TTL = timedelta(seconds=config.get('DISPATCH_INTENT_TTL_SECONDS', 120))
+
+    @staticmethod
+    def ensure_indexes():
+        """At most one pending intent per user; windows read pending intents oldest first"""
+        mongo.db.join_intents.create_index(
+            'user_id',
+            unique=True,
+            partialFilterExpression={'status': 'pending'},
+            name='one_pending_intent_per_user'
+        )
+        mongo.db.join_intents.create_index([('status', 1), ('created_at', 1)])
+        mongo.db.join_intents.create_index([('user_id', 1), ('created_at', -1)])
+
+    @staticmethod
+    def submit(user_id, pickup_location, seat_count=1, car_type=None, group_join=False):
+        """Queue a join intent for the next window, replacing the user's pending one"""
+        now = datetime.utcnow()
+        update = {
+            '$set': {
+                'pickup_location': pickup_location,
+                'seat_count': seat_count,
+                'car_type': car_type,
+                'group_join': group_join,
+                'expires_at': now + Dispatch.INTENT_TTL
+            },
+            '$setOnInsert': {'user_id': user_id, 'status': 'pending', 'windows': 0, 'created_at': now}
+        }
+        try:
+            return mongo.db.join_intents.find_one_and_update(
+                {'user_id': user_id, 'status': 'pending'},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent submission created the pending intent first; fold into it
+            return mongo.db.join_intents.find_one_and_update(
+                {'user_id': user_id, 'status': 'pending'},
+                update,
+                return_document=ReturnDocument.AFTER
+            )
+
+    @staticmethod
+    def get_latest(user_id):
+        """Get the user's most recent intent"""
+        return mongo.db.join_intents.find_one({'user_id': user_id}, sort=[('created_at', -1)])
+
+    @staticmethod
+    def cancel(user_id):
+        """Withdraw the user's pending intent; returns True if there was one"""
+        result = mongo.db.join_intents.update_one(
+            {'user_id': user_id, 'status': 'pending'},
+            {'$set': {'status': 'cancelled', 'finished_at': datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+
+    @staticmethod
+    def _acquire_lease(now):
+        """Only one process solves a window at a time"""
+        try:
+            # Takes an expired lease, or creates the lease document on first use
+            mongo.db.task_state.find_one_and_update(
+                {'_id': LEASE_ID, 'lease_until': {'$lt': now}},
+                {'$set': {'lease_until': now + timedelta(seconds=max(Dispatch.WINDOW_SECONDS * 5, 30))}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease document exists and has not expired
+            return False
+
+    @staticmethod
+    def _release_lease():
+        mongo.db.task_state.update_one({'_id': LEASE_ID}, {'$set': {'lease_until': datetime.min}})
+
+    @staticmethod
+    def _open_rides():
+        """Active rides with a position and free seats"""
+        if RideIndex.ready:
+            rides = RideIndex.by_sector()
+        else:
+            rides = list(mongo.db.available_rides.find(
+                {'active': True},
+                {'ride_id': 1, 'location': 1, 'passenger_slots': 1, 'car_type': 1, 'creator_user_id': 1}
+            ))
+        return [ride for ride in rides if ride.get('passenger_slots', 0) > 0 and Point.parse(ride.get('location'))]
+
+    @staticmethod
+    def run_window(now=None):
+        """Solve every pending intent against the open rides and reserve seats in one bulk write"""
+        now = now or datetime.utcnow()
+        if not Dispatch._acquire_lease(now):
+            return None
+        try:
+            return Dispatch._run_window(now)
+        finally:
+            Dispatch._release_lease()
+
+    @staticmethod
+    def _run_window(now):
+        clock = time.monotonic()
+        expired = mongo.db.join_intents.update_many(
+            {'status': 'pending', 'expires_at': {'$lt': now}},
+            {'$set': {'status': 'unmatched', 'finished_at': now}}
+        ).modified_count
+
+        intents = list(mongo.db.join_intents.find({'status': 'pending'}).sort('created_at', 1).limit(Dispatch.MAX_BATCH))
+        stats = {'intents': len(intents), 'assigned': 0, 'expired': expired, 'rides': 0, 'assignments': []}
+        if not intents:
+            return stats
+
+        rides = Dispatch._open_rides()
+        ride_ids = [ride['ride_id'] for ride in rides]
+        dropoffs = {
+            str(ride['_id']): ride.get('dropoff_location')
+            for ride in mongo.db.rides.find(
+                {'_id': {'$in': [ObjectId(ride_id) for ride_id in ride_ids if ObjectId.is_valid(ride_id)]}},
+                {'dropoff_location': 1}
+            )
+        }
+
+        # Riders can't be placed on their own ride or on one they already joined
+        ride_position = {ride_id: r for r, ride_id in enumerate(ride_ids)}
+        user_ids = [intent['user_id'] for intent in intents]
+        rider_position = {user_id: i for i, user_id in enumerate(user_ids)}
+        excluded = {
+            (rider_position[ride.get('creator_user_id')], r)
+            for r, ride in enumerate(rides) if ride.get('creator_user_id') in rider_position
+        }
+        for passenger in mongo.db.ride_passengers.find(
+                {'user_id': {'$in': user_ids}, 'ride_id': {'$in': ride_ids}}, {'user_id': 1, 'ride_id': 1}):
+            excluded.add((rider_position[passenger['user_id']], ride_position[passenger['ride_id']]))
+
+        assignments = Dispatch.SOLVER.solve(
+            PointArray.from_points(intent.get('pickup_location') for intent in intents).coords,
+            [intent.get('seat_count', 1) for intent in intents],
+            [intent.get('car_type') for intent in intents],
+            PointArray.from_points(ride.get('location') for ride in rides).coords,
+            PointArray.from_points(dropoffs.get(ride_id) for ride_id in ride_ids).coords,
+            [ride.get('passenger_slots', 0) for ride in rides],
+            [ride.get('car_type') for ride in rides],
+            excluded
+        )
+
+        by_ride = {}
+        for rider, ride, detour in assignments:
+            by_ride.setdefault(ride_ids[ride], []).append((intents[rider], detour))
+
+        applied = Dispatch._reserve(by_ride, now)
+        stats['rides'] = len({ride_id for _, ride_id, _ in applied})
+        stats['assignments'] = applied
+        stats['assigned'] = len(applied)
+        stats['seconds'] = round(time.monotonic() - clock, 3)
+        return stats
+
+    @staticmethod
+    def _reserve(by_ride, now):
+        """Apply a window's seat reservations; returns (user_id, ride_id, passenger_id) per assigned intent"""
+        if not by_ride:
+            mongo.db.join_intents.update_many({'status': 'pending'}, {'$inc': {'windows': 1}})
+            return []
+
+        window_id = ObjectId()
+        # One conditional decrement per ride; a ride filled by a manual join since the window
+        # was read simply doesn't match, and its riders stay pending for the next window
+        mongo.db.available_rides.bulk_write([
+            UpdateOne(
+                {'ride_id': ride_id, 'active': True,
+                 'passenger_slots': {'$gte': sum(intent.get('seat_count', 1) for intent, _ in riders)}},
+                {
+                    '$inc': {'passenger_slots': -sum(intent.get('seat_count', 1) for intent, _ in riders)},
+                    '$set': {'dispatch_window': window_id}
+                }
+            )
+            for ride_id, riders in by_ride.items()
+        ], ordered=False)
+
+        reserved = {
+            ride['ride_id']: ride.get('passenger_slots', 0)
+            for ride in mongo.db.available_rides.find(
+                {'ride_id': {'$in': list(by_ride)}, 'dispatch_window': window_id},
+                {'ride_id': 1, 'passenger_slots': 1}
+            )
+        }
+        if not reserved:
+            mongo.db.join_intents.update_many({'status': 'pending'}, {'$inc': {'windows': 1}})
+            return []
+
+        # Confirm each placed intent while it is still pending and unchanged (every submit moves
+        # expires_at); a rider who cancelled or resubmitted since the window was read keeps
+        # nothing and their seats go back, a resubmission waiting for the next window
+        placed = []
+        for ride_id in reserved:
+            for intent, detour in by_ride[ride_id]:
+                passenger = Ride.passenger_document(
+                    ride_id, intent['user_id'], intent['pickup_location'],
+                    intent.get('group_join', False), intent.get('seat_count', 1)
+                )
+                passenger['_id'] = ObjectId()
+                placed.append((intent, passenger, detour))
+        mongo.db.join_intents.bulk_write([
+            UpdateOne(
+                {'_id': intent['_id'], 'status': 'pending', 'expires_at': intent['expires_at']},
+                {'$set': {
+                    'status': 'assigned',
+                    'ride_id': passenger['ride_id'],
+                    'passenger_id': str(passenger['_id']),
+                    'detour_km': detour,
+                    'dispatch_window': window_id,
+                    'finished_at': now
+                }}
+            )
+            for intent, passenger, detour in placed
+        ], ordered=False)
+        confirmed = {
+            intent['_id']
+            for intent in mongo.db.join_intents.find(
+                {'_id': {'$in': [intent['_id'] for intent, _, _ in placed]}, 'dispatch_window': window_id},
+                {'_id': 1}
+            )
+        }
+
+        returned = {}
+        for intent, passenger, _ in placed:
+            if intent['_id'] not in confirmed:
+                returned[passenger['ride_id']] = returned.get(passenger['ride_id'], 0) + passenger['seat_count']
+        if returned:
+            mongo.db.available_rides.bulk_write([
+                UpdateOne({'ride_id': ride_id}, {'$inc': {'passenger_slots': seats}})
+                for ride_id, seats in returned.items()
+            ], ordered=False)
+            reserved.update(
+                (ride['ride_id'], ride.get('passenger_slots', 0))
+                for ride in mongo.db.available_rides.find(
+                    {'ride_id': {'$in': list(returned)}}, {'ride_id': 1, 'passenger_slots': 1}
+                )
+            )
+
+        passengers = [passenger for intent, passenger, _ in placed if intent['_id'] in confirmed]
+        if passengers:
+            mongo.db.ride_passengers.insert_many(passengers)
+        for passenger in passengers:
+            PickupGeofence.register(passenger['ride_id'], passenger['user_id'], passenger['pickup_location'])
+
+        full = [ride_id for ride_id, slots in reserved.items() if slots <= 0]
+        if full:
+            mongo.db.available_rides.update_many({'ride_id': {'$in': full}}, {'$set': {'active': False}})
+        for ride_id, slots in reserved.items():
+            RideIndex.update(ride_id, passenger_slots=slots, active=slots > 0)
+
+        mongo.db.join_intents.update_many({'status': 'pending'}, {'$inc': {'windows': 1}})
+
+        return [(passenger['user_id'], passenger['ride_id'], str(passenger['_id'])) for passenger in passengers]
@@ -0,0 +1,94 @@
+from .. import mongo
+from ..utils.geo_utils import GeoUtils
+from ..utils.geo_point import Point
+from .ride_index import RideIndex
+from .ride_trail import RideTrail
+from pymongo import UpdateOne
+from datetime import datetime
+import threading
+
+class DriverLocation:
+    """Latest driver position per ride, held in memory and persisted in coalesced batches"""
+
+    # ride_id -> {'location': GeoJSON Point, 'updated_at': datetime}
+    _latest = {}
+    # Rides whose latest position has not been written to Mongo yet
+    _pending = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def parse(location):
+        """Return a GeoJSON Point for a location in any supported format, or None if it is invalid"""
+        try:
+            parsed = Point.parse(location)
+        except (TypeError, ValueError):
+            return None
+        if parsed is None or not parsed.is_valid():
+            return None
+
+        point = parsed.to_geojson()
+        if isinstance(location, dict) and location.get('address'):
+            point['address'] = location['address']
+        return point
+
+    @staticmethod
+    def record(ride_id, point):
+        """Remember a ping; only the newest position per ride is kept for the next flush, every one for the trail"""
+        entry = {'location': point, 'updated_at': datetime.utcnow()}
+        with DriverLocation._lock:
+            DriverLocation._latest[ride_id] = entry
+            DriverLocation._pending[ride_id] = entry
+        RideIndex.update(ride_id, location=point)
+        RideTrail.append(ride_id, point, entry['updated_at'])
+        return entry
+
+    @staticmethod
+    def payload(ride_id, entry):
+        """Event body sent to a ride's room, in the location format the API returns"""
+        return {
+            'ride_id': ride_id,
+            'location': GeoUtils.from_geojson_point(entry['location']),
+            'updated_at': entry['updated_at'].isoformat()
+        }
+
+    @staticmethod
+    def latest(ride_id):
+        """Most recent position seen by this process, or None"""
+        return DriverLocation._latest.get(ride_id)
+
+    @staticmethod
+    def forget(ride_id):
+        """Drop a finished ride, writing its last position first"""
+        with DriverLocation._lock:
+            entry = DriverLocation._pending.pop(ride_id, None)
+            DriverLocation._latest.pop(ride_id, None)
+        if entry:
+            DriverLocation._write({ride_id: entry})
+
+    @staticmethod
+    def flush():
+        """Write every pending position with one bulk_write; returns the number of rides written"""
+        with DriverLocation._lock:
+            pending, DriverLocation._pending = DriverLocation._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            DriverLocation._write(pending)
+        except Exception:
+            # Put the batch back unless a newer ping has replaced it meanwhile
+            with DriverLocation._lock:
+                for ride_id, entry in pending.items():
+                    DriverLocation._pending.setdefault(ride_id, entry)
+            raise
+        return len(pending)
+
+    @staticmethod
+    def _write(entries):
+        mongo.db.available_rides.bulk_write([
+            UpdateOne(
+                {'ride_id': ride_id},
+                {'$set': {'location': entry['location'], 'location_updated_at': entry['updated_at']}}
+            )
+            for ride_id, entry in entries.items()
+        ], ordered=False)
@@ -0,0 +1,192 @@
+from .. import mongo
+from ..utils.geo_utils import GeoUtils
+from ..utils.sector_index import SectorIndex
+from ..utils.geo_point import Point
+from datetime import datetime, timedelta
+import threading
+import numpy as np
+
+HOURS_PER_WEEK = 7 * 24
+
+
+def hour_of_week(when):
+    """0 for Monday 00:00-00:59 UTC up to 167 for Sunday 23:00"""
+    return when.weekday() * 24 + when.hour
+
+
+class EtaProfile:
+    """Travel pace learned from ride_history per (pickup sector, dropoff sector, hour of week)"""
+
+    # Used until a table has been built, and as the prior for sparse data
+    DEFAULT_SPEED_KMH = 40
+    # Pseudo-kilometres of prior pace blended into every learned pace
+    PRIOR_KM = 20
+    # Rides implying speeds outside this range are treated as bad records
+    MIN_SPEED_KMH = 3
+    MAX_SPEED_KMH = 120
+    HISTORY_DAYS = 90
+
+    # (built_at, {sector: index}, pair paces (S, S), hour factors (168,), {cell key: pace})
+    _table = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def configure(config):
+        """Apply ETA settings from the Flask config"""
+        EtaProfile.HISTORY_DAYS = config.get('ETA_HISTORY_DAYS', 90)
+
+    @staticmethod
+    def _sectors():
+        codes = list(dict.fromkeys(SectorIndex.load_default().codes))
+        return [code for code in codes if code] + [SectorIndex.UNKNOWN]
+
+    @staticmethod
+    def _samples(since):
+        """Arrays of (pickup sector, dropoff sector, departure hour of week, straight-line km, minutes)"""
+        rows = []
+        # Only rides with a recorded departure: time since posting includes waiting for passengers
+        cursor = mongo.db.ride_history.find(
+            {'completed_at': {'$gte': since}, 'departed_at': {'$exists': True}},
+            {'pickup_location': 1, 'dropoff_location': 1, 'departed_at': 1, 'completed_at': 1}
+        )
+        for ride in cursor:
+            pickup = GeoUtils.location_lat_lng(ride.get('pickup_location'))
+            dropoff = GeoUtils.location_lat_lng(ride.get('dropoff_location'))
+            if None in pickup or None in dropoff:
+                continue
+            minutes = (ride['completed_at'] - ride['departed_at']).total_seconds() / 60
+            if minutes <= 0:
+                continue
+            rows.append((*pickup, *dropoff, hour_of_week(ride['departed_at']), minutes))
+
+        if not rows:
+            return None
+
+        data = np.asarray(rows, dtype=np.float64)
+        km = GeoUtils._haversine(data[:, 0], data[:, 1], data[:, 2], data[:, 3])
+        minutes = data[:, 5]
+        speed = km / (minutes / 60)
+        keep = (km >= 0.2) & (speed >= EtaProfile.MIN_SPEED_KMH) & (speed <= EtaProfile.MAX_SPEED_KMH)
+        data, km, minutes = data[keep], km[keep], minutes[keep]
+
+        sectors = EtaProfile._sectors()
+        index = {code: i for i, code in enumerate(sectors)}
+        unknown = index[SectorIndex.UNKNOWN]
+        origins = np.array([index.get(code, unknown) for code in
+                            GeoUtils.get_sectors_from_coordinates(data[:, 0], data[:, 1])], dtype=np.int64)
+        destinations = np.array([index.get(code, unknown) for code in
+                                 GeoUtils.get_sectors_from_coordinates(data[:, 2], data[:, 3])], dtype=np.int64)
+        return sectors, origins, destinations, data[:, 4].astype(np.int64), km, minutes
+
+    @staticmethod
+    def build(now=None):
+        """Learn paces from recent ride_history and store the table for every process to load"""
+        now = now or datetime.utcnow()
+        samples = EtaProfile._samples(now - timedelta(days=EtaProfile.HISTORY_DAYS))
+        prior = EtaProfile.PRIOR_KM
+        default_pace = 60 / EtaProfile.DEFAULT_SPEED_KMH
+
+        if samples is None:
+            sectors = EtaProfile._sectors()
+            origins = destinations = hours = np.zeros(0, dtype=np.int64)
+            km = minutes = np.zeros(0)
+        else:
+            sectors, origins, destinations, hours, km, minutes = samples
+        size = len(sectors)
+
+        # Paces are minutes per km, pooled as total minutes over total km and shrunk toward a prior
+        total_km = km.sum()
+        overall = (minutes.sum() + prior * default_pace) / (total_km + prior)
+
+        hour_km = np.bincount(hours, weights=km, minlength=HOURS_PER_WEEK)
+        hour_minutes = np.bincount(hours, weights=minutes, minlength=HOURS_PER_WEEK)
+        hour_factor = (hour_minutes + prior * overall) / (hour_km + prior) / overall
+
+        pairs = origins * size + destinations
+        pair_km = np.bincount(pairs, weights=km, minlength=size * size)
+        pair_minutes = np.bincount(pairs, weights=minutes, minlength=size * size)
+        pair_pace = ((pair_minutes + prior * overall) / (pair_km + prior)).reshape(size, size)
+
+        # Cells with data get their own pace; the rest use pair pace x hour factor at lookup
+        cells = pairs * HOURS_PER_WEEK + hours
+        cell_keys, inverse = np.unique(cells, return_inverse=True)
+        cell_km = np.bincount(inverse, weights=km, minlength=len(cell_keys))
+        cell_minutes = np.bincount(inverse, weights=minutes, minlength=len(cell_keys))
+        cell_prior = pair_pace.reshape(-1)[cell_keys // HOURS_PER_WEEK] * hour_factor[cell_keys % HOURS_PER_WEEK]
+        cell_pace = (cell_minutes + prior * cell_prior) / (cell_km + prior)
+
+        document = {
+            'built_at': now,
+            'samples': int(len(km)),
+            'sectors': sectors,
+            'pair_pace': pair_pace.astype(np.float32).tobytes(),
+            'hour_factor': hour_factor.astype(np.float32).tobytes(),
+            'cell_keys': cell_keys.astype(np.int32).tobytes(),
+            'cell_pace': cell_pace.astype(np.float32).tobytes()
+        }
+        mongo.db.eta_profiles.replace_one({'_id': 'current'}, document, upsert=True)
+        return {'samples': document['samples'], 'cells': int(len(cell_keys)), 'built_at': now}
+
+    @staticmethod
+    def built_at():
+        """When the stored table was built, or None"""
+        stored = mongo.db.eta_profiles.find_one({'_id': 'current'}, {'built_at': 1})
+        return stored.get('built_at') if stored else None
+
+    @staticmethod
+    def reload():
+        """Load the stored table if it is newer than the one in memory; returns True when swapped"""
+        built_at = EtaProfile.built_at()
+        current = EtaProfile._table
+        if built_at is None or (current and current[0] == built_at):
+            return False
+
+        stored = mongo.db.eta_profiles.find_one({'_id': 'current'})
+        if not stored:
+            return False
+        sectors = stored['sectors']
+        size = len(sectors)
+        table = (
+            stored['built_at'],
+            {code: i for i, code in enumerate(sectors)},
+            np.frombuffer(stored['pair_pace'], dtype=np.float32).reshape(size, size),
+            np.frombuffer(stored['hour_factor'], dtype=np.float32),
+            dict(zip(
+                np.frombuffer(stored['cell_keys'], dtype=np.int32).tolist(),
+                np.frombuffer(stored['cell_pace'], dtype=np.float32).tolist()
+            ))
+        )
+        with EtaProfile._lock:
+            EtaProfile._table = table
+        return True
+
+    @staticmethod
+    def minutes_per_km(origin_sector, destination_sector, when=None):
+        """Expected pace for a trip between two sectors departing at when (UTC)"""
+        table = EtaProfile._table
+        if table is None:
+            return 60 / EtaProfile.DEFAULT_SPEED_KMH
+
+        _, index, pair_pace, hour_factor, cells = table
+        unknown = index[SectorIndex.UNKNOWN]
+        i = index.get(origin_sector, unknown)
+        j = index.get(destination_sector, unknown)
+        hour = hour_of_week(when or datetime.utcnow())
+
+        pace = cells.get((i * len(index) + j) * HOURS_PER_WEEK + hour)
+        if pace is None:
+            pace = float(pair_pace[i, j] * hour_factor[hour])
+        return pace
+
+    @staticmethod
+    def estimate_minutes(origin, destination, when=None):
+        """ETA in whole minutes between two points or {'address', 'coordinates'} locations"""
+        origin = Point.parse(origin)
+        destination = Point.parse(destination)
+        distance = GeoUtils.calculate_distance(origin, destination)
+        pace = EtaProfile.minutes_per_km(
+            GeoUtils.get_sector_from_coordinates(origin),
+            GeoUtils.get_sector_from_coordinates(destination),
+            when
+        )
+        return int(distance * pace)
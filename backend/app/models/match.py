@@ -1,50 +1,504 @@
 # /backend/app/models/match.py
 from .. import mongo
 from ..utils.nlp_processor import NLPProcessor
+from ..utils.match_engine import BatchMatchEngine
+from ..utils.minhash import MinHashLSH
+from .vocabulary import Vocabulary
 from bson.objectid import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+import heapq
+import threading
 
 class Match:
+    # Number of companions kept per user in user_best_matches
+    TOP_MATCHES = 50
+
+    # Number of user_best_matches writes sent per bulk_write call
+    BULK_WRITE_SIZE = 1000
+
+    # Candidate generation mode ('exact' or 'lsh') and its MinHash layout
+    ENGINE = 'exact'
+    LSH = MinHashLSH()
+
+    # Only score users who share at least one hobby category (see shares_category)
+    CATEGORY_PREFILTER = True
+
+    # Lists older than this are still served but refreshed in the background
+    FRESH_FOR = timedelta(minutes=60)
+
+    # Most recently active users per category in the popular-interest pool used for quick answers
+    POPULAR_POOL_PER_CATEGORY = 100
+    POPULAR_POOL_TTL = timedelta(minutes=10)
+    _popular_pool = None
+    _popular_pool_built_at = None
+    _popular_pool_lock = threading.Lock()
+
     @staticmethod
-    def store_hobbies(user_id, description):
-        """Extract keywords from user's description and store as hobbies"""
-        # Extract keywords using NLP
-        keywords = NLPProcessor.extract_keywords(description)
-        categories = NLPProcessor.categorize_keywords(keywords)
+    def configure(config):
+        """Apply matching settings from the Flask config"""
+        Match.ENGINE = config.get('MATCH_ENGINE', 'exact')
+        Match.LSH = MinHashLSH(
+            bands=config.get('MATCH_LSH_BANDS', 64),
+            rows=config.get('MATCH_LSH_ROWS', 1)
+        )
+        Match.CATEGORY_PREFILTER = config.get('MATCH_CATEGORY_PREFILTER', True)
+        Match.FRESH_FOR = timedelta(minutes=config.get('MATCH_FRESH_MINUTES', 60))
 
-        # Store as CSV
-        keywords_csv = ','.join(keywords)
-        categories_csv = ','.join(categories)
-        
+    @staticmethod
+    def ensure_indexes():
+        """Create the indexes the matching collections rely on"""
+        mongo.db.user_hobbies.create_index('user_id')
+        mongo.db.user_best_matches.create_index('user_id')
+        # Postings were once one document per term holding every user id; those arrays
+        # grew with the term's popularity, so the old layout is dropped and rebuilt below
+        if mongo.db.hobby_term_postings.find_one({'user_ids': {'$exists': True}}, {'_id': 1}):
+            mongo.db.hobby_term_postings.drop()
+        mongo.db.hobby_term_postings.create_index([('term_id', 1), ('user_id', 1)], unique=True)
+        # Category pools moved off per-category user id arrays the same way
+        if mongo.db.hobby_category_pools.find_one({'user_ids': {'$exists': True}}, {'_id': 1}):
+            mongo.db.hobby_category_pools.drop()
+        mongo.db.hobby_category_pools.create_index([('category', 1), ('user_id', 1)], unique=True)
+        mongo.db.match_dirty_users.create_index('user_id', unique=True)
+        mongo.db.match_dirty_users.create_index('queued_at')
+        mongo.db.match_dirty_users.create_index('claimed_at', sparse=True)
+        mongo.db.user_hobbies.create_index('lsh_buckets')
+        mongo.db.user_hobbies.create_index('description_updated_at')
+        Vocabulary.ensure_indexes()
+
+        # Documents still holding keyword strings are converted to term ids first
+        if mongo.db.user_hobbies.find_one(Match.LEGACY_QUERY, {'_id': 1}):
+            Match.migrate_keyword_ids()
+
+        # Build the posting lists once for data stored before the index existed
+        if (mongo.db.hobby_term_postings.estimated_document_count() == 0 and
+                mongo.db.user_hobbies.estimated_document_count() > 0):
+            Match.rebuild_keyword_index()
+        if (mongo.db.hobby_category_pools.estimated_document_count() == 0 and
+                mongo.db.user_hobbies.estimated_document_count() > 0):
+            Match.rebuild_category_pools()
+
+        # Exact mode writes no buckets, and ones written under another band/row layout
+        # are useless to the LSH mode; fill them in when switching to it
+        if Match.ENGINE == 'lsh' and mongo.db.user_hobbies.find_one(
+                {'lsh_params': {'$ne': Match.LSH.params}}, {'_id': 1}):
+            Match.rebuild_lsh_buckets()
+
+    # user_hobbies documents written before keywords were stored as term ids
+    LEGACY_QUERY = {'keyword_ids': {'$exists': False}, 'extracted_keywords': {'$exists': True}}
+    LEGACY_FIELDS = ('extracted_keywords', 'extracted_csv', 'categories', 'categories_csv')
+
+    @staticmethod
+    def migrate_keyword_ids():
+        """Replace stored keyword and category strings with term ids and a category bitmask"""
+        operations = []
+        migrated = 0
+        for entry in mongo.db.user_hobbies.find(Match.LEGACY_QUERY, {'extracted_keywords': 1}):
+            keywords = entry.get('extracted_keywords') or []
+            operations.append(UpdateOne(
+                {'_id': entry['_id']},
+                {
+                    '$set': {
+                        'keyword_ids': Vocabulary.intern(keywords),
+                        'category_mask': NLPProcessor.category_mask(NLPProcessor.categorize_keywords(keywords))
+                    },
+                    '$unset': {field: '' for field in Match.LEGACY_FIELDS}
+                }
+            ))
+            if len(operations) >= Match.BULK_WRITE_SIZE:
+                migrated += mongo.db.user_hobbies.bulk_write(operations, ordered=False).modified_count
+                operations = []
+
+        if operations:
+            migrated += mongo.db.user_hobbies.bulk_write(operations, ordered=False).modified_count
+
+        # Posting lists keyed by keyword strings are superseded by hobby_term_postings
+        mongo.db.hobby_keyword_index.drop()
+        Match.rebuild_keyword_index()
+        Match.rebuild_category_pools()
+
+        return migrated
+
+    @staticmethod
+    def update_keyword_index(user_id, old_ids, new_ids):
+        """Move a user between term posting lists after their keywords change"""
+        old_ids = set(old_ids or [])
+        new_ids = set(new_ids or [])
+
+        removed = list(old_ids - new_ids)
+        if removed:
+            mongo.db.hobby_term_postings.delete_many({'user_id': user_id, 'term_id': {'$in': removed}})
+
+        # One small document per (term, user), so a popular term costs no more to update
+        added = new_ids - old_ids
+        if added:
+            mongo.db.hobby_term_postings.bulk_write([
+                UpdateOne(
+                    {'term_id': term_id, 'user_id': user_id},
+                    {'$setOnInsert': {'term_id': term_id, 'user_id': user_id}},
+                    upsert=True
+                )
+                for term_id in added
+            ], ordered=False)
+
+    @staticmethod
+    def rebuild_keyword_index():
+        """Rebuild the (term id, user) postings from user_hobbies; returns the number written"""
+        mongo.db.hobby_term_postings.delete_many({})
+        written = 0
+        postings = []
+        for entry in mongo.db.user_hobbies.find({}, {'user_id': 1, 'keyword_ids': 1}):
+            for term_id in set(entry.get('keyword_ids') or []):
+                postings.append({'term_id': term_id, 'user_id': entry.get('user_id')})
+            if len(postings) >= Match.BULK_WRITE_SIZE:
+                mongo.db.hobby_term_postings.insert_many(postings, ordered=False)
+                written += len(postings)
+                postings = []
+
+        if postings:
+            mongo.db.hobby_term_postings.insert_many(postings, ordered=False)
+            written += len(postings)
+
+        return written
+
+    @staticmethod
+    def shares_category(user_mask, other_mask):
+        """Category prefilter: users with categories are only matched with users sharing one"""
+        return not Match.CATEGORY_PREFILTER or not user_mask or bool(user_mask & other_mask)
+
+    @staticmethod
+    def update_category_pools(user_id, old_mask, new_mask):
+        """Move a user between category pools after their category bitmask changes"""
+        old_categories = set(NLPProcessor.categories_from_mask(old_mask or 0))
+        new_categories = set(NLPProcessor.categories_from_mask(new_mask or 0))
+
+        removed = list(old_categories - new_categories)
+        if removed:
+            mongo.db.hobby_category_pools.delete_many({'user_id': user_id, 'category': {'$in': removed}})
+
+        added = new_categories - old_categories
+        if added:
+            mongo.db.hobby_category_pools.bulk_write([
+                UpdateOne(
+                    {'category': category, 'user_id': user_id},
+                    {'$setOnInsert': {'category': category, 'user_id': user_id}},
+                    upsert=True
+                )
+                for category in added
+            ], ordered=False)
+
+    @staticmethod
+    def rebuild_category_pools():
+        """Rebuild the (category, user) pool entries from the stored bitmasks; returns the number written"""
+        mongo.db.hobby_category_pools.delete_many({})
+        written = 0
+        members = []
+        for entry in mongo.db.user_hobbies.find({}, {'user_id': 1, 'category_mask': 1}):
+            for category in NLPProcessor.categories_from_mask(entry.get('category_mask') or 0):
+                members.append({'category': category, 'user_id': entry.get('user_id')})
+            if len(members) >= Match.BULK_WRITE_SIZE:
+                mongo.db.hobby_category_pools.insert_many(members, ordered=False)
+                written += len(members)
+                members = []
+
+        if members:
+            mongo.db.hobby_category_pools.insert_many(members, ordered=False)
+            written += len(members)
+
+        return written
+
+    @staticmethod
+    def get_category_pool(user_id, mask):
+        """Return the users in at least one of the categories set in mask"""
+        # Covered by the (category, user_id) index
+        candidates = {
+            member['user_id']
+            for member in mongo.db.hobby_category_pools.find(
+                {'category': {'$in': NLPProcessor.categories_from_mask(mask)}},
+                {'_id': 0, 'user_id': 1}
+            )
+        }
+        candidates.discard(user_id)
+        return candidates
+
+    @staticmethod
+    def lsh_fields(keywords):
+        """Return the MinHash signature and LSH bucket fields for a keyword list"""
+        signature, buckets = Match.LSH.buckets_for(keywords)
+        return {
+            'minhash_signature': signature,
+            'lsh_buckets': buckets,
+            'lsh_params': Match.LSH.params
+        }
+
+    # Fields only the LSH mode reads
+    LSH_FIELDS = ('minhash_signature', 'lsh_buckets', 'lsh_params')
+
+    @staticmethod
+    def hobby_update(fields, now):
+        """Update writing re-extracted hobby fields; exact mode drops LSH fields it would leave stale"""
+        update = {'$set': {**fields, 'updated_at': now}}
+        if Match.ENGINE != 'lsh':
+            update['$unset'] = {field: '' for field in Match.LSH_FIELDS}
+        return update
+
+    @staticmethod
+    def rebuild_lsh_buckets():
+        """Recompute MinHash signatures and buckets for every user_hobbies document"""
+        operations = []
+        updated = 0
+        for entry in mongo.db.user_hobbies.find({}, {'keyword_ids': 1}):
+            operations.append(UpdateOne(
+                {'_id': entry['_id']},
+                {'$set': Match.lsh_fields(Vocabulary.terms(entry.get('keyword_ids')))}
+            ))
+            if len(operations) >= Match.BULK_WRITE_SIZE:
+                updated += mongo.db.user_hobbies.bulk_write(operations, ordered=False).modified_count
+                operations = []
+
+        if operations:
+            updated += mongo.db.user_hobbies.bulk_write(operations, ordered=False).modified_count
+
+        return updated
+
+    @staticmethod
+    def get_lsh_candidates(user_id, buckets, mask=0):
+        """Return hobby documents that share at least one LSH bucket with the user"""
+        if not buckets:
+            return []
+
+        query = {'lsh_buckets': {'$in': buckets}, 'user_id': {'$ne': user_id}}
+        if Match.CATEGORY_PREFILTER and mask:
+            # Drop colliding users outside the user's categories before they are returned
+            query['category_mask'] = {'$bitsAnySet': mask}
+
+        return mongo.db.user_hobbies.find(query, {'user_id': 1, 'keyword_ids': 1})
+
+    @staticmethod
+    def get_candidate_user_ids(user_id, keyword_ids):
+        """Return the users that share at least one keyword with the given user"""
+        # Covered by the (term_id, user_id) index
+        candidates = {
+            posting['user_id']
+            for posting in mongo.db.hobby_term_postings.find(
+                {'term_id': {'$in': list(keyword_ids)}},
+                {'_id': 0, 'user_id': 1}
+            )
+        }
+        candidates.discard(user_id)
+        return candidates
+
+    @staticmethod
+    def hobby_fields(description, keywords):
+        """Build the extracted fields stored on a user_hobbies document"""
+        # Keywords are kept as sorted term ids and categories as a bitmask
+        fields = {
+            'keyword_ids': Vocabulary.intern(keywords),
+            'category_mask': NLPProcessor.category_mask(NLPProcessor.categorize_keywords(keywords)),
+            'description_digest': NLPProcessor.description_digest(description),
+            'extractor_version': NLPProcessor.EXTRACTOR_VERSION
+        }
+        # MinHash costs a hash per keyword and permutation; exact mode never reads it
+        if Match.ENGINE == 'lsh':
+            fields.update(Match.lsh_fields(keywords))
+        return fields
+
+    @staticmethod
+    def store_hobbies(user_id, description, recompute_self=True):
+        """
+        Extract keywords from user's description and store as hobbies
+
+        Pass recompute_self=False when the caller recomputes the user's own
+        matches itself; the maintainer then only updates the affected users.
+        """
         # Check if entry already exists
         existing = mongo.db.user_hobbies.find_one({'user_id': user_id})
+        old_ids = existing.get('keyword_ids', []) if existing else []
+        old_mask = existing.get('category_mask', 0) if existing else 0
+
+        # Nothing to do when the same text was already extracted by this pipeline
+        if existing and existing.get('raw_description') == description and NLPProcessor.is_current(existing):
+            return Vocabulary.terms(old_ids)
+
+        # Extract keywords using NLP
+        keywords = NLPProcessor.extract_keywords(description)
+        fields = Match.hobby_fields(description, keywords)
         
         if existing:
+            now = datetime.utcnow()
             mongo.db.user_hobbies.update_one(
                 {'user_id': user_id},
-                {
-                    '$set': {
-                        'raw_description': description,
-                        'extracted_keywords': keywords,
-                        'extracted_csv': keywords_csv,
-                        'categories': categories,
-                        'categories_csv': categories_csv,
-                        'updated_at': datetime.utcnow()
-                    }
-                }
+                Match.hobby_update(
+                    {'raw_description': description, **fields, 'description_updated_at': now}, now
+                )
             )
         else:
             mongo.db.user_hobbies.insert_one({
                 'user_id': user_id,
                 'raw_description': description,
-                'extracted_keywords': keywords,
-                'extracted_csv': keywords_csv,
-                'categories': categories,
-                'categories_csv': categories_csv,
+                **fields,
+                'description_updated_at': datetime.utcnow(),
                 'created_at': datetime.utcnow()
             })
+
+        # Keep the keyword posting lists in step with the stored keywords
+        Match.update_keyword_index(user_id, old_ids, fields['keyword_ids'])
+        Match.update_category_pools(user_id, old_mask, fields['category_mask'])
+        Match.mark_affected_users(user_id, old_ids, fields['keyword_ids'], recompute_self)
         
         return keywords
+
+    @staticmethod
+    def mark_affected_users(user_id, old_ids, new_ids, recompute_self=True):
+        """Queue a hobby change along with the users whose top 50 it could affect"""
+        if set(old_ids or []) == set(new_ids or []):
+            return []
+
+        # Anyone sharing an old or a new keyword may gain, lose or re-rank this user
+        affected = Match.get_candidate_user_ids(
+            user_id, set(old_ids or []) | set(new_ids or [])
+        )
+
+        update = {
+            '$addToSet': {'affected_user_ids': {'$each': list(affected)}},
+            '$setOnInsert': {'queued_at': datetime.utcnow()},
+            # A worker already holding the entry must not delete this change with it
+            '$unset': {'claimed_at': ''}
+        }
+        # One change that needs the user's own list rebuilt is enough for the whole entry
+        if recompute_self:
+            update['$set'] = {'recompute_self': True}
+        else:
+            update['$setOnInsert']['recompute_self'] = False
+        mongo.db.match_dirty_users.update_one({'user_id': user_id}, update, upsert=True)
+
+        return list(affected)
+
+    @staticmethod
+    def process_dirty_users(limit=100):
+        """Apply queued hobby changes to the affected user_best_matches lists"""
+        processed = 0
+
+        while processed < limit:
+            # The entry stays queued until it is applied, so a failure leaves it to be retried
+            change = mongo.db.match_dirty_users.find_one_and_update(
+                {'claimed_at': {'$exists': False}},
+                {'$set': {'claimed_at': datetime.utcnow()}},
+                sort=[('queued_at', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not change:
+                break
+
+            user_id = change.get('user_id')
+
+            # The changed user's own list is rebuilt from the index, unless whoever
+            # queued the change rebuilds it
+            if change.get('recompute_self', True):
+                Match.compute_matches(user_id)
+
+            # Everyone else only needs this user's entry moved in or out
+            affected = [uid for uid in change.get('affected_user_ids', []) if uid != user_id]
+            if affected:
+                Match.update_reverse_matches(user_id, affected)
+
+            # Kept when the user changed again meanwhile, which released the claim
+            mongo.db.match_dirty_users.delete_one({'_id': change['_id'], 'claimed_at': change['claimed_at']})
+            processed += 1
+
+        return processed
+
+    @staticmethod
+    def requeue_stale_dirty_users(max_runtime_minutes=10):
+        """Release queued hobby changes claimed by a worker that failed or died"""
+        cutoff = datetime.utcnow() - timedelta(minutes=max_runtime_minutes)
+        return mongo.db.match_dirty_users.update_many(
+            {'claimed_at': {'$lt': cutoff}},
+            {'$unset': {'claimed_at': ''}}
+        ).modified_count
+
+    @staticmethod
+    def update_reverse_matches(changed_user_id, affected_user_ids):
+        """Re-rank changed_user_id inside each affected user's top 50"""
+        changed = mongo.db.user_hobbies.find_one(
+            {'user_id': changed_user_id},
+            {'keyword_ids': 1, 'category_mask': 1}
+        )
+        changed_keywords = set((changed or {}).get('keyword_ids') or [])
+        changed_mask = (changed or {}).get('category_mask', 0)
+
+        keywords_by_user = {}
+        masks_by_user = {}
+        for entry in mongo.db.user_hobbies.find(
+                {'user_id': {'$in': affected_user_ids}},
+                {'user_id': 1, 'keyword_ids': 1, 'category_mask': 1}):
+            keywords_by_user[entry.get('user_id')] = entry.get('keyword_ids') or []
+            masks_by_user[entry.get('user_id')] = entry.get('category_mask', 0)
+        lists_by_user = {
+            entry.get('user_id'): entry.get('matches', [])
+            for entry in mongo.db.user_best_matches.find(
+                {'user_id': {'$in': affected_user_ids}},
+                {'user_id': 1, 'matches': 1}
+            )
+        }
+
+        now = datetime.utcnow()
+        operations = []
+        needs_full_recompute = []
+
+        for user_id in affected_user_ids:
+            user_keywords = keywords_by_user.get(user_id)
+            if not user_keywords:
+                continue
+            # Without a stored list there is nothing to patch; a partial one would be served as
+            # complete, while a missing one is computed in full when the user next asks
+            if user_id not in lists_by_user:
+                continue
+
+            current = lists_by_user[user_id]
+            previous = next((m for m in current if m.get('matched_user_id') == changed_user_id), None)
+            matches = [m for m in current if m.get('matched_user_id') != changed_user_id]
+
+            common = changed_keywords.intersection(user_keywords)
+            if not Match.shares_category(masks_by_user.get(user_id, 0), changed_mask):
+                common = set()
+            similarity = len(common) / (len(user_keywords) + len(changed_keywords) - len(common)) if common else 0
+
+            # A full list that loses or demotes this user may now rank someone unseen 50th
+            if (previous and len(current) >= Match.TOP_MATCHES and
+                    similarity < previous.get('similarity_score', 0)):
+                needs_full_recompute.append(user_id)
+                continue
+
+            if similarity > 0:
+                matches.append({
+                    'matched_user_id': changed_user_id,
+                    'similarity_score': similarity,
+                    'common_interests': Vocabulary.terms(sorted(common))
+                })
+                matches.sort(key=lambda m: m.get('similarity_score', 0), reverse=True)
+                matches = matches[:Match.TOP_MATCHES]
+
+            if previous is None and not any(m.get('matched_user_id') == changed_user_id for m in matches):
+                continue
+
+            operations.append(UpdateOne(
+                {'user_id': user_id},
+                {'$set': {'matches': matches, 'updated_at': now}},
+                upsert=True
+            ))
+
+            if len(operations) >= Match.BULK_WRITE_SIZE:
+                mongo.db.user_best_matches.bulk_write(operations, ordered=False)
+                operations = []
+
+        if operations:
+            mongo.db.user_best_matches.bulk_write(operations, ordered=False)
+
+        for user_id in needs_full_recompute:
+            Match.compute_matches(user_id)
+
+        return len(affected_user_ids)
     
     @staticmethod
     def compute_matches(user_id):
@@ -52,42 +506,58 @@ class Match:
         # Get the user's hobbies
         user_hobbies = mongo.db.user_hobbies.find_one({'user_id': user_id})
         
-        if not user_hobbies or 'extracted_keywords' not in user_hobbies:
+        if not user_hobbies or 'keyword_ids' not in user_hobbies:
             return []
         
-        user_keywords = set(user_hobbies.get('extracted_keywords', []))
+        user_keywords = set(user_hobbies.get('keyword_ids', []))
+        user_mask = user_hobbies.get('category_mask', 0)
         
-        # Get all other users' hobbies
-        all_user_hobbies = list(mongo.db.user_hobbies.find({'user_id': {'$ne': user_id}}))
+        if Match.ENGINE == 'lsh':
+            # Approximate mode: only users colliding in at least one LSH band
+            buckets = user_hobbies.get('lsh_buckets')
+            if user_hobbies.get('lsh_params') != Match.LSH.params:
+                buckets = Match.lsh_fields(Vocabulary.terms(user_hobbies['keyword_ids']))['lsh_buckets']
+            candidates = Match.get_lsh_candidates(user_id, buckets, user_mask)
+        else:
+            if Match.CATEGORY_PREFILTER and user_mask:
+                # First stage: only users in one of this user's category pools
+                candidate_ids = Match.get_category_pool(user_id, user_mask)
+            else:
+                # Only users sharing at least one keyword can have a non-zero score
+                candidate_ids = Match.get_candidate_user_ids(user_id, user_keywords)
+            candidates = mongo.db.user_hobbies.find(
+                {'user_id': {'$in': list(candidate_ids)}},
+                {'user_id': 1, 'keyword_ids': 1}
+            ) if candidate_ids else []
         
         # Compute similarity scores
         matches = []
         
-        for other_user in all_user_hobbies:
-            other_keywords = set(other_user.get('extracted_keywords', []))
+        for other_user in candidates:
+            other_keywords = other_user.get('keyword_ids', [])
             
             # Skip if no keywords
             if not other_keywords:
                 continue
             
-            # Calculate Jaccard similarity
+            # Calculate Jaccard similarity; the stored id arrays are already de-duplicated
             intersection = user_keywords.intersection(other_keywords)
-            union = user_keywords.union(other_keywords)
-            
-            similarity = len(intersection) / len(union) if union else 0
+            if not intersection:
+                continue
+            union_size = len(user_keywords) + len(other_keywords) - len(intersection)
             
-            # Prepare match data
-            match = {
-                'matched_user_id': other_user.get('user_id'),
+            matches.append((len(intersection) / union_size, other_user.get('user_id'), intersection))
+        
+        # Keep the top 50 with a bounded heap instead of sorting every candidate
+        best = heapq.nlargest(Match.TOP_MATCHES, matches, key=lambda m: m[0])
+        top_matches = [
+            {
+                'matched_user_id': matched_user_id,
                 'similarity_score': similarity,
-                'common_interests': list(intersection)
+                'common_interests': Vocabulary.terms(sorted(intersection))
             }
-            
-            matches.append(match)
-        
-        # Sort by similarity score and take top 50
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-        top_matches = matches[:50]
+            for similarity, matched_user_id, intersection in best
+        ]
         
         # Store in user_best_matches
         existing = mongo.db.user_best_matches.find_one({'user_id': user_id})
@@ -111,6 +581,16 @@ class Match:
         
         return top_matches
     
+    @staticmethod
+    def get_keywords(user_id):
+        """Get the stored keywords for a user"""
+        user_hobbies = mongo.db.user_hobbies.find_one({'user_id': user_id}, {'keyword_ids': 1})
+
+        if not user_hobbies:
+            return []
+
+        return Vocabulary.terms(user_hobbies.get('keyword_ids', []))
+
     @staticmethod
     def get_best_matches(user_id):
         """Get the precomputed best matches for a user"""
@@ -122,36 +602,201 @@ class Match:
         return user_matches.get('matches', [])
 
     @staticmethod
-    def update_all_user_hobbies():
+    def get_best_matches_with_freshness(user_id):
+        """Get the precomputed matches and whether they are within FRESH_FOR"""
+        user_matches = mongo.db.user_best_matches.find_one({'user_id': user_id})
+
+        if not user_matches:
+            return [], False
+
+        updated_at = user_matches.get('updated_at')
+        fresh = bool(updated_at) and datetime.utcnow() - updated_at < Match.FRESH_FOR
+        return user_matches.get('matches', []), fresh
+
+    @staticmethod
+    def build_popular_pool():
+        """Load the most recently active users of every hobby category"""
+        per_category = Match.POPULAR_POOL_PER_CATEGORY
+        projection = {'user_id': 1, 'keyword_ids': 1, 'category_mask': 1}
+        entries = {}
+        for category in NLPProcessor.CATEGORY_ORDER:
+            # Recent description edits stand in for activity; the description_updated_at
+            # index serves the sort, so the cost does not grow with the category's size
+            recent = mongo.db.user_hobbies.find(
+                {'category_mask': {'$bitsAnySet': NLPProcessor.category_mask([category])}},
+                projection
+            ).sort('description_updated_at', -1).limit(per_category)
+            for entry in recent:
+                entries[entry['user_id']] = entry
+
+        return [
+            (entry['user_id'], set(entry.get('keyword_ids') or []), entry.get('category_mask', 0))
+            for entry in entries.values()
+            if entry.get('keyword_ids')
+        ]
+
+    @staticmethod
+    def _refresh_popular_pool():
+        try:
+            Match._popular_pool = Match.build_popular_pool()
+            Match._popular_pool_built_at = datetime.utcnow()
+        finally:
+            Match._popular_pool_lock.release()
+
+    @staticmethod
+    def get_popular_pool():
+        """Return the cached popular-interest pool, refreshing it in the background when expired"""
+        expired = (Match._popular_pool_built_at is None or
+                   datetime.utcnow() - Match._popular_pool_built_at >= Match.POPULAR_POOL_TTL)
+
+        if expired and Match._popular_pool_lock.acquire(blocking=False):
+            if Match._popular_pool is None:
+                # First use in this process: nothing to serve yet, so build inline
+                Match._refresh_popular_pool()
+            else:
+                threading.Thread(target=Match._refresh_popular_pool, daemon=True).start()
+
+        return Match._popular_pool or []
+
+    @staticmethod
+    def quick_matches(user_id):
+        """Partial matches scored only against the popular-interest pool; nothing is stored"""
+        user_hobbies = mongo.db.user_hobbies.find_one(
+            {'user_id': user_id}, {'keyword_ids': 1, 'category_mask': 1}
+        )
+        if not user_hobbies or not user_hobbies.get('keyword_ids'):
+            return []
+
+        user_keywords = set(user_hobbies['keyword_ids'])
+        user_mask = user_hobbies.get('category_mask', 0)
+
+        matches = []
+        for other_id, other_keywords, other_mask in Match.get_popular_pool():
+            if other_id == user_id or not Match.shares_category(user_mask, other_mask):
+                continue
+            intersection = user_keywords & other_keywords
+            if not intersection:
+                continue
+            union_size = len(user_keywords) + len(other_keywords) - len(intersection)
+            matches.append((len(intersection) / union_size, other_id, intersection))
+
+        best = heapq.nlargest(Match.TOP_MATCHES, matches, key=lambda m: m[0])
+        return [
+            {
+                'matched_user_id': matched_user_id,
+                'similarity_score': similarity,
+                'common_interests': Vocabulary.terms(sorted(intersection))
+            }
+            for similarity, matched_user_id, intersection in best
+        ]
+
+    # Fields the reprocessing pass needs from each user_hobbies document
+    REPROCESS_PROJECTION = {
+        'user_id': 1, 'raw_description': 1, 'keyword_ids': 1, 'category_mask': 1,
+        'description_digest': 1, 'extractor_version': 1
+    }
+
+    @staticmethod
+    def reprocess_hobbies(entries, mark_affected=True):
+        """Re-extract a chunk of user_hobbies documents and write changes in one bulk_write"""
+        # Only descriptions whose text or extractor version changed need work
+        stale = [
+            entry for entry in entries
+            if entry.get('user_id') and entry.get('raw_description') and
+            not NLPProcessor.is_current(entry)
+        ]
+
+        # Re-extract keywords for every stale description in one batch
+        extracted = NLPProcessor.extract_keywords_batch(
+            [entry['raw_description'] for entry in stale]
+        )
+
+        now = datetime.utcnow()
+        updates = [
+            Match.hobby_fields(entry['raw_description'], keywords)
+            for entry, keywords in zip(stale, extracted)
+        ]
+        operations = [
+            UpdateOne({'_id': entry['_id']}, Match.hobby_update(fields, now))
+            for entry, fields in zip(stale, updates)
+        ]
+        if operations:
+            mongo.db.user_hobbies.bulk_write(operations, ordered=False)
+
+        for entry, fields in zip(stale, updates):
+            old_ids = entry.get('keyword_ids', [])
+            Match.update_keyword_index(entry['user_id'], old_ids, fields['keyword_ids'])
+            Match.update_category_pools(entry['user_id'], entry.get('category_mask', 0), fields['category_mask'])
+            if mark_affected:
+                Match.mark_affected_users(entry['user_id'], old_ids, fields['keyword_ids'])
+
+        return {'scanned': len(entries), 'updated': len(stale), 'skipped': len(entries) - len(stale)}
+
+    @staticmethod
+    def update_all_user_hobbies(full_recompute=False, chunk_size=500, workers=None):
         """Reprocess stored hobby descriptions for all users"""
-        all_hobbies = list(mongo.db.user_hobbies.find())
+        totals = {'scanned': 0, 'updated': 0, 'skipped': 0}
+        chunk = []
 
-        for entry in all_hobbies:
-            user_id = entry.get('user_id')
-            description = entry.get('raw_description', '')
-            if not user_id or not description:
+        for entry in mongo.db.user_hobbies.find({}, Match.REPROCESS_PROJECTION):
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                for key, value in Match.reprocess_hobbies(chunk, not full_recompute).items():
+                    totals[key] += value
+                chunk = []
+
+        if chunk:
+            for key, value in Match.reprocess_hobbies(chunk, not full_recompute).items():
+                totals[key] += value
+
+        # Changed users are picked up by the match maintainer unless a full rebuild is requested
+        if full_recompute:
+            Match.recompute_all_matches(workers=workers)
+
+        return totals
+
+    @staticmethod
+    def recompute_all_matches(workers=None):
+        """Recompute user_best_matches for every user with the batch engine"""
+        user_ids = []
+        keyword_sets = []
+        masks = []
+        for entry in mongo.db.user_hobbies.find({}, {'user_id': 1, 'keyword_ids': 1, 'category_mask': 1}):
+            keywords = entry.get('keyword_ids') or []
+            if not entry.get('user_id') or not keywords:
                 continue
+            user_ids.append(entry['user_id'])
+            keyword_sets.append(set(keywords))
+            masks.append(entry.get('category_mask', 0))
 
-            # Re-extract keywords and categories
-            keywords = NLPProcessor.extract_keywords(description)
-            categories = NLPProcessor.categorize_keywords(keywords)
+        engine = BatchMatchEngine(top_k=Match.TOP_MATCHES, workers=workers)
+        results = engine.compute(keyword_sets, masks if Match.CATEGORY_PREFILTER else None)
 
-            keywords_csv = ','.join(keywords)
-            categories_csv = ','.join(categories)
+        now = datetime.utcnow()
+        operations = []
+        for row, (columns, _) in enumerate(results):
+            keywords = keyword_sets[row]
+            top_matches = []
+            for column in columns:
+                # Re-derive the exact score from the sets the engine ranked in float32
+                common = keywords & keyword_sets[column]
+                top_matches.append({
+                    'matched_user_id': user_ids[column],
+                    'similarity_score': len(common) / (len(keywords) + len(keyword_sets[column]) - len(common)),
+                    'common_interests': Vocabulary.terms(sorted(common))
+                })
+            operations.append(UpdateOne(
+                {'user_id': user_ids[row]},
+                {'$set': {'matches': top_matches, 'updated_at': now}},
+                upsert=True
+            ))
 
-            mongo.db.user_hobbies.update_one(
-                {'user_id': user_id},
-                {
-                    '$set': {
-                        'extracted_keywords': keywords,
-                        'extracted_csv': keywords_csv,
-                        'categories': categories,
-                        'categories_csv': categories_csv,
-                        'updated_at': datetime.utcnow()
-                    }
-                }
-            )
+            if len(operations) >= Match.BULK_WRITE_SIZE:
+                mongo.db.user_best_matches.bulk_write(operations, ordered=False)
+                operations = []
 
-            # Recompute matches for the user
-            Match.compute_matches(user_id)
+        if operations:
+            mongo.db.user_best_matches.bulk_write(operations, ordered=False)
+
+        return len(results)
 
@@ -0,0 +1,115 @@
+from .. import mongo
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+class MatchJob:
+    @staticmethod
+    def ensure_indexes():
+        """At most one pending job per user; claims scan pending jobs oldest first"""
+        mongo.db.match_jobs.create_index(
+            'user_id',
+            unique=True,
+            partialFilterExpression={'status': 'pending'},
+            name='one_pending_job_per_user'
+        )
+        mongo.db.match_jobs.create_index([('status', 1), ('requested_at', 1)])
+        mongo.db.match_jobs.create_index([('user_id', 1), ('created_at', -1)])
+
+    @staticmethod
+    def enqueue(user_id, description=None):
+        """Queue hobby processing for a user, folding into their pending job if one exists"""
+        now = datetime.utcnow()
+        update = {
+            '$set': {'requested_at': now},
+            '$setOnInsert': {
+                'user_id': user_id,
+                'status': 'pending',
+                'attempts': 0,
+                'created_at': now
+            },
+            '$inc': {'submissions': 1}
+        }
+        if description is not None:
+            # The latest description wins when submissions are coalesced
+            update['$set']['description'] = description
+
+        try:
+            job = mongo.db.match_jobs.find_one_and_update(
+                {'user_id': user_id, 'status': 'pending'},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another request created the pending job first; fold into it
+            job = mongo.db.match_jobs.find_one_and_update(
+                {'user_id': user_id, 'status': 'pending'},
+                update,
+                return_document=ReturnDocument.AFTER
+            )
+
+        return job
+
+    @staticmethod
+    def schedule_refresh(user_id):
+        """Queue a match recompute unless one is already pending or running for the user"""
+        if mongo.db.match_jobs.find_one(
+                {'user_id': user_id, 'status': {'$in': ['pending', 'running']}}, {'_id': 1}):
+            return None
+        return MatchJob.enqueue(user_id)
+
+    @staticmethod
+    def claim():
+        """Atomically take the oldest pending job and mark it running"""
+        return mongo.db.match_jobs.find_one_and_update(
+            {'status': 'pending'},
+            {
+                '$set': {'status': 'running', 'started_at': datetime.utcnow()},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('requested_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def complete(job_id, result):
+        """Mark a job as done and store its result summary"""
+        mongo.db.match_jobs.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': {'status': 'done', 'result': result, 'finished_at': datetime.utcnow()}}
+        )
+
+    @staticmethod
+    def fail(job_id, error):
+        """Mark a job as failed with the error message"""
+        mongo.db.match_jobs.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': {'status': 'failed', 'error': error, 'finished_at': datetime.utcnow()}}
+        )
+
+    @staticmethod
+    def requeue_stale(max_runtime_minutes=10):
+        """Put jobs left running by a dead worker back in the queue"""
+        cutoff = datetime.utcnow() - timedelta(minutes=max_runtime_minutes)
+        requeued = 0
+        for job in mongo.db.match_jobs.find({'status': 'running', 'started_at': {'$lt': cutoff}}, {'user_id': 1}):
+            try:
+                result = mongo.db.match_jobs.update_one(
+                    {'_id': job['_id'], 'status': 'running'},
+                    {'$set': {'status': 'pending'}}
+                )
+                requeued += result.modified_count
+            except DuplicateKeyError:
+                # A newer pending job for the user already supersedes this one
+                mongo.db.match_jobs.update_one(
+                    {'_id': job['_id']},
+                    {'$set': {'status': 'failed', 'error': 'Superseded after worker timeout'}}
+                )
+        return requeued
+
+    @staticmethod
+    def get_latest(user_id):
+        """Get the most recent job submitted for a user"""
+        return mongo.db.match_jobs.find_one({'user_id': user_id}, sort=[('created_at', -1)])
@@ -0,0 +1,173 @@
+from .. import mongo
+from ..utils.geo_utils import GeoUtils
+from ..utils.geo_point import Point
+from datetime import datetime
+import math
+import threading
+
+METRES_PER_DEGREE = 111320.0
+
+
+class PickupGeofence:
+    """Per-process grid of pending passenger pickups, probed with each driver location"""
+
+    # A driver this close to a pickup counts as arrived
+    RADIUS_METRES = 75
+
+    # ride_id -> {user_id: Point} for passengers still waiting
+    _fences = {}
+    # (ride_id, cell lat, cell lng) -> user_ids whose circle overlaps the cell
+    _cells = {}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def configure(config):
+        """Apply arrival settings from the Flask config"""
+        with PickupGeofence._lock:
+            PickupGeofence.RADIUS_METRES = config.get('PICKUP_ARRIVAL_RADIUS_METRES', 75)
+            # Cell coverage depends on the radius, so index the current fences again
+            fences = PickupGeofence._fences
+            PickupGeofence._fences, PickupGeofence._cells = {}, {}
+            for ride_id, pickups in fences.items():
+                for user_id, point in pickups.items():
+                    PickupGeofence._add(PickupGeofence._fences, PickupGeofence._cells, ride_id, user_id, point)
+
+    @staticmethod
+    def _cell_degrees():
+        # Cells twice the radius across keep every circle within a few cells
+        return 2 * PickupGeofence.RADIUS_METRES / METRES_PER_DEGREE
+
+    @staticmethod
+    def _cell(point):
+        size = PickupGeofence._cell_degrees()
+        return math.floor(point.lat / size), math.floor(point.lng / size)
+
+    @staticmethod
+    def _covering(point):
+        """Every cell the bounding box of a pickup's circle touches"""
+        size = PickupGeofence._cell_degrees()
+        lat_span = PickupGeofence.RADIUS_METRES / METRES_PER_DEGREE
+        lng_span = lat_span / max(math.cos(math.radians(point.lat)), 1e-6)
+        for cell_lat in range(math.floor((point.lat - lat_span) / size), math.floor((point.lat + lat_span) / size) + 1):
+            for cell_lng in range(math.floor((point.lng - lng_span) / size),
+                                  math.floor((point.lng + lng_span) / size) + 1):
+                yield cell_lat, cell_lng
+
+    @staticmethod
+    def _add(fences, cells, ride_id, user_id, point):
+        fences.setdefault(ride_id, {})[user_id] = point
+        for cell in PickupGeofence._covering(point):
+            cells.setdefault((ride_id, *cell), set()).add(user_id)
+
+    @staticmethod
+    def _discard(ride_id, user_id):
+        """Remove one pickup; the caller holds the lock"""
+        pickups = PickupGeofence._fences.get(ride_id)
+        point = pickups.pop(user_id, None) if pickups else None
+        if point is None:
+            return
+        if not pickups:
+            del PickupGeofence._fences[ride_id]
+        for cell in PickupGeofence._covering(point):
+            users = PickupGeofence._cells.get((ride_id, *cell))
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del PickupGeofence._cells[(ride_id, *cell)]
+
+    @staticmethod
+    def register(ride_id, user_id, pickup_location):
+        """Watch a passenger's pickup point; returns False if it has no usable coordinates"""
+        point = Point.parse(pickup_location)
+        if point is None or not point.is_valid():
+            return False
+        with PickupGeofence._lock:
+            PickupGeofence._discard(ride_id, user_id)
+            PickupGeofence._add(PickupGeofence._fences, PickupGeofence._cells, ride_id, user_id, point)
+        return True
+
+    @staticmethod
+    def discard(ride_id, user_id):
+        """Stop watching a passenger's pickup"""
+        with PickupGeofence._lock:
+            PickupGeofence._discard(ride_id, user_id)
+
+    @staticmethod
+    def remove_ride(ride_id):
+        """Drop every pickup of a finished ride"""
+        with PickupGeofence._lock:
+            for user_id in list(PickupGeofence._fences.get(ride_id, ())):
+                PickupGeofence._discard(ride_id, user_id)
+
+    @staticmethod
+    def reconcile():
+        """Rebuild the fences from Mongo: waiting passengers of rides still under way"""
+        ride_ids = [
+            str(ride['_id']) for ride in
+            mongo.db.rides.find({'status': {'$nin': ['completed', 'cancelled']}}, {'_id': 1})
+        ]
+        fences, cells = {}, {}
+        for passenger in mongo.db.ride_passengers.find(
+                {'ride_id': {'$in': ride_ids}, 'has_arrived': False},
+                {'ride_id': 1, 'user_id': 1, 'pickup_location': 1}):
+            point = Point.parse(passenger.get('pickup_location'))
+            if point is not None and point.is_valid():
+                PickupGeofence._add(fences, cells, passenger['ride_id'], passenger['user_id'], point)
+
+        with PickupGeofence._lock:
+            PickupGeofence._fences, PickupGeofence._cells = fences, cells
+        return sum(len(pickups) for pickups in fences.values())
+
+    @staticmethod
+    def probe(ride_id, point):
+        """
+        Claim the pickups a driver position lies within
+
+        One grid lookup finds the candidates; they are removed from the index so
+        later pings don't report them again.
+
+        Args:
+            ride_id: Ride the driver is on
+            point: GeoJSON Point or any format Point.parse reads
+
+        Returns:
+            List of user_ids whose pickup the driver has reached
+        """
+        point = Point.parse(point)
+        with PickupGeofence._lock:
+            candidates = PickupGeofence._cells.get((ride_id, *PickupGeofence._cell(point)))
+            if not candidates:
+                return []
+            pickups = PickupGeofence._fences[ride_id]
+            radius_km = PickupGeofence.RADIUS_METRES / 1000
+            reached = [user_id for user_id in candidates
+                       if GeoUtils.calculate_distance(point, pickups[user_id]) <= radius_km]
+            for user_id in reached:
+                PickupGeofence._discard(ride_id, user_id)
+        return reached
+
+    @staticmethod
+    def check(ride_id, point):
+        """
+        Probe a driver position and record every arrival it triggers
+
+        Returns:
+            One pickup_arrival event body per passenger newly marked as arrived
+        """
+        reached = PickupGeofence.probe(ride_id, point)
+        arrivals = []
+        now = datetime.utcnow()
+        for user_id in reached:
+            # Another process seeing the same driver may get there first; only one reports it
+            result = mongo.db.ride_passengers.update_one(
+                {'ride_id': ride_id, 'user_id': user_id, 'has_arrived': False},
+                {'$set': {'has_arrived': True, 'arrived_at': now, 'arrival_source': 'geofence'}}
+            )
+            if result.modified_count:
+                arrivals.append({
+                    'ride_id': ride_id,
+                    'user_id': user_id,
+                    'has_arrived': True,
+                    'arrived_at': now.isoformat()
+                })
+        return arrivals
@@ -2,9 +2,72 @@
 from .. import mongo
 from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
 from ..utils.geo_utils import GeoUtils
+from ..utils.route_optimizer import RouteOptimizer
+from ..utils.geo_point import Point, PointArray
+from ..utils.routing import Routing
+from .ride_index import RideIndex
+from .driver_location import DriverLocation
+from .pickup_geofence import PickupGeofence
+from .ride_trail import RideTrail
+from .eta_profile import EtaProfile
+import numpy as np
 
 class Ride:
+    # Shared pickup route optimizer; time budget set from ROUTE_OPTIMIZER_BUDGET_MS
+    ROUTE_OPTIMIZER = RouteOptimizer()
+
+    # Joins adding more than this to the ride's route are rejected, or accepted and flagged
+    JOIN_MAX_ADDED_KM = 3
+    JOIN_MAX_ADDED_MINUTES = 10
+    JOIN_DETOUR_POLICY = 'reject'
+
+    @staticmethod
+    def configure(config):
+        """Apply ride settings from the Flask config"""
+        Ride.ROUTE_OPTIMIZER = RouteOptimizer(time_budget_ms=config.get('ROUTE_OPTIMIZER_BUDGET_MS', 50))
+        Ride.JOIN_MAX_ADDED_KM = config.get('JOIN_MAX_ADDED_KM', 3)
+        Ride.JOIN_MAX_ADDED_MINUTES = config.get('JOIN_MAX_ADDED_MINUTES', 10)
+        Ride.JOIN_DETOUR_POLICY = config.get('JOIN_DETOUR_POLICY', 'reject')
+
+    # available_rides documents still holding {'address', 'coordinates': {...}} locations
+    LEGACY_LOCATION_QUERY = {'location': {'$type': 'object'}, 'location.type': {'$exists': False}}
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the indexes ride discovery relies on"""
+        # A 2dsphere index rejects non-GeoJSON locations, so convert those first
+        if mongo.db.available_rides.find_one(Ride.LEGACY_LOCATION_QUERY, {'_id': 1}):
+            Ride.migrate_available_ride_locations()
+
+        mongo.db.available_rides.create_index([('location', '2dsphere'), ('active', 1)])
+        mongo.db.available_rides.create_index('ride_id')
+        mongo.db.ride_passengers.create_index([('ride_id', 1), ('user_id', 1)])
+
+    @staticmethod
+    def migrate_available_ride_locations():
+        """Rewrite available_rides locations as GeoJSON Points, keeping their address"""
+        operations = []
+        migrated = 0
+        for ride in mongo.db.available_rides.find(Ride.LEGACY_LOCATION_QUERY, {'location': 1}):
+            point = GeoUtils.to_geojson_point(ride.get('location'))
+            if point:
+                update = {'$set': {'location': point}}
+            else:
+                # Without coordinates the ride can't be placed on the map at all
+                update = {'$unset': {'location': ''}}
+            operations.append(UpdateOne({'_id': ride['_id']}, update))
+
+            if len(operations) >= 1000:
+                migrated += mongo.db.available_rides.bulk_write(operations, ordered=False).modified_count
+                operations = []
+
+        if operations:
+            migrated += mongo.db.available_rides.bulk_write(operations, ordered=False).modified_count
+
+        return migrated
+
     @staticmethod
     def create(data):
         """Create a new ride"""
@@ -19,6 +82,7 @@ class Ride:
             'group_join': data.get('group_join', False),
             'fare': data.get('fare', 0),
             'distance': data.get('distance', 0),
+            'estimated_minutes': data.get('estimated_minutes'),
             'sector': data.get('sector', ''),
             'status': 'created',
             'created_at': datetime.utcnow(),
@@ -33,7 +97,7 @@ class Ride:
         available_ride = {
             'ride_id': ride_id,
             'creator_user_id': data.get('creator_user_id'),
-            'location': data.get('pickup_location'),
+            'location': GeoUtils.to_geojson_point(data.get('pickup_location')),
             'sector': data.get('sector', ''),
             'car_type': data.get('car_type'),
             'passenger_slots': data.get('passenger_slots', 1),
@@ -43,12 +107,17 @@ class Ride:
         }
         
         mongo.db.available_rides.insert_one(available_ride)
+        RideIndex.upsert(available_ride)
         
         return ride_id
     
     @staticmethod
     def get_available_rides(sector=''):
         """Get available rides, optionally filtered by sector"""
+        # Served from memory once the index has been loaded
+        if RideIndex.ready:
+            return RideIndex.by_sector(sector)
+
         query = {'active': True}
         
         if sector:
@@ -56,11 +125,33 @@ class Ride:
         
         rides = list(mongo.db.available_rides.find(query).sort('created_at', -1))
         return rides
+
+    @staticmethod
+    def get_nearby_rides(lat, lng, radius_km=5, limit=20, offset=0):
+        """Get active rides within radius_km of a point, nearest first"""
+        if RideIndex.ready:
+            return RideIndex.nearby(lat, lng, radius_km, limit, offset)
+
+        pipeline = [
+            {
+                '$geoNear': {
+                    'near': {'type': 'Point', 'coordinates': [lng, lat]},
+                    'key': 'location',
+                    'distanceField': 'distance_m',
+                    'maxDistance': radius_km * 1000,
+                    'query': {'active': True},
+                    'spherical': True
+                }
+            },
+            {'$skip': offset},
+            {'$limit': limit}
+        ]
+        return list(mongo.db.available_rides.aggregate(pipeline))
     
     @staticmethod
-    def join_ride(ride_id, user_id, pickup_location, group_join=False, seat_count=1, is_group_leader=False):
-        """Add a passenger to a ride"""
-        passenger = {
+    def passenger_document(ride_id, user_id, pickup_location, group_join=False, seat_count=1, is_group_leader=False):
+        """Build the ride_passengers document for a new passenger"""
+        return {
             'ride_id': ride_id,
             'user_id': user_id,
             'pickup_location': pickup_location,
@@ -71,31 +162,145 @@ class Ride:
             'status': 'awaiting_pickup',
             'joined_at': datetime.utcnow()
         }
-        
-        result = mongo.db.ride_passengers.insert_one(passenger)
+
+    @staticmethod
+    def current_position(ride_id, ride=None):
+        """Where the ride is now: the driver's last ping, its available_rides location, or its pickup"""
+        latest = DriverLocation.latest(ride_id)
+        available = latest or mongo.db.available_rides.find_one({'ride_id': ride_id}, {'location': 1})
+        if available and available.get('location'):
+            return Point.parse(available['location'])
+        return Point.parse((ride or {}).get('pickup_location'))
+
+    @staticmethod
+    def plan_insertion(ride, pickup_location):
+        """
+        Cheapest place for a new pickup in the ride's cached stop sequence
+
+        Only the legs around each gap are priced, so a join costs one distance
+        table over the stops instead of re-optimizing the whole route.
+
+        Args:
+            ride: rides document
+            pickup_location: The joining passenger's pickup
+
+        Returns:
+            Dict with added_km, added_minutes, route_km, order (passenger user_ids in the
+            current plan order) and insert_before (user_id, or None to go last); None when
+            the ride or pickup has no coordinates
+        """
+        ride_id = str(ride['_id'])
+        pickup = Point.parse(pickup_location)
+        start = Ride.current_position(ride_id, ride)
+        if pickup is None or start is None:
+            return None
+
+        passengers = list(mongo.db.ride_passengers.find(
+            {'ride_id': ride_id}, {'user_id': 1, 'pickup_location': 1, 'has_arrived': 1}
+        ))
+        # The cached order, then anyone it doesn't know yet in joining order
+        plan = ride.get('route_plan') or {}
+        by_user = {p.get('user_id'): p for p in passengers}
+        order = [user_id for user_id in plan.get('order', []) if user_id in by_user]
+        planned = set(order)
+        order += [p.get('user_id') for p in passengers if p.get('user_id') not in planned]
+
+        # Remaining stops: passengers still waiting whose pickup can be placed
+        stops = []
+        for user_id in order:
+            point = Point.parse(by_user[user_id].get('pickup_location'))
+            if not by_user[user_id].get('has_arrived') and point is not None:
+                stops.append((user_id, point))
+
+        end = Point.parse(ride.get('dropoff_location'))
+        nodes = [start] + [point for _, point in stops] + ([end] if end is not None else [])
+        # One matrix over the plan and the new pickup, which comes last
+        km, minutes = Routing.matrix(nodes + [pickup])
+        new = len(nodes)
+        legs = np.arange(len(nodes) - 1)
+        to_new = np.arange(len(stops) + 1)
+        from_new = np.arange(1, len(nodes))
+
+        has_end = end is not None
+        added_km = RouteOptimizer.insertion_costs(
+            km[legs, legs + 1], km[to_new, new], km[new, from_new], has_end)
+        added_minutes = RouteOptimizer.insertion_costs(
+            minutes[legs, legs + 1], minutes[to_new, new], minutes[new, from_new], has_end)
+        position = int(np.argmin(added_km))
+
+        return {
+            'added_km': round(max(float(added_km[position]), 0.0), 2),
+            'added_minutes': round(max(float(added_minutes[position]), 0.0), 1),
+            'route_km': round(float(km[legs, legs + 1].sum()) + float(added_km[position]), 2),
+            'order': order,
+            'insert_before': stops[position][0] if position < len(stops) else None
+        }
+
+    @staticmethod
+    def detour_exceeded(insertion):
+        """Whether an insertion adds more than the configured limits"""
+        return bool(insertion) and (insertion['added_km'] > Ride.JOIN_MAX_ADDED_KM or
+                                    insertion['added_minutes'] > Ride.JOIN_MAX_ADDED_MINUTES)
+
+    @staticmethod
+    def join_ride(ride_id, user_id, pickup_location, group_join=False, seat_count=1, is_group_leader=False,
+                  insertion=None):
+        """
+        Add a passenger to a ride, slotting them into the cached route when insertion is given
+
+        Returns:
+            The passenger id, or None when the ride no longer has seat_count seats free
+        """
+        passenger = Ride.passenger_document(ride_id, user_id, pickup_location, group_join, seat_count, is_group_leader)
+        if insertion:
+            passenger['detour_km'] = insertion['added_km']
+            passenger['detour_minutes'] = insertion['added_minutes']
+            passenger['detour_flagged'] = Ride.detour_exceeded(insertion)
+
+        # Conditional decrement, like the dispatcher's reservations, so concurrent joins can't overbook
+        available_ride = mongo.db.available_rides.find_one_and_update(
+            {'ride_id': ride_id, 'passenger_slots': {'$gte': seat_count}},
+            {'$inc': {'passenger_slots': -seat_count}},
+            return_document=ReturnDocument.AFTER
+        )
+        if available_ride is None:
+            return None
+
+        try:
+            result = mongo.db.ride_passengers.insert_one(passenger)
+        except Exception:
+            mongo.db.available_rides.update_one({'ride_id': ride_id}, {'$inc': {'passenger_slots': seat_count}})
+            raise
         passenger_id = str(result.inserted_id)
-        
-        # Update available slots in available_rides
-        available_ride = mongo.db.available_rides.find_one({'ride_id': ride_id})
-        
-        if available_ride:
-            updated_slots = max(0, available_ride.get('passenger_slots', 0) - seat_count)
-            
+        PickupGeofence.register(ride_id, user_id, pickup_location)
+
+        updated_slots = available_ride['passenger_slots']
+        # If no slots left, mark as inactive
+        if updated_slots == 0:
             mongo.db.available_rides.update_one(
-                {'ride_id': ride_id},
-                {'$set': {'passenger_slots': updated_slots}}
+                {'ride_id': ride_id, 'passenger_slots': 0},
+                {'$set': {'active': False}}
             )
-            
-            # If no slots left, mark as inactive
-            if updated_slots == 0:
-                mongo.db.available_rides.update_one(
-                    {'ride_id': ride_id},
-                    {'$set': {'active': False}}
-                )
+        RideIndex.update(ride_id, passenger_slots=updated_slots, active=updated_slots > 0)
         
         if is_group_leader:
             mongo.db.rides.update_one({'_id': ObjectId(ride_id)}, {'$set': {'group_leader_id': user_id}})
 
+        if insertion:
+            # The new plan covers everyone, so get_route_order keeps using it
+            order = list(insertion['order'])
+            before = insertion['insert_before']
+            order.insert(order.index(before) if before in order else len(order), user_id)
+            mongo.db.rides.update_one(
+                {'_id': ObjectId(ride_id)},
+                {'$set': {'route_plan': {
+                    'passenger_ids': sorted(order, key=str),
+                    'order': order,
+                    'distance_km': insertion['route_km'],
+                    'computed_at': datetime.utcnow()
+                }}}
+            )
+
         return passenger_id
     
     @staticmethod
@@ -105,6 +310,14 @@ class Ride:
             {'ride_id': ride_id, 'user_id': user_id},
             {'$set': {'has_arrived': has_arrived}}
         )
+
+        # A passenger marked as waiting again is watched for the driver's arrival again
+        if has_arrived:
+            PickupGeofence.discard(ride_id, user_id)
+        else:
+            passenger = Ride.get_passenger(ride_id, user_id)
+            if passenger:
+                PickupGeofence.register(ride_id, user_id, passenger.get('pickup_location'))
         return True
     
     @staticmethod
@@ -114,6 +327,13 @@ class Ride:
             {'_id': ObjectId(ride_id)},
             {'$set': {'status': status}}
         )
+
+        if status == 'in_progress':
+            # Keep the first departure; trip times are measured from it, not from posting
+            mongo.db.rides.update_one(
+                {'_id': ObjectId(ride_id), 'departed_at': {'$exists': False}},
+                {'$set': {'departed_at': datetime.utcnow()}}
+            )
         
         if status in ['completed', 'cancelled']:
             # Mark as inactive in available rides
@@ -121,6 +341,10 @@ class Ride:
                 {'ride_id': ride_id},
                 {'$set': {'active': False}}
             )
+            RideIndex.remove(ride_id)
+            DriverLocation.forget(ride_id)
+            PickupGeofence.remove_ride(ride_id)
+            RideTrail.finish(ride_id)
         
         return True
     
@@ -147,17 +371,11 @@ class Ride:
 
     @staticmethod
     def update_driver_location(ride_id, location):
-        """Update the driver's current location for an active ride"""
-        mongo.db.available_rides.update_one(
-            {'ride_id': ride_id},
-            {
-                '$set': {
-                    'location': location,
-                    'location_updated_at': datetime.utcnow()
-                }
-            }
-        )
-        return True
+        """Record the driver's current location; it is persisted by the next location flush"""
+        point = DriverLocation.parse(location)
+        if not point:
+            return None
+        return DriverLocation.record(ride_id, point)
 
     @staticmethod
     def get_driver_status(ride_id):
@@ -166,9 +384,10 @@ class Ride:
         if not ride:
             return None
 
-        available = mongo.db.available_rides.find_one({'ride_id': ride_id})
+        latest = DriverLocation.latest(ride_id)
+        available = latest or mongo.db.available_rides.find_one({'ride_id': ride_id})
         if available and available.get('location'):
-            location = available['location']
+            location = GeoUtils.from_geojson_point(available['location'])
         else:
             location = ride.get('pickup_location')
 
@@ -176,11 +395,7 @@ class Ride:
         eta_minutes = None
         if location and dropoff:
             try:
-                distance = GeoUtils.calculate_distance(
-                    location.get('coordinates'),
-                    dropoff.get('coordinates')
-                )
-                eta_minutes = int((distance / 40) * 60)
+                eta_minutes = EtaProfile.estimate_minutes(location, dropoff)
             except Exception:
                 eta_minutes = None
 
@@ -201,8 +416,9 @@ class Ride:
 
         completed_at = datetime.utcnow()
         duration = 0
-        if ride.get('created_at'):
-            duration = (completed_at - ride['created_at']).total_seconds() // 60
+        started_at = ride.get('departed_at') or ride.get('created_at')
+        if started_at:
+            duration = (completed_at - started_at).total_seconds() // 60
 
         ride_history = ride.copy()
         ride_history['completed_at'] = completed_at
@@ -212,28 +428,75 @@ class Ride:
         mongo.db.ride_history.insert_one(ride_history)
         mongo.db.rides.delete_one({'_id': ObjectId(ride_id)})
         mongo.db.available_rides.update_one({'ride_id': ride_id}, {'$set': {'active': False}})
+        RideIndex.remove(ride_id)
+        DriverLocation.forget(ride_id)
+        PickupGeofence.remove_ride(ride_id)
+        RideTrail.finish(ride_id)
 
         return True
 
     @staticmethod
     def get_route_order(ride_id, start_coords):
-        """Return passengers sorted by distance from start_coords"""
+        """Return passengers in optimized pickup order from start_coords to the ride's dropoff"""
         passengers = list(mongo.db.ride_passengers.find({'ride_id': ride_id}))
         if not passengers:
             return []
 
-        remaining = passengers[:]
-        route = []
-        current = start_coords
+        by_user = {p.get('user_id'): p for p in passengers}
+        passenger_ids = sorted(by_user, key=str)
 
-        while remaining:
-            nearest = min(
-                remaining,
-                key=lambda p: GeoUtils.calculate_distance(current, p['pickup_location'].get('coordinates', {}))
+        ride = None
+        if ObjectId.is_valid(ride_id):
+            ride = mongo.db.rides.find_one(
+                {'_id': ObjectId(ride_id)},
+                {'dropoff_location': 1, 'route_plan': 1}
+            )
+
+        # The plan stays valid until someone joins or leaves the ride
+        plan = (ride or {}).get('route_plan') or {}
+        if plan.get('passenger_ids') == passenger_ids:
+            return [by_user[user_id] for user_id in plan.get('order', []) if user_id in by_user]
+
+        route, distance = Ride.plan_route(
+            start_coords,
+            PointArray.from_points(p.get('pickup_location') for p in passengers),
+            (ride or {}).get('dropoff_location')
+        )
+        route = [passengers[index] for index in route]
+
+        if ride:
+            mongo.db.rides.update_one(
+                {'_id': ride['_id']},
+                {'$set': {'route_plan': {
+                    'passenger_ids': passenger_ids,
+                    'order': [p.get('user_id') for p in route],
+                    'distance_km': distance,
+                    'computed_at': datetime.utcnow()
+                }}}
             )
-            route.append(nearest)
-            current = nearest['pickup_location'].get('coordinates', current)
-            remaining.remove(nearest)
 
         return route
 
+    @staticmethod
+    def plan_route(start_coords, pickups, dropoff=None):
+        """Order pickups from start_coords towards dropoff; returns (pickup indices, km by road)"""
+        points = pickups if isinstance(pickups, PointArray) else PointArray.from_points(pickups)
+        missing = points.missing()
+        located = np.flatnonzero(~missing).tolist()
+        unlocated = np.flatnonzero(missing).tolist()
+
+        # One matrix over start, every located pickup and the dropoff when it is known
+        end = Point.parse(dropoff) if dropoff else None
+        has_end = end is not None
+        nodes = np.empty((len(located) + 1 + has_end, 2))
+        nodes[0] = tuple(Point.parse(start_coords))
+        nodes[1:len(located) + 1] = points.coords[located]
+        if has_end:
+            nodes[-1] = tuple(end)
+
+        # Road legs, like plan_insertion, so a cached plan's distance_km has one meaning
+        matrix = Routing.distance_matrix([tuple(node) for node in nodes])
+        order, distance = Ride.ROUTE_OPTIMIZER.optimize(matrix, has_end=has_end)
+
+        # Pickups without coordinates can't be placed, so they go last in stored order
+        return [located[node - 1] for node in order] + unlocated, round(distance, 2)
@@ -0,0 +1,184 @@
+from .. import mongo
+from ..utils.geo_utils import GeoUtils
+from ..utils.geo_point import Point, PointArray
+from datetime import datetime
+import math
+import threading
+import numpy as np
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lng, precision):
+    """Standard base32 geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            rng[0] = middle
+        else:
+            rng[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(lat degrees, lng degrees) spanned by one geohash cell at this precision"""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+class RideIndex:
+    """Per-process geohash buckets of active available_rides, kept in step by Ride writes"""
+
+    # Precision 6 cells are roughly 1.2 km x 0.6 km
+    PRECISION = 6
+
+    # Above this many cells a nearby search scans all rides instead of buckets
+    MAX_CELLS = 400
+
+    _rides = {}
+    # ride_id -> Point parsed once when the ride is indexed
+    _points = {}
+    _buckets = {}
+    _sectors = {}
+    _lock = threading.RLock()
+    ready = False
+    reconciled_at = None
+
+    @staticmethod
+    def _add(rides, points, buckets, sectors, ride):
+        ride_id = ride['ride_id']
+        rides[ride_id] = ride
+        point = Point.parse(ride.get('location'))
+        if point is not None:
+            points[ride_id] = point
+            buckets.setdefault(geohash_encode(point.lat, point.lng, RideIndex.PRECISION), set()).add(ride_id)
+        sectors.setdefault(ride.get('sector', ''), set()).add(ride_id)
+
+    @staticmethod
+    def _discard(ride_id):
+        ride = RideIndex._rides.pop(ride_id, None)
+        if not ride:
+            return
+        point = RideIndex._points.pop(ride_id, None)
+        if point is not None:
+            cell = geohash_encode(point.lat, point.lng, RideIndex.PRECISION)
+            bucket = RideIndex._buckets.get(cell)
+            if bucket:
+                bucket.discard(ride_id)
+                if not bucket:
+                    del RideIndex._buckets[cell]
+        members = RideIndex._sectors.get(ride.get('sector', ''))
+        if members:
+            members.discard(ride_id)
+
+    @staticmethod
+    def upsert(ride):
+        """Index an available_rides document, or drop it once it is inactive"""
+        ride_id = ride.get('ride_id')
+        if not ride_id:
+            return
+        with RideIndex._lock:
+            RideIndex._discard(ride_id)
+            if ride.get('active'):
+                RideIndex._add(RideIndex._rides, RideIndex._points, RideIndex._buckets, RideIndex._sectors, dict(ride))
+
+    @staticmethod
+    def update(ride_id, **fields):
+        """Apply a partial update written to available_rides"""
+        with RideIndex._lock:
+            ride = RideIndex._rides.get(ride_id)
+            if ride is None:
+                return
+            RideIndex.upsert({**ride, **fields})
+
+    @staticmethod
+    def remove(ride_id):
+        """Drop a ride that is no longer available"""
+        with RideIndex._lock:
+            RideIndex._discard(ride_id)
+
+    @staticmethod
+    def reconcile():
+        """Rebuild the index from Mongo, the source of truth, and swap it in"""
+        rides, points, buckets, sectors = {}, {}, {}, {}
+        for ride in mongo.db.available_rides.find({'active': True}):
+            if ride.get('ride_id'):
+                RideIndex._add(rides, points, buckets, sectors, ride)
+
+        with RideIndex._lock:
+            RideIndex._rides, RideIndex._points = rides, points
+            RideIndex._buckets, RideIndex._sectors = buckets, sectors
+            RideIndex.ready = True
+            RideIndex.reconciled_at = datetime.utcnow()
+
+        return len(rides)
+
+    @staticmethod
+    def by_sector(sector=''):
+        """Active rides newest first, optionally limited to one sector"""
+        with RideIndex._lock:
+            if sector:
+                rides = [RideIndex._rides[ride_id] for ride_id in RideIndex._sectors.get(sector, ())]
+            else:
+                rides = list(RideIndex._rides.values())
+
+        rides.sort(key=lambda ride: ride.get('created_at') or datetime.min, reverse=True)
+        # Callers decorate the results, so hand out copies
+        return [dict(ride) for ride in rides]
+
+    @staticmethod
+    def nearby(lat, lng, radius_km=5, limit=20, offset=0):
+        """Active rides within radius_km, nearest first, with distance_m like $geoNear"""
+        cell_lat, cell_lng = geohash_cell_size(RideIndex.PRECISION)
+        span_lat = radius_km / 111.32
+        span_lng = radius_km / max(111.32 * math.cos(math.radians(lat)), 1e-6)
+
+        steps_lat = int(span_lat / cell_lat) + 1
+        steps_lng = int(span_lng / cell_lng) + 1
+
+        # Every cell overlapping the radius' bounding box; wide searches cover most buckets
+        # anyway, so measuring every ride is cheaper than enumerating cells
+        cells = None
+        if (2 * steps_lat + 1) * (2 * steps_lng + 1) <= RideIndex.MAX_CELLS:
+            cells = set()
+            for i in range(-steps_lat, steps_lat + 1):
+                for j in range(-steps_lng, steps_lng + 1):
+                    cell_point_lat = min(max(lat + i * cell_lat, -90.0), 90.0)
+                    cell_point_lng = (lng + j * cell_lng + 180.0) % 360.0 - 180.0
+                    cells.add(geohash_encode(cell_point_lat, cell_point_lng, RideIndex.PRECISION))
+
+        with RideIndex._lock:
+            if cells is None:
+                candidate_ids = list(RideIndex._points)
+            else:
+                candidate_ids = [ride_id for cell in cells for ride_id in RideIndex._buckets.get(cell, ())]
+            candidates = [RideIndex._rides[ride_id] for ride_id in candidate_ids]
+            points = PointArray.from_points([RideIndex._points[ride_id] for ride_id in candidate_ids])
+
+        if not candidates:
+            return []
+
+        distances = GeoUtils.distances_from(Point(lat, lng), points, decimals=None)
+        order = [index for index in np.argsort(distances, kind='stable') if distances[index] <= radius_km]
+
+        results = []
+        for index in order[offset:offset + limit]:
+            ride = dict(candidates[index])
+            ride['distance_m'] = float(distances[index]) * 1000
+            results.append(ride)
+        return results
@@ -0,0 +1,207 @@
+from .. import mongo
+from ..utils.trail_codec import TrailCodec
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+import threading
+
+
+class RideTrail:
+    """
+    Driver breadcrumbs per ride
+
+    Every ping goes to the location_pings time-series collection, in batches.
+    Shortly after a ride ends its pings are simplified and encoded into one
+    ride_trails document, and the raw pings are deleted; those of rides that
+    never finalize expire after RAW_TTL_DAYS.
+    """
+
+    # Largest distance a dropped point may be from the stored trail at its own time
+    SIMPLIFY_METRES = 10
+    RAW_TTL_DAYS = 7
+    # Wait after a ride ends for every process to flush its buffered pings
+    FINALIZE_DELAY_SECONDS = 30
+    # A finalize claimed longer ago than this was abandoned and may be retried
+    FINALIZE_LEASE_SECONDS = 300
+
+    # ride_id -> [(datetime, lat, lng)] not yet written
+    _pending = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def configure(config):
+        """Apply trail settings from the Flask config"""
+        RideTrail.SIMPLIFY_METRES = config.get('TRAIL_SIMPLIFY_METRES', 10)
+        RideTrail.RAW_TTL_DAYS = config.get('TRAIL_RAW_TTL_DAYS', 7)
+        RideTrail.FINALIZE_DELAY_SECONDS = config.get('TRAIL_FINALIZE_DELAY_SECONDS', 30)
+
+    @staticmethod
+    def ensure_indexes():
+        """Create the raw ping time-series collection and index the finished trails"""
+        mongo.db.ride_trails.create_index('ride_id', unique=True)
+        mongo.db.ride_trails.create_index([('status', 1), ('finalize_after', 1)])
+        try:
+            mongo.db.create_collection(
+                'location_pings',
+                timeseries={'timeField': 'ts', 'metaField': 'ride_id', 'granularity': 'seconds'},
+                expireAfterSeconds=int(RideTrail.RAW_TTL_DAYS * 86400)
+            )
+        except CollectionInvalid:
+            # Already created by an earlier start; keep its retention in step with the config
+            mongo.db.command('collMod', 'location_pings',
+                             expireAfterSeconds=int(RideTrail.RAW_TTL_DAYS * 86400))
+
+    @staticmethod
+    def append(ride_id, point, when):
+        """Buffer a driver ping (GeoJSON Point) for the next flush"""
+        lng, lat = point['coordinates'][:2]
+        with RideTrail._lock:
+            RideTrail._pending.setdefault(ride_id, []).append((when, lat, lng))
+
+    @staticmethod
+    def flush():
+        """Write every buffered ping with one insert_many; returns the number written"""
+        with RideTrail._lock:
+            pending, RideTrail._pending = RideTrail._pending, {}
+        if not pending:
+            return 0
+
+        docs = [
+            {'ts': when, 'ride_id': ride_id, 'lat': lat, 'lng': lng}
+            for ride_id, pings in pending.items()
+            for when, lat, lng in pings
+        ]
+        try:
+            mongo.db.location_pings.insert_many(docs, ordered=False)
+        except Exception:
+            # Retry the batch with the next flush; a partial write may leave duplicates,
+            # which finalize drops
+            with RideTrail._lock:
+                for ride_id, pings in pending.items():
+                    RideTrail._pending[ride_id] = pings + RideTrail._pending.get(ride_id, [])
+            raise
+        return len(docs)
+
+    @staticmethod
+    def finish(ride_id):
+        """Schedule a finished ride's trail to be compressed once late pings have landed"""
+        now = datetime.utcnow()
+        try:
+            mongo.db.ride_trails.update_one(
+                {'ride_id': ride_id},
+                {'$setOnInsert': {
+                    'ride_id': ride_id,
+                    'status': 'pending',
+                    'finalize_after': now + timedelta(seconds=RideTrail.FINALIZE_DELAY_SECONDS),
+                    'created_at': now
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another process scheduled it at the same moment
+            pass
+
+    @staticmethod
+    def finalize_due(limit=50):
+        """Compress trails whose grace period is over; returns the number finalized"""
+        finalized = 0
+        for _ in range(limit):
+            now = datetime.utcnow()
+            # Any process may claim a trail; one whose finalizer died is taken over after the lease
+            trail = mongo.db.ride_trails.find_one_and_update(
+                {'$or': [
+                    {'status': 'pending', 'finalize_after': {'$lte': now}},
+                    {'status': 'finalizing', 'claimed_until': {'$lte': now}}
+                ]},
+                {'$set': {
+                    'status': 'finalizing',
+                    'claimed_until': now + timedelta(seconds=RideTrail.FINALIZE_LEASE_SECONDS)
+                }},
+                sort=[('finalize_after', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if trail is None:
+                break
+            RideTrail.finalize(trail['ride_id'])
+            finalized += 1
+        return finalized
+
+    @staticmethod
+    def _raw(ride_id):
+        """Stored pings of a ride as (datetime, lat, lng), oldest first, one per second"""
+        pings = []
+        last_second = None
+        cursor = mongo.db.location_pings.find(
+            {'ride_id': ride_id}, {'_id': 0, 'ts': 1, 'lat': 1, 'lng': 1}
+        ).sort('ts', 1)
+        for ping in cursor:
+            # Flush retries can store a ping twice, and sub-second pings add nothing to a replay
+            second = ping['ts'].replace(microsecond=0)
+            if second != last_second:
+                pings.append((second, ping['lat'], ping['lng']))
+                last_second = second
+        return pings
+
+    @staticmethod
+    def finalize(ride_id):
+        """Simplify and encode a ride's pings into its ride_trails document, then drop them"""
+        pings = RideTrail._raw(ride_id)
+        trail = {
+            'status': 'ready',
+            'points': 0,
+            'raw_points': len(pings),
+            'polyline': '',
+            'times': '',
+            'distance_km': 0.0,
+            'simplify_metres': RideTrail.SIMPLIFY_METRES,
+            'finalized_at': datetime.utcnow()
+        }
+        if pings:
+            started_at = pings[0][0]
+            seconds = [int((when - started_at).total_seconds()) for when, _, _ in pings]
+            lats = [lat for _, lat, _ in pings]
+            lngs = [lng for _, _, lng in pings]
+            keep = TrailCodec.simplify(lats, lngs, seconds, RideTrail.SIMPLIFY_METRES)
+            kept_lats = [lats[i] for i in keep]
+            kept_lngs = [lngs[i] for i in keep]
+            trail.update({
+                'points': len(keep),
+                'polyline': TrailCodec.encode_polyline(kept_lats, kept_lngs),
+                # Seconds since started_at of each kept point
+                'times': TrailCodec.encode_deltas([seconds[i] for i in keep]),
+                'started_at': started_at,
+                'ended_at': pings[-1][0],
+                # Measured on the simplified trail: GPS jitter inflates the raw one's length
+                'distance_km': round(TrailCodec.length_metres(kept_lats, kept_lngs) / 1000, 3)
+            })
+
+        mongo.db.ride_trails.update_one(
+            {'ride_id': ride_id},
+            {'$set': trail, '$unset': {'claimed_until': '', 'finalize_after': ''}}
+        )
+        # Raw pings of other rides expire by TTL; this ride's are no longer needed
+        mongo.db.location_pings.delete_many({'ride_id': ride_id})
+        return trail
+
+    @staticmethod
+    def get(ride_id):
+        """The finished trail document of a ride, or None while it is still raw"""
+        return mongo.db.ride_trails.find_one({'ride_id': ride_id, 'status': 'ready'}, {'_id': 0})
+
+    @staticmethod
+    def points(ride_id, trail=None):
+        """
+        A ride's trail as (datetime, lat, lng), oldest first
+
+        Finished rides are decoded from their compressed trail; rides under way,
+        or not yet finalized, are read from the raw pings.
+        """
+        trail = trail or RideTrail.get(ride_id)
+        if trail is None:
+            yield from RideTrail._raw(ride_id)
+            return
+        if not trail['points']:
+            return
+        lats, lngs = TrailCodec.decode_polyline(trail['polyline'])
+        for offset, lat, lng in zip(TrailCodec.decode_deltas(trail['times']), lats, lngs):
+            yield trail['started_at'] + timedelta(seconds=offset), lat, lng
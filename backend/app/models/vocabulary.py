@@ -0,0 +1,77 @@
+from .. import mongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import threading
+
+class Vocabulary:
+    """Global hobby term <-> integer id mapping shared by every process"""
+
+    # Process-local copy of hobby_vocabulary; entries never change once written
+    _ids = {}
+    _terms = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def ensure_indexes():
+        """Terms and ids are both unique so concurrent interning converges"""
+        mongo.db.hobby_vocabulary.create_index('term', unique=True)
+        mongo.db.hobby_vocabulary.create_index('term_id', unique=True)
+
+    @staticmethod
+    def reset():
+        """Forget the cached mapping (used when switching databases)"""
+        with Vocabulary._lock:
+            Vocabulary._ids = {}
+            Vocabulary._terms = {}
+
+    @staticmethod
+    def _remember(entries):
+        for entry in entries:
+            Vocabulary._ids[entry['term']] = entry['term_id']
+            Vocabulary._terms[entry['term_id']] = entry['term']
+
+    @staticmethod
+    def _allocate(count):
+        """Reserve a block of consecutive ids from the vocabulary counter"""
+        counter = mongo.db.counters.find_one_and_update(
+            {'_id': 'hobby_vocabulary'},
+            {'$inc': {'seq': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return range(counter['seq'] - count + 1, counter['seq'] + 1)
+
+    @staticmethod
+    def intern(terms):
+        """Return the sorted, de-duplicated ids for terms, assigning ids to new terms"""
+        terms = set(terms or [])
+        missing = [term for term in terms if term not in Vocabulary._ids]
+
+        if missing:
+            with Vocabulary._lock:
+                # Another process may already have assigned ids to some of them
+                Vocabulary._remember(mongo.db.hobby_vocabulary.find(
+                    {'term': {'$in': missing}}, {'_id': 0, 'term': 1, 'term_id': 1}
+                ))
+                missing = [term for term in missing if term not in Vocabulary._ids]
+
+                for term, term_id in zip(missing, Vocabulary._allocate(len(missing)) if missing else []):
+                    try:
+                        mongo.db.hobby_vocabulary.insert_one({'term': term, 'term_id': term_id})
+                        Vocabulary._remember([{'term': term, 'term_id': term_id}])
+                    except DuplicateKeyError:
+                        # Lost the race for this term; the id we reserved is left unused
+                        Vocabulary._remember([mongo.db.hobby_vocabulary.find_one({'term': term})])
+
+        return sorted(Vocabulary._ids[term] for term in terms)
+
+    @staticmethod
+    def terms(term_ids):
+        """Map ids back to their terms, keeping the order of term_ids"""
+        term_ids = list(term_ids or [])
+        missing = [term_id for term_id in term_ids if term_id not in Vocabulary._terms]
+        if missing:
+            Vocabulary._remember(mongo.db.hobby_vocabulary.find(
+                {'term_id': {'$in': missing}}, {'_id': 0, 'term': 1, 'term_id': 1}
+            ))
+        return [Vocabulary._terms[term_id] for term_id in term_ids if term_id in Vocabulary._terms]
@@ -1,5 +1,6 @@
 # /backend/app/routes/health_routes.py
 from flask import Blueprint, jsonify
+from ..tasks.interest_updater import get_interest_updater_status
 import datetime
 
 health_bp = Blueprint('health', __name__)
@@ -14,4 +15,20 @@ def health_check():
         'timestamp': datetime.datetime.utcnow().isoformat(),
         'service': 'RideMatch API',
         'message': 'API is running correctly'
-    }), 200
\ No newline at end of file
+    }), 200
+
+@health_bp.route('/interest-updater', methods=['GET'])
+def interest_updater_status():
+    """
+    Progress and metrics of the background interest updater
+    """
+    status = get_interest_updater_status()
+    for key, value in list(status.items()):
+        if isinstance(value, datetime.datetime):
+            status[key] = value.isoformat()
+        elif isinstance(value, dict):
+            status[key] = {
+                k: v.isoformat() if isinstance(v, datetime.datetime) else v
+                for k, v in value.items()
+            }
+    return jsonify(status), 200
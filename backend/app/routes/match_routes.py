@@ -14,3 +14,8 @@ def get_companions():
 @jwt_required()
 def process_hobbies():
     return MatchController.process_hobbies()
+
+@match_bp.route('/status', methods=['GET'])
+@jwt_required()
+def get_match_status():
+    return MatchController.get_match_status()
@@ -2,6 +2,7 @@
 from flask import Blueprint
 from flask_jwt_extended import jwt_required
 from ..controllers.ride_history_controller import RideHistoryController
+from ..utils.decorators import admin_required
 
 ride_history_bp = Blueprint('ride_history', __name__)
 
@@ -25,6 +26,17 @@ def rate_ride(ride_id):
 def get_receipt(ride_id):
     return RideHistoryController.get_ride_receipt(ride_id)
 
+@ride_history_bp.route('/<ride_id>/trail', methods=['GET'])
+@jwt_required()
+def get_trail(ride_id):
+    return RideHistoryController.get_ride_trail(ride_id)
+
+@ride_history_bp.route('/<ride_id>/trail/review', methods=['GET'])
+@admin_required
+def review_trail(ride_id):
+    """Any ride's trail, for admins handling safety reports and fare disputes"""
+    return RideHistoryController.get_ride_trail(ride_id, participants_only=False)
+
 @ride_history_bp.route('/<ride_id>/reuse', methods=['POST'])
 @jwt_required()
 def reuse_ride(ride_id):
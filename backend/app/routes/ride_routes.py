@@ -10,16 +10,41 @@ ride_bp = Blueprint('ride', __name__)
 def create_ride():
     return RideController.create_ride()
 
+@ride_bp.route('/quote', methods=['POST'])
+@jwt_required()
+def quote_ride():
+    return RideController.quote_ride()
+
 @ride_bp.route('/available', methods=['GET'])
 @jwt_required()
 def get_available_rides():
     return RideController.get_available_rides()
 
+@ride_bp.route('/nearby', methods=['GET'])
+@jwt_required()
+def get_nearby_rides():
+    return RideController.get_nearby_rides()
+
 @ride_bp.route('/join', methods=['POST'])
 @jwt_required()
 def join_ride():
     return RideController.join_ride()
 
+@ride_bp.route('/dispatch', methods=['POST'])
+@jwt_required()
+def submit_join_intent():
+    return RideController.submit_join_intent()
+
+@ride_bp.route('/dispatch', methods=['GET'])
+@jwt_required()
+def get_join_intent():
+    return RideController.get_join_intent()
+
+@ride_bp.route('/dispatch', methods=['DELETE'])
+@jwt_required()
+def cancel_join_intent():
+    return RideController.cancel_join_intent()
+
 @ride_bp.route('/arrival', methods=['POST'])
 @jwt_required()
 def set_arrival_status():
@@ -1,11 +1,21 @@
 # /backend/app/schemas/ride_schema.py
-from marshmallow import Schema, fields, validate
+from marshmallow import Schema, fields, validate, post_load, ValidationError
+from ..utils.geo_point import Point
 
 class LocationSchema(Schema):
     """Schema for location data"""
     address = fields.Str(required=True)
     coordinates = fields.Dict(keys=fields.Str(), values=fields.Float(), required=True)
 
+    @post_load
+    def normalize_coordinates(self, data, **kwargs):
+        """Store every location with {'latitude', 'longitude'} keys, whichever the client sent"""
+        point = Point.parse(data['coordinates'])
+        if point is None or not point.is_valid():
+            raise ValidationError('Expected latitude/longitude in range', 'coordinates')
+        data['coordinates'] = point.to_coordinates()
+        return data
+
 class CreateRideSchema(Schema):
     """Schema for creating a new ride"""
     pickup_location = fields.Nested(LocationSchema, required=True)
@@ -17,10 +27,17 @@ class CreateRideSchema(Schema):
     payment_method = fields.Str(required=True, validate=validate.OneOf(['cash', 'card', 'wallet']))
     promo_code = fields.Str(missing='')
     group_join = fields.Bool(missing=False)
-    fare = fields.Float(required=True, validate=validate.Range(min=0))
-    distance = fields.Float(required=True, validate=validate.Range(min=0))
+    # Still accepted from older clients, but the server prices every ride itself
+    fare = fields.Float(validate=validate.Range(min=0))
+    distance = fields.Float(validate=validate.Range(min=0))
     sector = fields.Str(missing='')
 
+class RideQuoteSchema(Schema):
+    """Schema for pricing a trip before creating it"""
+    pickup_location = fields.Nested(LocationSchema, required=True)
+    dropoff_location = fields.Nested(LocationSchema, required=True)
+    car_type = fields.Str(missing='Basic', validate=validate.OneOf(['Basic', 'Premium', 'Premium+', 'SUV']))
+
 class JoinRideSchema(Schema):
     """Schema for joining an existing ride"""
     ride_id = fields.Str(required=True)
@@ -29,6 +46,13 @@ class JoinRideSchema(Schema):
     seat_count = fields.Int(missing=1, validate=validate.Range(min=1, max=4))
     is_group_leader = fields.Bool(missing=False)
 
+class JoinIntentSchema(Schema):
+    """Schema for asking dispatch to find a ride"""
+    pickup_location = fields.Nested(LocationSchema, required=True)
+    seat_count = fields.Int(missing=1, validate=validate.Range(min=1, max=4))
+    car_type = fields.Str(missing=None, allow_none=True, validate=validate.OneOf(['Basic', 'Premium', 'Premium+', 'SUV']))
+    group_join = fields.Bool(missing=False)
+
 class ArrivalStatusSchema(Schema):
     """Schema for updating arrival status"""
     ride_id = fields.Str(required=True)
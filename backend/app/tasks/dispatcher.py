@@ -0,0 +1,34 @@
+import threading
+import time
+import logging
+from .. import socketio
+from ..models.dispatch import Dispatch
+
+logger = logging.getLogger(__name__)
+
+
+def start_dispatcher(window_seconds: float = 3) -> None:
+    """Start background thread that solves a dispatch window every few seconds."""
+
+    def _run():
+        while True:
+            started = time.monotonic()
+            try:
+                stats = Dispatch.run_window()
+                if stats and stats['assigned']:
+                    logger.info(
+                        f"Dispatch assigned {stats['assigned']} of {stats['intents']} riders "
+                        f"to {stats['rides']} rides in {stats['seconds']}s"
+                    )
+                    for user_id, ride_id, passenger_id in stats['assignments']:
+                        socketio.emit('ride_assigned', {
+                            'ride_id': ride_id,
+                            'passenger_id': passenger_id
+                        }, room=f"user_{user_id}")
+            except Exception as exc:
+                logger.error(f"Dispatch window failed: {exc}")
+            # Windows start on a fixed cadence however long solving took
+            time.sleep(max(0.0, window_seconds - (time.monotonic() - started)))
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
@@ -0,0 +1,27 @@
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from ..models.eta_profile import EtaProfile
+
+logger = logging.getLogger(__name__)
+
+
+def start_eta_profiles(rebuild_hours: float = 6, reload_seconds: int = 60) -> None:
+    """Start background thread that rebuilds the ETA table when stale and reloads newer ones."""
+
+    def _run():
+        while True:
+            try:
+                # Any process may rebuild; the stored built_at keeps the others from repeating it
+                built_at = EtaProfile.built_at()
+                if built_at is None or datetime.utcnow() - built_at >= timedelta(hours=rebuild_hours):
+                    stats = EtaProfile.build()
+                    logger.info(f"Built ETA table from {stats['samples']} rides ({stats['cells']} cells)")
+                EtaProfile.reload()
+            except Exception as exc:
+                logger.error(f"ETA profile refresh failed: {exc}")
+            time.sleep(reload_seconds)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
@@ -1,21 +1,190 @@
 import threading
 import time
 import logging
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from .. import mongo
 from ..models.match import Match
+from ..utils.nlp_processor import NLPProcessor
 
 logger = logging.getLogger(__name__)
 
+# task_state document holding the watermark, checkpoint and run metrics
+STATE_ID = 'interest_updater'
 
-def start_interest_updater(interval_hours: int = 24) -> None:
-    """Start background thread that periodically refreshes user hobby data."""
+
+def get_interest_updater_status():
+    """Return the stored watermark, in-progress checkpoint and last run metrics."""
+    state = mongo.db.task_state.find_one({'_id': STATE_ID}) or {}
+    state.pop('_id', None)
+    state.pop('resume_after_id', None)
+    return state
+
+
+def _changed_since(watermark):
+    """Query for hobby documents that may need reprocessing after the watermark."""
+    if watermark is None:
+        return {}
+    return {'$or': [
+        {'description_updated_at': {'$gte': watermark}},
+        {'extractor_version': {'$ne': NLPProcessor.EXTRACTOR_VERSION}}
+    ]}
+
+
+def run_interest_update(chunk_size: int = 500) -> dict:
+    """Reprocess hobby documents changed since the last watermark, resuming an interrupted run."""
+    state = mongo.db.task_state.find_one({'_id': STATE_ID}) or {}
+
+    # A watermark taken under another extractor version does not cover current output
+    watermark = state.get('watermark')
+    if state.get('extractor_version') != NLPProcessor.EXTRACTOR_VERSION:
+        watermark = None
+
+    if state.get('run_started_at'):
+        run_started_at = state['run_started_at']
+        resume_after_id = state.get('resume_after_id')
+        counts = state.get('current_run', {})
+        logger.info(f"Resuming interest update started at {run_started_at}")
+    else:
+        run_started_at = datetime.utcnow()
+        resume_after_id = None
+        counts = {}
+        mongo.db.task_state.update_one(
+            {'_id': STATE_ID},
+            {'$set': {'run_started_at': run_started_at, 'resume_after_id': None, 'current_run': counts}},
+            upsert=True
+        )
+
+    counts = {key: counts.get(key, 0) for key in ('scanned', 'updated', 'skipped', 'chunks', 'processing_seconds')}
+
+    while True:
+        query = _changed_since(watermark)
+        if resume_after_id is not None:
+            query = {'$and': [query, {'_id': {'$gt': resume_after_id}}]}
+
+        chunk = list(mongo.db.user_hobbies.find(query, Match.REPROCESS_PROJECTION)
+                     .sort('_id', 1)
+                     .limit(chunk_size))
+        if not chunk:
+            break
+
+        clock = time.monotonic()
+        for key, value in Match.reprocess_hobbies(chunk).items():
+            counts[key] += value
+        counts['chunks'] += 1
+        counts['processing_seconds'] = round(counts['processing_seconds'] + time.monotonic() - clock, 3)
+        resume_after_id = chunk[-1]['_id']
+
+        # Checkpoint after every chunk so a restart continues from here
+        mongo.db.task_state.update_one(
+            {'_id': STATE_ID},
+            {'$set': {'resume_after_id': resume_after_id, 'current_run': counts}}
+        )
+
+    finished_at = datetime.utcnow()
+    last_run = {
+        **counts,
+        'started_at': run_started_at,
+        'finished_at': finished_at,
+        'duration_seconds': round((finished_at - run_started_at).total_seconds(), 3)
+    }
+
+    # Anything changed after the run started is picked up next time
+    mongo.db.task_state.update_one(
+        {'_id': STATE_ID},
+        {
+            '$set': {
+                'watermark': run_started_at,
+                'extractor_version': NLPProcessor.EXTRACTOR_VERSION,
+                'last_run': last_run
+            },
+            '$unset': {'run_started_at': '', 'resume_after_id': '', 'current_run': ''}
+        }
+    )
+
+    return last_run
+
+
+def run_full_recompute(reprocess: bool = False, workers=None) -> dict:
+    """Rebuild every user's stored matches with the batch engine, optionally reprocessing all hobbies first."""
+    started_at = datetime.utcnow()
+    if reprocess:
+        counts = Match.update_all_user_hobbies(full_recompute=True, workers=workers)
+        users = counts['scanned']
+    else:
+        users = Match.recompute_all_matches(workers=workers)
+
+    finished_at = datetime.utcnow()
+    last_full_recompute = {
+        'users': users,
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'duration_seconds': round((finished_at - started_at).total_seconds(), 3)
+    }
+    mongo.db.task_state.update_one(
+        {'_id': STATE_ID},
+        {'$set': {'last_full_recompute': last_full_recompute}},
+        upsert=True
+    )
+    return last_full_recompute
+
+
+def _claim_full_recompute(interval_days: float) -> bool:
+    """Take the next scheduled full recompute so only one process runs it."""
+    now = datetime.utcnow()
+    try:
+        # Matches when the next run is due, or creates the schedule on first use
+        mongo.db.task_state.find_one_and_update(
+            {'_id': STATE_ID, '$or': [
+                {'full_recompute_due_at': {'$lte': now}},
+                {'full_recompute_due_at': {'$exists': False}}
+            ]},
+            {'$set': {'full_recompute_due_at': now + timedelta(days=interval_days)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another process holds the current schedule
+        return False
+    return True
+
+
+def start_interest_updater(interval_hours: int = 24, retry_minutes: int = 5,
+                           full_recompute_days: float = 7) -> None:
+    """
+    Start background thread that periodically refreshes user hobby data.
+
+    Changed users are rematched incrementally by the match maintainer. Every
+    full_recompute_days (0 disables) one process also rebuilds all stored
+    matches after its update, which re-ranks lists the incremental path only
+    patches, such as those of users whose matches were deleted.
+    """
 
     def _run():
         while True:
             try:
                 logger.info("Running periodic interest update")
-                Match.update_all_user_hobbies()
+                stats = run_interest_update()
+                logger.info(
+                    f"Interest update finished: {stats['updated']} updated, "
+                    f"{stats['skipped']} unchanged in {stats['duration_seconds']}s"
+                )
             except Exception as exc:
+                # The checkpoint is kept, so retry soon instead of waiting a full interval
                 logger.error(f"Interest update failed: {exc}")
+                time.sleep(retry_minutes * 60)
+                continue
+
+            try:
+                if full_recompute_days and _claim_full_recompute(full_recompute_days):
+                    logger.info("Running scheduled full match recompute")
+                    stats = run_full_recompute()
+                    logger.info(
+                        f"Full match recompute finished: {stats['users']} users "
+                        f"in {stats['duration_seconds']}s"
+                    )
+            except Exception as exc:
+                # Next attempt is at the following scheduled time
+                logger.error(f"Full match recompute failed: {exc}")
             time.sleep(interval_hours * 3600)
 
     thread = threading.Thread(target=_run, daemon=True)
@@ -0,0 +1,31 @@
+import threading
+import time
+import logging
+from ..models.driver_location import DriverLocation
+from ..models.ride_trail import RideTrail
+
+logger = logging.getLogger(__name__)
+
+
+def start_location_flusher(interval_seconds: float = 2) -> None:
+    """Start background thread that writes buffered driver positions and trail pings to Mongo in batches
+    and compresses the trails of finished rides."""
+
+    def _run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                DriverLocation.flush()
+            except Exception as exc:
+                logger.error(f"Driver location flush failed: {exc}")
+            try:
+                RideTrail.flush()
+            except Exception as exc:
+                logger.error(f"Ride trail flush failed: {exc}")
+            try:
+                RideTrail.finalize_due()
+            except Exception as exc:
+                logger.error(f"Ride trail finalize failed: {exc}")
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
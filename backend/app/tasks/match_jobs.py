@@ -0,0 +1,55 @@
+import threading
+import time
+import logging
+from ..models.match import Match
+from ..models.match_job import MatchJob
+
+logger = logging.getLogger(__name__)
+
+
+def run_match_job(job):
+    """Extract hobbies (when a description was submitted) and recompute the user's matches."""
+    user_id = job['user_id']
+    description = job.get('description')
+
+    if description is not None:
+        # The job rebuilds the user's own list below; the maintainer only handles the others
+        keywords = Match.store_hobbies(user_id, description, recompute_self=False)
+    else:
+        keywords = Match.get_keywords(user_id)
+
+    # A stored description that yields no keywords still has to clear the user's old list
+    matches = Match.compute_matches(user_id) if keywords or description is not None else []
+    return {'keywords': keywords, 'match_count': len(matches)}
+
+
+def start_match_job_workers(workers: int = 2, poll_seconds: float = 1.0) -> None:
+    """Start background threads that consume the match_jobs queue."""
+    try:
+        requeued = MatchJob.requeue_stale()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted match jobs")
+    except Exception as exc:
+        logger.error(f"Failed to requeue interrupted match jobs: {exc}")
+
+    def _run():
+        while True:
+            try:
+                job = MatchJob.claim()
+            except Exception as exc:
+                logger.error(f"Failed to claim match job: {exc}")
+                job = None
+
+            if not job:
+                time.sleep(poll_seconds)
+                continue
+
+            try:
+                MatchJob.complete(job['_id'], run_match_job(job))
+            except Exception as exc:
+                logger.error(f"Match job {job['_id']} failed: {exc}")
+                MatchJob.fail(job['_id'], str(exc))
+
+    for _ in range(workers):
+        thread = threading.Thread(target=_run, daemon=True)
+        thread.start()
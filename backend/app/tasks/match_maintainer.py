@@ -0,0 +1,31 @@
+import threading
+import time
+import logging
+from ..models.match import Match
+
+logger = logging.getLogger(__name__)
+
+
+def start_match_maintainer(interval_seconds: int = 5, batch_size: int = 100) -> None:
+    """Start background thread that applies queued hobby changes to match lists."""
+
+    def _run():
+        while True:
+            try:
+                requeued = Match.requeue_stale_dirty_users()
+                if requeued:
+                    logger.info(f"Requeued {requeued} interrupted hobby changes")
+            except Exception as exc:
+                logger.error(f"Failed to requeue interrupted hobby changes: {exc}")
+            try:
+                processed = Match.process_dirty_users(limit=batch_size)
+                if processed:
+                    logger.info(f"Updated matches for {processed} changed users")
+                    # Keep draining while there is a backlog
+                    continue
+            except Exception as exc:
+                logger.error(f"Match maintenance failed: {exc}")
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
@@ -0,0 +1,26 @@
+import threading
+import time
+import logging
+from ..models.ride_index import RideIndex
+from ..models.pickup_geofence import PickupGeofence
+
+logger = logging.getLogger(__name__)
+
+
+def start_ride_index_reconciler(interval_seconds: int = 30) -> None:
+    """Start background thread that loads the ride index and pickup geofences and periodically rebuilds them from Mongo."""
+
+    def _run():
+        while True:
+            try:
+                RideIndex.reconcile()
+            except Exception as exc:
+                logger.error(f"Ride index reconciliation failed: {exc}")
+            try:
+                PickupGeofence.reconcile()
+            except Exception as exc:
+                logger.error(f"Pickup geofence reconciliation failed: {exc}")
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
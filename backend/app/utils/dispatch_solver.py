@@ -0,0 +1,205 @@
+import math
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from .geo_utils import GeoUtils
+
+
+class DispatchSolver:
+    """Assigns a window of riders to rides with free seats, minimizing total detour"""
+
+    INFEASIBLE = 1e6
+
+    def __init__(self, max_pickup_km=3, max_detour_km=5, rounds=3, candidates_per_rider=16,
+                 max_matrix_cells=4_000_000):
+        self.max_pickup_km = max_pickup_km
+        self.max_detour_km = max_detour_km
+        # Later rounds place riders bumped because a ride ran out of seats
+        self.rounds = rounds
+        # Only each rider's cheapest rides enter the assignment, which keeps it sparse
+        self.candidates_per_rider = candidates_per_rider
+        # Groups whose cost matrix would exceed this are split into smaller ones
+        self.max_matrix_cells = max_matrix_cells
+
+    @staticmethod
+    def _planar(points, lat0):
+        """Equirectangular km coordinates, accurate enough to prune at city scale"""
+        return np.column_stack((points[:, 0] * 111.32, points[:, 1] * 111.32 * math.cos(math.radians(lat0))))
+
+    @staticmethod
+    def _z_order(points):
+        """Rank of each point along a Z-order curve, so nearby points get nearby ranks"""
+        if not len(points):
+            return np.zeros(0, dtype=np.int64)
+        spans = np.ptp(points, axis=0)
+        cells = ((points - points.min(axis=0)) / np.where(spans > 0, spans, 1) * 65535).astype(np.uint64)
+        key = np.zeros(len(points), dtype=np.uint64)
+        for bit in range(16):
+            key |= ((cells[:, 0] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+            key |= ((cells[:, 1] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+        ranks = np.empty(len(points), dtype=np.int64)
+        ranks[np.argsort(key, kind='stable')] = np.arange(len(points))
+        return ranks
+
+    def candidate_pairs(self, riders, starts):
+        """(rider indices, ride indices) of every pickup within max_pickup_km of a ride, by KD-tree"""
+        if not len(riders) or not len(starts):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        lat0 = float(np.nanmean(riders[:, 0]))
+        tree = cKDTree(self._planar(starts, lat0))
+        # A little slack for the projection; exact distances are checked afterwards
+        neighbours = tree.query_ball_point(self._planar(riders, lat0), r=self.max_pickup_km * 1.02)
+        rider_index = np.repeat(np.arange(len(riders)), [len(n) for n in neighbours])
+        ride_index = np.fromiter((r for n in neighbours for r in n), dtype=np.int64, count=len(rider_index))
+        return rider_index, ride_index
+
+    def solve(self, riders, seats, rider_car_types, starts, ends, slots, ride_car_types, excluded=()):
+        """
+        Assign riders to rides
+
+        Args:
+            riders: (n, 2) [lat, lng] pickups
+            seats: Seats each rider needs
+            rider_car_types: Requested car type per rider, None for any
+            starts: (m, 2) current ride positions
+            ends: (m, 2) ride dropoffs, NaN rows where unknown
+            slots: Free seats per ride
+            ride_car_types: Car type per ride
+            excluded: (rider index, ride index) pairs that must not be matched
+
+        Returns:
+            List of (rider index, ride index, detour km)
+        """
+        riders = np.asarray(riders, dtype=np.float64).reshape(-1, 2)
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        seats = np.asarray(seats, dtype=np.int64)
+        remaining = np.asarray(slots, dtype=np.int64).copy()
+
+        # Spatial pruning, then exact distances for the surviving pairs only
+        rider_index, ride_index = self.candidate_pairs(riders, starts)
+        pickup_km = GeoUtils._haversine(riders[rider_index, 0], riders[rider_index, 1],
+                                        starts[ride_index, 0], starts[ride_index, 1])
+        onward_km = GeoUtils._haversine(riders[rider_index, 0], riders[rider_index, 1],
+                                        ends[ride_index, 0], ends[ride_index, 1])
+        direct_km = GeoUtils._haversine(starts[ride_index, 0], starts[ride_index, 1],
+                                        ends[ride_index, 0], ends[ride_index, 1])
+        # Without a known dropoff the detour is the drive to the pickup
+        detour_km = np.where(np.isnan(onward_km), pickup_km, pickup_km + onward_km - direct_km)
+
+        # Car type codes: -1 on a rider means any car
+        codes = {car_type: code for code, car_type in enumerate(sorted(set(ride_car_types), key=str))}
+        wanted = np.array([codes.get(car_type, -2) if car_type else -1 for car_type in rider_car_types], dtype=np.int64)
+        offered = np.array([codes[car_type] for car_type in ride_car_types], dtype=np.int64)
+        pair_keys = rider_index * len(starts) + ride_index
+        excluded_keys = np.array([rider * len(starts) + ride for rider, ride in excluded], dtype=np.int64)
+
+        keep = (pickup_km <= self.max_pickup_km) & (detour_km <= self.max_detour_km) & \
+            (seats[rider_index] <= remaining[ride_index]) & \
+            ((wanted[rider_index] < 0) | (wanted[rider_index] == offered[ride_index])) & \
+            ~np.isin(pair_keys, excluded_keys)
+        rider_index, ride_index = rider_index[keep], ride_index[keep]
+        detour_km = np.maximum(detour_km[keep], 0)
+        # Closer pickups break ties between equal detours
+        cost = detour_km + 0.01 * pickup_km[keep]
+
+        # Rank each rider's pairs by cost and drop all but the cheapest few
+        order = np.lexsort((cost, rider_index))
+        rider_index, ride_index, cost, detour_km = rider_index[order], ride_index[order], cost[order], detour_km[order]
+        first = np.searchsorted(rider_index, rider_index, side='left')
+        cheapest = np.arange(len(rider_index)) - first < self.candidates_per_rider
+        rider_index, ride_index, cost, detour_km = \
+            rider_index[cheapest], ride_index[cheapest], cost[cheapest], detour_km[cheapest]
+
+        ride_rank = self._z_order(starts)
+        assignments = []
+        assigned = np.zeros(len(riders), dtype=bool)
+        for _ in range(self.rounds):
+            live = ~assigned[rider_index] & (seats[rider_index] <= remaining[ride_index])
+            if not live.any():
+                break
+            accepted = self._solve_round(
+                rider_index[live], ride_index[live], cost[live], detour_km[live],
+                seats, remaining, ride_rank
+            )
+            if not accepted:
+                break
+            for rider, ride, detour in accepted:
+                assigned[rider] = True
+                remaining[ride] -= seats[rider]
+                assignments.append((rider, ride, detour))
+
+        return assignments
+
+    def _solve_round(self, rider_index, ride_index, cost, detour_km, seats, remaining, ride_rank):
+        """Solve each connected group of riders and rides on its own, then repair seat counts"""
+        rows = int(rider_index.max()) + 1
+        graph = coo_matrix(
+            (np.ones(len(rider_index)), (rider_index, rows + ride_index)),
+            shape=(rows + len(remaining), rows + len(remaining))
+        )
+        _, labels = connected_components(graph, directed=False)
+        component = labels[rider_index]
+        order = np.argsort(component, kind='stable')
+        groups = np.split(order, np.flatnonzero(np.diff(component[order])) + 1)
+
+        proposals = []
+        for edges in groups:
+            proposals.extend(self._solve_group(rider_index[edges], ride_index[edges], cost[edges],
+                                               detour_km[edges], remaining, ride_rank))
+
+        # A ride column stands for one seat; riders needing several are admitted while seats last
+        accepted = []
+        placed = set()
+        left = remaining.copy()
+        for _, rider, ride, detour in sorted(proposals):
+            if rider not in placed and seats[rider] <= left[ride]:
+                placed.add(rider)
+                left[ride] -= seats[rider]
+                accepted.append((rider, ride, round(detour, 2)))
+        return accepted
+
+    def _solve_group(self, rider_index, ride_index, cost, detour_km, remaining, ride_rank):
+        """(cost, rider, ride, detour) proposals for one connected group"""
+        rows, edge_rows = np.unique(rider_index, return_inverse=True)
+        rides, edge_rides, degree = np.unique(ride_index, return_inverse=True, return_counts=True)
+
+        # Each ride offers one column per free seat, but never more than riders could use them
+        widths = np.minimum(remaining[rides], degree)
+        cells = len(rows) * int(widths.sum())
+        if cells > self.max_matrix_cells and len(rides) > 1:
+            # Too big to solve exactly within a window: split the rides into spatially
+            # contiguous chunks. Riders near a border may win in two chunks; seat repair
+            # keeps their cheapest and the next round places whoever lost out
+            parts = min(len(rides), -(-cells // self.max_matrix_cells))
+            chunk = np.searchsorted(np.sort(ride_rank[rides]), ride_rank[ride_index], side='right') - 1
+            chunk = chunk * parts // len(rides)
+            proposals = []
+            for part in range(parts):
+                edges = chunk == part
+                if edges.any():
+                    proposals.extend(self._solve_group(rider_index[edges], ride_index[edges], cost[edges],
+                                                       detour_km[edges], remaining, ride_rank))
+            return proposals
+
+        offsets = np.concatenate(([0], np.cumsum(widths)[:-1]))
+        edge_widths = widths[edge_rides]
+        fill_rows = np.repeat(edge_rows, edge_widths)
+        fill_columns = np.repeat(offsets[edge_rides], edge_widths) + \
+            np.arange(edge_widths.sum()) - np.repeat(np.cumsum(edge_widths) - edge_widths, edge_widths)
+        matrix = np.full((len(rows), int(widths.sum())), self.INFEASIBLE)
+        matrix[fill_rows, fill_columns] = np.repeat(cost, edge_widths)
+
+        ride_of_column = np.repeat(np.arange(len(rides)), widths)
+        detours = dict(zip(zip(edge_rows.tolist(), edge_rides.tolist()), detour_km.tolist()))
+        proposals = []
+        for row, column in zip(*linear_sum_assignment(matrix)):
+            if matrix[row, column] < self.INFEASIBLE:
+                ride = int(ride_of_column[column])
+                proposals.append((float(matrix[row, column]), int(rows[row]), int(rides[ride]), detours[row, ride]))
+        return proposals
@@ -0,0 +1,108 @@
+import numpy as np
+
+
+class Point:
+    """A latitude/longitude pair in degrees"""
+
+    __slots__ = ('lat', 'lng')
+
+    def __init__(self, lat, lng):
+        self.lat = lat
+        self.lng = lng
+
+    def __iter__(self):
+        yield self.lat
+        yield self.lng
+
+    def __eq__(self, other):
+        return isinstance(other, Point) and self.lat == other.lat and self.lng == other.lng
+
+    def __repr__(self):
+        return f'Point({self.lat}, {self.lng})'
+
+    @staticmethod
+    def parse(value):
+        """
+        Read a point from any coordinate format the app has used
+
+        Args:
+            value: Point, {'latitude', 'longitude'} or {'lat', 'lng'} dict, an {'address', 'coordinates'}
+                   location, a GeoJSON Point, or a (lat, lng) pair
+
+        Returns:
+            Point with float coordinates, or None when the value has no coordinates
+        """
+        if value is None or isinstance(value, Point):
+            return value
+
+        if isinstance(value, dict):
+            # Canonical keys first: LocationSchema normalizes every incoming location to them
+            if 'latitude' in value:
+                lat, lng = value['latitude'], value.get('longitude')
+            elif 'lat' in value:
+                lat, lng = value['lat'], value.get('lng')
+            else:
+                coordinates = value.get('coordinates')
+                if isinstance(coordinates, dict):
+                    return Point.parse(coordinates)
+                if value.get('type') == 'Point' and isinstance(coordinates, (list, tuple)):
+                    lng, lat = coordinates[0], coordinates[1]
+                else:
+                    return None
+        else:
+            lat, lng = value
+
+        if lat is None or lng is None:
+            return None
+        return Point(float(lat), float(lng))
+
+    def is_valid(self):
+        """Whether the coordinates are finite and inside the valid ranges"""
+        return -90 <= self.lat <= 90 and -180 <= self.lng <= 180
+
+    def to_coordinates(self):
+        """The {'latitude', 'longitude'} dict stored inside locations"""
+        return {'latitude': self.lat, 'longitude': self.lng}
+
+    def to_geojson(self):
+        """A GeoJSON Point, longitude first"""
+        return {'type': 'Point', 'coordinates': [self.lng, self.lat]}
+
+
+class PointArray:
+    """Many points as one (n, 2) float64 array of [lat, lng]; missing points are NaN rows"""
+
+    __slots__ = ('coords',)
+
+    def __init__(self, coords):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+    @staticmethod
+    def from_points(values):
+        """Parse every value with Point.parse into one array"""
+        parse = Point.parse
+        missing = (np.nan, np.nan)
+        rows = []
+        for value in values:
+            point = parse(value)
+            rows.append((point.lat, point.lng) if point is not None else missing)
+        return PointArray(rows)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, index):
+        lat, lng = self.coords[index].tolist()
+        return None if lat != lat or lng != lng else Point(lat, lng)
+
+    @property
+    def lats(self):
+        return self.coords[:, 0]
+
+    @property
+    def lngs(self):
+        return self.coords[:, 1]
+
+    def missing(self):
+        """Boolean mask of points without coordinates"""
+        return np.isnan(self.coords).any(axis=1)
@@ -1,5 +1,8 @@
 # /backend/app/utils/geo_utils.py
 from math import radians, sin, cos, sqrt, atan2
+import numpy as np
+from .sector_index import SectorIndex
+from .geo_point import Point, PointArray
 
 class GeoUtils:
     @staticmethod
@@ -8,8 +11,8 @@ class GeoUtils:
         Calculate the distance between two geographic points using the Haversine formula
         
         Args:
-            point1: Dict with 'lat' and 'lng' or 'latitude' and 'longitude' keys
-            point2: Dict with 'lat' and 'lng' or 'latitude' and 'longitude' keys
+            point1: Point or coordinate dict in any format Point.parse reads
+            point2: Point or coordinate dict in any format Point.parse reads
             
         Returns:
             Distance in kilometers
@@ -17,15 +20,13 @@ class GeoUtils:
         # Earth's radius in kilometers
         R = 6371.0
         
-        # Handle different coordinate formats
-        lat1 = point1.get('lat') if 'lat' in point1 else point1.get('latitude')
-        lon1 = point1.get('lng') if 'lng' in point1 else point1.get('longitude')
-        
-        lat2 = point2.get('lat') if 'lat' in point2 else point2.get('latitude')
-        lon2 = point2.get('lng') if 'lng' in point2 else point2.get('longitude')
+        point1 = Point.parse(point1)
+        point2 = Point.parse(point2)
+        if point1 is None or point2 is None:
+            raise ValueError('Both points need coordinates')
         
         # Convert to radians
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+        lat1, lon1, lat2, lon2 = map(radians, [point1.lat, point1.lng, point2.lat, point2.lng])
         
         # Haversine formula
         dlat = lat2 - lat1
@@ -36,68 +37,186 @@ class GeoUtils:
         distance = R * c
         
         return round(distance, 2)
-    
+
     @staticmethod
-    def get_sector_from_coordinates(coordinates):
+    def location_lat_lng(location):
         """
-        Determine the sector (e.g., 'G8') from geographic coordinates
+        Read (lat, lng) from a stored location
         
         Args:
-            coordinates: Dict with 'lat' and 'lng' or 'latitude' and 'longitude' keys
+            location: GeoJSON Point ({'type': 'Point', 'coordinates': [lng, lat]}) or
+                      {'address': ..., 'coordinates': {'latitude': ..., 'longitude': ...}}
             
         Returns:
-            Sector code as a string
+            Tuple of (lat, lng), (None, None) when the location has no coordinates
         """
-        # Comprehensive mapping of Islamabad sectors by their approximate boundaries
-        # These boundaries are approximated for the purpose of the application
-        sectors = {
-            # G Sectors
-            'G6': {'min_lat': 33.7126, 'max_lat': 33.7270, 'min_lng': 73.0674, 'max_lng': 73.0861},
-            'G7': {'min_lat': 33.7001, 'max_lat': 33.7156, 'min_lng': 73.0674, 'max_lng': 73.0861},
-            'G8': {'min_lat': 33.6877, 'max_lat': 33.7032, 'min_lng': 73.0674, 'max_lng': 73.0861},
-            'G9': {'min_lat': 33.6752, 'max_lat': 33.6907, 'min_lng': 73.0674, 'max_lng': 73.0861},
-            'G10': {'min_lat': 33.6628, 'max_lat': 33.6783, 'min_lng': 73.0674, 'max_lng': 73.0861},
-            'G11': {'min_lat': 33.6503, 'max_lat': 33.6658, 'min_lng': 73.0674, 'max_lng': 73.0861},
-            'G13': {'min_lat': 33.6254, 'max_lat': 33.6409, 'min_lng': 73.0674, 'max_lng': 73.0861},
+        point = Point.parse(location) if location else None
+        if point is None:
+            return None, None
+        return point.lat, point.lng
+
+    @staticmethod
+    def to_geojson_point(location):
+        """
+        Convert an {'address', 'coordinates'} location into a GeoJSON Point for 2dsphere indexes
+        
+        Args:
+            location: Location dict in either supported format
             
-            # F Sectors
-            'F6': {'min_lat': 33.7126, 'max_lat': 33.7270, 'min_lng': 73.0488, 'max_lng': 73.0674},
-            'F7': {'min_lat': 33.7001, 'max_lat': 33.7156, 'min_lng': 73.0488, 'max_lng': 73.0674},
-            'F8': {'min_lat': 33.6877, 'max_lat': 33.7032, 'min_lng': 73.0488, 'max_lng': 73.0674},
-            'F9': {'min_lat': 33.6752, 'max_lat': 33.6907, 'min_lng': 73.0488, 'max_lng': 73.0674},
-            'F10': {'min_lat': 33.6628, 'max_lat': 33.6783, 'min_lng': 73.0488, 'max_lng': 73.0674},
-            'F11': {'min_lat': 33.6503, 'max_lat': 33.6658, 'min_lng': 73.0488, 'max_lng': 73.0674},
+        Returns:
+            {'type': 'Point', 'coordinates': [lng, lat], 'address': ...}, or None without coordinates
+        """
+        if location and location.get('type') == 'Point':
+            return location
+
+        parsed = Point.parse(location)
+        if parsed is None:
+            return None
+
+        point = parsed.to_geojson()
+        if 'address' in location:
+            point['address'] = location['address']
+        return point
+
+    @staticmethod
+    def from_geojson_point(point):
+        """
+        Convert a stored GeoJSON Point back to the {'address', 'coordinates'} format the API returns
+        
+        Args:
+            point: Location dict in either supported format
             
-            # I Sectors
-            'I8': {'min_lat': 33.6877, 'max_lat': 33.7032, 'min_lng': 73.0861, 'max_lng': 73.1047},
-            'I9': {'min_lat': 33.6752, 'max_lat': 33.6907, 'min_lng': 73.0861, 'max_lng': 73.1047},
-            'I10': {'min_lat': 33.6628, 'max_lat': 33.6783, 'min_lng': 73.0861, 'max_lng': 73.1047},
-            'I11': {'min_lat': 33.6503, 'max_lat': 33.6658, 'min_lng': 73.0861, 'max_lng': 73.1047},
+        Returns:
+            {'address': ..., 'coordinates': {'latitude': ..., 'longitude': ...}}
+        """
+        if not point or point.get('type') != 'Point':
+            return point
+
+        return {
+            'address': point.get('address', ''),
+            'coordinates': Point.parse(point).to_coordinates()
+        }
+
+    @staticmethod
+    def to_lat_lng_array(points):
+        """
+        Parse points once into an (n, 2) float array of [lat, lng]
+        
+        Args:
+            points: PointArray, an existing (n, 2) array which is returned as float64,
+                    or an iterable of anything Point.parse reads (NaN rows where it finds nothing)
             
-            # E Sectors
-            'E7': {'min_lat': 33.7001, 'max_lat': 33.7156, 'min_lng': 73.0301, 'max_lng': 73.0488},
-            'E8': {'min_lat': 33.6877, 'max_lat': 33.7032, 'min_lng': 73.0301, 'max_lng': 73.0488},
-            'E9': {'min_lat': 33.6752, 'max_lat': 33.6907, 'min_lng': 73.0301, 'max_lng': 73.0488},
-            'E11': {'min_lat': 33.6503, 'max_lat': 33.6658, 'min_lng': 73.0301, 'max_lng': 73.0488},
+        Returns:
+            NumPy array of shape (n, 2)
+        """
+        if isinstance(points, PointArray):
+            return points.coords
+        if isinstance(points, np.ndarray):
+            return points.astype(np.float64, copy=False).reshape(-1, 2)
+        return PointArray.from_points(points).coords
+
+    @staticmethod
+    def _haversine(lat1, lng1, lat2, lng2):
+        """Same Haversine formula as calculate_distance, on broadcastable arrays of degrees"""
+        R = 6371.0
+        lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+
+        dlat = lat2 - lat1
+        dlon = lng2 - lng1
+
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        return R * c
+
+    @staticmethod
+    def distances_from(origin, points, decimals=2):
+        """
+        Calculate the distance from one point to many in a single vectorized call
+        
+        Args:
+            origin: Point, coordinate dict or (lat, lng) pair
+            points: PointArray, coordinate dicts or an (n, 2) [lat, lng] array
+            decimals: Rounding applied to the result, matching calculate_distance by default
             
-            # H Sectors
-            'H8': {'min_lat': 33.6877, 'max_lat': 33.7032, 'min_lng': 73.0114, 'max_lng': 73.0301},
-            'H9': {'min_lat': 33.6752, 'max_lat': 33.6907, 'min_lng': 73.0114, 'max_lng': 73.0301},
-            'H10': {'min_lat': 33.6628, 'max_lat': 33.6783, 'min_lng': 73.0114, 'max_lng': 73.0301},
-            'H11': {'min_lat': 33.6503, 'max_lat': 33.6658, 'min_lng': 73.0114, 'max_lng': 73.0301},
+        Returns:
+            NumPy array of n distances in kilometers
+        """
+        lat, lng = Point.parse(origin)
+        points = GeoUtils.to_lat_lng_array(points)
+        distances = GeoUtils._haversine(lat, lng, points[:, 0], points[:, 1])
+        return np.round(distances, decimals) if decimals is not None else distances
+
+    @staticmethod
+    def distance_matrix(points, others=None, decimals=2):
+        """
+        Calculate pairwise distances between two point sets
+        
+        Args:
+            points: PointArray, coordinate dicts or an (n, 2) [lat, lng] array
+            others: Second point set (m points); defaults to points itself
+            decimals: Rounding applied to the result, matching calculate_distance by default
             
-            # Blue Area & Other key locations
-            'Blue Area': {'min_lat': 33.7126, 'max_lat': 33.7270, 'min_lng': 73.0301, 'max_lng': 73.0488}
-        }
+        Returns:
+            NumPy array of shape (n, m) in kilometers
+        """
+        points = GeoUtils.to_lat_lng_array(points)
+        others = points if others is None else GeoUtils.to_lat_lng_array(others)
+        distances = GeoUtils._haversine(
+            points[:, 0, None], points[:, 1, None], others[None, :, 0], others[None, :, 1]
+        )
+        return np.round(distances, decimals) if decimals is not None else distances
+
+    @staticmethod
+    def within_radius(origin, points, radius_km):
+        """
+        Find the points within radius_km of origin
         
-        lat = coordinates.get('lat') if 'lat' in coordinates else coordinates.get('latitude')
-        lng = coordinates.get('lng') if 'lng' in coordinates else coordinates.get('longitude')
+        Args:
+            origin: Point, coordinate dict or (lat, lng) pair
+            points: PointArray, coordinate dicts or an (n, 2) [lat, lng] array
+            radius_km: Search radius in kilometers
+            
+        Returns:
+            Tuple of (indices, distances) for matching points, nearest first
+        """
+        distances = GeoUtils.distances_from(origin, points)
+        indices = np.flatnonzero(distances <= radius_km)
+        order = np.argsort(distances[indices], kind='stable')
+        return indices[order], distances[indices[order]]
+    
+    @staticmethod
+    def get_sector_from_coordinates(coordinates):
+        """
+        Determine the sector (e.g., 'G8') from geographic coordinates
         
-        # Check which sector the coordinates fall into
-        for sector_code, bounds in sectors.items():
-            if (bounds['min_lat'] <= lat <= bounds['max_lat'] and 
-                bounds['min_lng'] <= lng <= bounds['max_lng']):
-                return sector_code
+        Args:
+            coordinates: Point or coordinate dict in any format Point.parse reads
+            
+        Returns:
+            Sector code as a string
+        """
+        point = Point.parse(coordinates)
+        if point is None:
+            return SectorIndex.UNKNOWN
+
+        # Sector outlines are loaded once from app/data/sectors.geojson
+        return SectorIndex.load_default().sector_at(point.lat, point.lng)
+
+    @staticmethod
+    def get_sectors_from_coordinates(lats, lngs):
+        """
+        Determine the sectors for many points in one vectorized pass
         
-        # Default sector if no match
-        return 'unknown'
\ No newline at end of file
+        Args:
+            lats: Sequence of latitudes
+            lngs: Sequence of longitudes, same length as lats
+            
+        Returns:
+            List of sector codes, 'unknown' where no sector contains the point
+        """
+        return SectorIndex.load_default().classify(lats, lngs)
+
+    @staticmethod
+    def sector_version():
+        """Version of the sector geometry currently loaded"""
+        return SectorIndex.load_default().version
@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+# Incidence matrix shared with pool workers through the initializer
+_worker_matrix = None
+_worker_sizes = None
+_worker_masks = None
+
+
+def _init_worker(matrix, sizes, masks):
+    global _worker_matrix, _worker_sizes, _worker_masks
+    _worker_matrix = matrix
+    _worker_sizes = sizes
+    _worker_masks = masks
+
+
+def _score_block(bounds):
+    """Score one block of rows against every user and keep the top k per row"""
+    start, stop, top_k = bounds
+    return BatchMatchEngine.top_k_block(_worker_matrix, _worker_sizes, start, stop, top_k, _worker_masks)
+
+
+class BatchMatchEngine:
+    """Computes every user's best matches at once from a sparse user x keyword matrix"""
+
+    def __init__(self, top_k=50, block_size=256, workers=None):
+        self.top_k = top_k
+        self.block_size = block_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+
+    @staticmethod
+    def build_matrix(keyword_sets):
+        """Build a binary CSR incidence matrix and return it with the vocabulary"""
+        vocabulary = {}
+        indptr = [0]
+        indices = []
+        for keywords in keyword_sets:
+            for keyword in dict.fromkeys(keywords):
+                indices.append(vocabulary.setdefault(keyword, len(vocabulary)))
+            indptr.append(len(indices))
+
+        data = np.ones(len(indices), dtype=np.float32)
+        matrix = sparse.csr_matrix(
+            (data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(keyword_sets), len(vocabulary))
+        )
+        return matrix, vocabulary
+
+    @staticmethod
+    def top_k_block(matrix, sizes, start, stop, top_k, masks=None):
+        """Return (row, columns, scores) for rows start:stop, best scores first"""
+        # Intersection sizes of the block against every user
+        intersections = (matrix[start:stop] @ matrix.T).toarray()
+        unions = sizes[start:stop, None] + sizes[None, :] - intersections
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(intersections > 0, intersections / unions, 0.0)
+
+        # A user never matches themselves
+        rows = np.arange(stop - start)
+        scores[rows, rows + start] = 0.0
+
+        # Category prefilter: rows with categories only keep users sharing one
+        if masks is not None:
+            block_masks = masks[start:stop, None]
+            allowed = (block_masks == 0) | ((block_masks & masks[None, :]) != 0)
+            scores[~allowed] = 0.0
+
+        k = min(top_k, scores.shape[1])
+        results = []
+        if k == 0:
+            return results
+
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for row, columns in enumerate(candidates):
+            row_scores = scores[row, columns]
+            order = np.argsort(-row_scores, kind='stable')
+            columns = columns[order]
+            row_scores = row_scores[order]
+            keep = row_scores > 0
+            results.append((start + row, columns[keep].tolist(), row_scores[keep].tolist()))
+
+        return results
+
+    def compute(self, keyword_sets, masks=None):
+        """Return a list of (columns, scores) pairs, one per input row"""
+        if not keyword_sets:
+            return []
+
+        matrix, _ = self.build_matrix(keyword_sets)
+        sizes = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+        total = matrix.shape[0]
+        if masks is not None:
+            masks = np.asarray(masks, dtype=np.int64)
+
+        blocks = [
+            (start, min(start + self.block_size, total), self.top_k)
+            for start in range(0, total, self.block_size)
+        ]
+
+        results = [None] * total
+        if self.workers > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     initializer=_init_worker,
+                                     initargs=(matrix, sizes, masks)) as pool:
+                for block in pool.map(_score_block, blocks):
+                    for row, columns, scores in block:
+                        results[row] = (columns, scores)
+        else:
+            for start, stop, top_k in blocks:
+                for row, columns, scores in self.top_k_block(matrix, sizes, start, stop, top_k, masks):
+                    results[row] = (columns, scores)
+
+        return results
@@ -0,0 +1,60 @@
+import hashlib
+
+import numpy as np
+
+
+class MinHashLSH:
+    """MinHash signatures over keyword sets, bucketed into LSH bands"""
+
+    # Mersenne prime used by the universal hash family
+    PRIME = (1 << 31) - 1
+
+    def __init__(self, bands=64, rows=1, seed=1):
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+
+        # Same seed means the same permutations in every process
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MinHashLSH.PRIME, size=self.num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MinHashLSH.PRIME, size=self.num_perm).astype(np.uint64)
+
+    @property
+    def params(self):
+        """Short label identifying the band/row layout of stored buckets"""
+        return f'{self.bands}x{self.rows}'
+
+    @staticmethod
+    def hash_keyword(keyword):
+        """Stable 31-bit hash of a keyword (Python's hash() is salted per process)"""
+        digest = hashlib.blake2b(keyword.encode('utf-8'), digest_size=4).digest()
+        return int.from_bytes(digest, 'little') % MinHashLSH.PRIME
+
+    def signature(self, keywords):
+        """Return the MinHash signature of a keyword set as a list of ints"""
+        hashes = np.fromiter(
+            (MinHashLSH.hash_keyword(k) for k in set(keywords)),
+            dtype=np.uint64
+        )
+        if hashes.size == 0:
+            return []
+
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % MinHashLSH.PRIME
+        return permuted.min(axis=0).tolist()
+
+    def bucket_keys(self, signature):
+        """Split a signature into bands and return one bucket key per band"""
+        if not signature:
+            return []
+
+        values = np.asarray(signature, dtype=np.uint32)
+        keys = []
+        for band in range(self.bands):
+            chunk = values[band * self.rows:(band + 1) * self.rows].tobytes()
+            keys.append(f'{band}:{hashlib.blake2b(chunk, digest_size=8).hexdigest()}')
+        return keys
+
+    def buckets_for(self, keywords):
+        """Return (signature, bucket keys) for a keyword set"""
+        signature = self.signature(keywords)
+        return signature, self.bucket_keys(signature)
@@ -1,6 +1,8 @@
 # /backend/app/utils/nlp_processor.py
+import hashlib
+import threading
+from functools import lru_cache
 import nltk
-from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from string import punctuation
 
@@ -30,63 +32,113 @@ class NLPProcessor:
                   'adventure', 'sightseeing', 'exploration', 'wanderlust', 'tourist']
     }
     
+    # Reverse lookup from a hobby term to the categories it belongs to
+    TERM_CATEGORIES = {}
+    for _category, _terms in HOBBY_CATEGORIES.items():
+        for _term in _terms:
+            TERM_CATEGORIES.setdefault(_term, []).append(_category)
+    TERM_CATEGORIES = {term: tuple(cats) for term, cats in TERM_CATEGORIES.items()}
+    CATEGORY_ORDER = tuple(HOBBY_CATEGORIES)
+    del _category, _terms, _term
+
+    # Punctuation is replaced by spaces in a single str.translate pass
+    PUNCTUATION_TABLE = str.maketrans(punctuation, ' ' * len(punctuation))
+
+    # Bump whenever extraction rules change so stored keywords get reprocessed
+    EXTRACTOR_VERSION = 2
+
+    # Loaded once per process by warm_up()
+    _stop_words = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def warm_up():
+        """Load NLTK resources once per process and freeze the stopword set"""
+        if NLPProcessor._stop_words is not None:
+            return NLPProcessor._stop_words
+
+        with NLPProcessor._lock:
+            if NLPProcessor._stop_words is None:
+                # Download necessary NLTK resources if not already downloaded
+                try:
+                    nltk.data.find('corpora/stopwords')
+                except LookupError:
+                    nltk.download('stopwords', quiet=True)
+
+                NLPProcessor._stop_words = frozenset(stopwords.words('english'))
+
+        return NLPProcessor._stop_words
+
+    @staticmethod
+    def description_digest(text):
+        """Return a stable digest of a description, used to skip unchanged text"""
+        return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def is_current(entry):
+        """Check whether a user_hobbies document was extracted from its current text and pipeline"""
+        return (entry.get('extractor_version') == NLPProcessor.EXTRACTOR_VERSION and
+                entry.get('description_digest') ==
+                NLPProcessor.description_digest(entry.get('raw_description', '')))
+
     @staticmethod
     def extract_keywords(text):
         """
         Extract meaningful keywords from user's hobby/interest descriptions
         and categorize them for better matching
         """
-        # Download necessary NLTK resources if not already downloaded
-        try:
-            nltk.data.find('tokenizers/punkt')
-        except LookupError:
-            nltk.download('punkt', quiet=True)
-        
-        try:
-            nltk.data.find('corpora/stopwords')
-        except LookupError:
-            nltk.download('stopwords', quiet=True)
-        
         if not text or not isinstance(text, str):
             return []
-            
-        # Process text
-        stop_words = set(stopwords.words('english'))
-        
-        # Clean and tokenize
-        text = text.lower()
-        # Remove punctuation
-        for p in punctuation:
-            text = text.replace(p, ' ')
-        
-        tokens = word_tokenize(text)
-        
+
+        # Copy so callers can't mutate the cached result
+        return list(NLPProcessor._extract_cached(text))
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _extract_cached(text):
+        """Memoized extraction; repeated descriptions skip tokenization entirely"""
+        stop_words = NLPProcessor._stop_words or NLPProcessor.warm_up()
+
+        # Lowercase and strip punctuation, then split on whitespace
+        tokens = text.lower().translate(NLPProcessor.PUNCTUATION_TABLE).split()
+
         # Filter tokens
         keywords = [token for token in tokens 
                    if token.isalpha() and 
                    token not in stop_words and 
                    len(token) > 2]
-        
-        # Add category labels for better matching
-        enhanced_keywords = keywords.copy()
-        
-        # Find hobby categories that match any of the keywords
-        for category, related_terms in NLPProcessor.HOBBY_CATEGORIES.items():
-            if any(keyword in related_terms for keyword in keywords):
-                enhanced_keywords.append(category)
-        
-        # Remove duplicates while preserving order
-        unique_keywords = list(dict.fromkeys(enhanced_keywords))
-        
-        return unique_keywords
+
+        # Add category labels for better matching, then remove duplicates
+        # while preserving order
+        keywords.extend(NLPProcessor.categorize_keywords(keywords))
+        return tuple(dict.fromkeys(keywords))
+
+    @staticmethod
+    def extract_keywords_batch(texts):
+        """Extract keywords for many descriptions, returning one list per text"""
+        NLPProcessor.warm_up()
+        return [NLPProcessor.extract_keywords(text) for text in texts]
 
     @staticmethod
     def categorize_keywords(keywords):
         """Return a list of hobby categories that match the given keywords"""
-        categories = []
-        for category, related_terms in NLPProcessor.HOBBY_CATEGORIES.items():
-            if any(keyword in related_terms for keyword in keywords):
-                categories.append(category)
+        matched = set()
+        for keyword in keywords:
+            matched.update(NLPProcessor.TERM_CATEGORIES.get(keyword, ()))
+
+        # Keep the HOBBY_CATEGORIES order
+        return [category for category in NLPProcessor.CATEGORY_ORDER if category in matched]
 
-        # Remove duplicates while preserving order
-        return list(dict.fromkeys(categories))
+    @staticmethod
+    def category_mask(categories):
+        """Pack category names into a bitmask, one bit per HOBBY_CATEGORIES entry"""
+        mask = 0
+        for bit, category in enumerate(NLPProcessor.CATEGORY_ORDER):
+            if category in categories:
+                mask |= 1 << bit
+        return mask
+
+    @staticmethod
+    def categories_from_mask(mask):
+        """Unpack a category bitmask into names, in HOBBY_CATEGORIES order"""
+        return [category for bit, category in enumerate(NLPProcessor.CATEGORY_ORDER) if mask & (1 << bit)]
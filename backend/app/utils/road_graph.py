@@ -0,0 +1,523 @@
+import bz2
+import gzip
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from .geo_utils import GeoUtils
+
+logger = logging.getLogger(__name__)
+
+# Free-flow km/h per OSM highway type when a way has no usable maxspeed;
+# anything not listed (footways, cycleways, tracks, ...) is not driveable
+DEFAULT_SPEEDS_KMH = {
+    'motorway': 100, 'motorway_link': 60,
+    'trunk': 80, 'trunk_link': 50,
+    'primary': 60, 'primary_link': 40,
+    'secondary': 50, 'secondary_link': 35,
+    'tertiary': 40, 'tertiary_link': 30,
+    'unclassified': 30, 'residential': 25,
+    'living_street': 10, 'service': 15
+}
+
+METRES_PER_DEGREE = 111320.0
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _speed_kmh(tags):
+    """Speed for a way's tags, or None if cars can't use it"""
+    highway = tags.get('highway')
+    if highway not in DEFAULT_SPEEDS_KMH or tags.get('access') in ('no', 'private'):
+        return None
+    match = re.match(r'\s*(\d+(?:\.\d+)?)\s*(mph)?', tags.get('maxspeed', ''))
+    if match:
+        speed = float(match.group(1)) * (1.609 if match.group(2) else 1)
+        if speed > 0:
+            return speed
+    return DEFAULT_SPEEDS_KMH[highway]
+
+
+def _direction(tags):
+    """1 for one-way along the node order, -1 against it, 0 for both ways"""
+    oneway = tags.get('oneway')
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway != 'no' and (tags.get('junction') in ('roundabout', 'circular') or tags.get('highway') == 'motorway'):
+        return 1
+    return 0
+
+
+# Arrays that make up a contraction hierarchy, as saved next to the base graph
+HIERARCHY_ARRAYS = ('rank', 'up_indptr', 'up_targets', 'up_metres', 'up_seconds',
+                    'down_indptr', 'down_targets', 'down_metres', 'down_seconds')
+
+
+def _csr(adjacency):
+    """indptr, targets, metres, seconds from one {neighbour: (seconds, metres)} dict per node"""
+    indptr = np.concatenate(([0], np.cumsum([len(edges) for edges in adjacency]))).astype(np.int32)
+    targets = [neighbour for edges in adjacency for neighbour in edges]
+    costs = [cost for edges in adjacency for cost in edges.values()]
+    seconds = np.array([cost[0] for cost in costs], dtype=np.float32)
+    metres = np.array([cost[1] for cost in costs], dtype=np.float32)
+    return indptr, np.array(targets, dtype=np.int32), metres, seconds
+
+
+class RoadGraph:
+    """
+    A driveable road network as CSR arrays, queried on travel time
+
+    Graphs compiled with contract() answer queries with a contraction hierarchy;
+    without one every query runs A* over the base graph.
+    """
+
+    _default = None
+    _default_tried = False
+    _lock = threading.Lock()
+
+    def __init__(self, lats, lngs, indptr, targets, metres, seconds, hierarchy=None):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.metres = np.asarray(metres, dtype=np.float32)
+        self.seconds = np.asarray(seconds, dtype=np.float32)
+
+        # Equirectangular metres around the graph's centre, for snapping and the A* heuristic
+        self._cos_lat = math.cos(math.radians(float(self.lats.mean()))) if len(self.lats) else 1.0
+        xy = np.column_stack((self.lngs * METRES_PER_DEGREE * self._cos_lat, self.lats * METRES_PER_DEGREE))
+        self._tree = cKDTree(xy)
+        # Fastest edge in the graph; straight-line distance at this speed never overestimates
+        self._max_speed = float((self.metres / np.maximum(self.seconds, 1e-3)).max()) if len(self.metres) else 1.0
+
+        # The search loop runs in Python, where list indexing beats numpy scalars by far
+        self._x = xy[:, 0].tolist()
+        self._y = xy[:, 1].tolist()
+        self._indptr = self.indptr.tolist()
+        self._targets = self.targets.tolist()
+        self._edge_metres = self.metres.tolist()
+        self._edge_seconds = self.seconds.tolist()
+
+        # Upward edges u -> v and, for the backward search, edges v -> u stored at u,
+        # where v was contracted after u
+        self.hierarchy = hierarchy
+        if hierarchy is not None:
+            hierarchy = dict(zip(HIERARCHY_ARRAYS, hierarchy))
+            self._up = tuple(hierarchy[name].tolist() for name in
+                             ('up_indptr', 'up_targets', 'up_metres', 'up_seconds'))
+            self._down = tuple(hierarchy[name].tolist() for name in
+                               ('down_indptr', 'down_targets', 'down_metres', 'down_seconds'))
+
+    def __len__(self):
+        return len(self.lats)
+
+    @staticmethod
+    def from_osm(path):
+        """Build the graph from an OSM XML extract (.osm, .osm.gz or .osm.bz2)"""
+        nodes = {}
+        sources, targets, speeds = [], [], []
+
+        with _open(path) as f:
+            for _, element in ET.iterparse(f, events=('end',)):
+                if element.tag == 'node':
+                    nodes[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+                    element.clear()
+                elif element.tag == 'way':
+                    tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                    speed = _speed_kmh(tags)
+                    if speed is not None:
+                        refs = [nd.get('ref') for nd in element.iter('nd')]
+                        direction = _direction(tags)
+                        for a, b in zip(refs, refs[1:]):
+                            if direction >= 0:
+                                sources.append(a)
+                                targets.append(b)
+                                speeds.append(speed)
+                            if direction <= 0:
+                                sources.append(b)
+                                targets.append(a)
+                                speeds.append(speed)
+                    element.clear()
+                elif element.tag == 'relation':
+                    element.clear()
+
+        # Drop edges touching nodes missing from a clipped extract
+        keep = [a in nodes and b in nodes for a, b in zip(sources, targets)]
+        sources = [a for a, k in zip(sources, keep) if k]
+        targets = [b for b, k in zip(targets, keep) if k]
+        speeds = np.array([s for s, k in zip(speeds, keep) if k], dtype=np.float64)
+
+        ids, inverse = np.unique(np.array(sources + targets), return_inverse=True)
+        source_index = inverse[:len(sources)]
+        target_index = inverse[len(sources):]
+        coords = np.array([nodes[node_id] for node_id in ids.tolist()], dtype=np.float64).reshape(-1, 2)
+
+        metres = GeoUtils._haversine(coords[source_index, 0], coords[source_index, 1],
+                                     coords[target_index, 0], coords[target_index, 1]) * 1000
+        seconds = metres / (speeds / 3.6)
+        return RoadGraph._compact(coords, source_index, target_index, metres, seconds)
+
+    @staticmethod
+    def _compact(coords, sources, targets, metres, seconds):
+        """Keep the largest strongly connected component and lay the edges out as CSR"""
+        size = len(coords)
+        adjacency = csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(size, size))
+        _, labels = connected_components(adjacency, directed=True, connection='strong')
+        # Outside the main component some routes don't exist; snapping never lands there
+        main = labels == np.bincount(labels).argmax()
+        renumber = np.full(size, -1, dtype=np.int64)
+        renumber[main] = np.arange(int(main.sum()))
+
+        keep = main[sources] & main[targets] & (sources != targets)
+        sources, targets = renumber[sources[keep]], renumber[targets[keep]]
+        metres, seconds = metres[keep], seconds[keep]
+
+        order = np.lexsort((targets, sources))
+        sources, targets, metres, seconds = sources[order], targets[order], metres[order], seconds[order]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength=int(main.sum())))))
+        return RoadGraph(coords[main, 0], coords[main, 1], indptr, targets, metres, seconds)
+
+    def contract(self, settle_limit=60):
+        """
+        Build a contraction hierarchy so queries only search upward from both ends
+
+        Nodes are contracted least important first (fewest shortcuts added, fewest
+        neighbours already gone), adding a shortcut around each one unless a local
+        witness search finds a path at least as fast. Takes minutes for a city in
+        pure Python, which is why load() keeps the compiled result on disk.
+
+        Args:
+            settle_limit: Nodes a witness search may settle before giving up;
+                          lower is faster to build but adds spare shortcuts
+
+        Returns:
+            A new RoadGraph carrying the hierarchy
+        """
+        size = len(self)
+        outgoing = [{} for _ in range(size)]
+        incoming = [{} for _ in range(size)]
+        for node in range(size):
+            for edge in range(self._indptr[node], self._indptr[node + 1]):
+                neighbour = self._targets[edge]
+                cost = (self._edge_seconds[edge], self._edge_metres[edge])
+                if neighbour not in outgoing[node] or cost[0] < outgoing[node][neighbour][0]:
+                    outgoing[node][neighbour] = cost
+                    incoming[neighbour][node] = cost
+
+        def witnesses(source, skip, limit):
+            """Travel times from source that avoid skip, searched up to limit"""
+            times = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap:
+                time, node = heapq.heappop(heap)
+                if time > limit or settled >= settle_limit:
+                    break
+                if time > times[node]:
+                    continue
+                settled += 1
+                for neighbour, (seconds, _) in outgoing[node].items():
+                    candidate = time + seconds
+                    if neighbour != skip and candidate < times.get(neighbour, math.inf):
+                        times[neighbour] = candidate
+                        heapq.heappush(heap, (candidate, neighbour))
+            return times
+
+        def shortcuts(node):
+            needed = []
+            if not outgoing[node]:
+                return needed
+            longest = max(seconds for seconds, _ in outgoing[node].values())
+            for source, (in_seconds, in_metres) in incoming[node].items():
+                times = witnesses(source, node, in_seconds + longest)
+                for target, (out_seconds, out_metres) in outgoing[node].items():
+                    if target != source and times.get(target, math.inf) > in_seconds + out_seconds:
+                        needed.append((source, target, in_seconds + out_seconds, in_metres + out_metres))
+            return needed
+
+        removed = [0] * size
+
+        def priority(node, needed):
+            return 2 * len(needed) - len(incoming[node]) - len(outgoing[node]) + removed[node]
+
+        heap = [(priority(node, shortcuts(node)), node) for node in range(size)]
+        heapq.heapify(heap)
+        rank = np.zeros(size, dtype=np.int32)
+        up = [None] * size
+        down = [None] * size
+        order = 0
+        while heap:
+            _, node = heapq.heappop(heap)
+            # Priorities go stale as neighbours are contracted; re-check before committing
+            needed = shortcuts(node)
+            current = priority(node, needed)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, node))
+                continue
+
+            rank[node] = order
+            order += 1
+            up[node] = outgoing[node]
+            down[node] = incoming[node]
+            for source in incoming[node]:
+                del outgoing[source][node]
+                removed[source] += 1
+            for target in outgoing[node]:
+                del incoming[target][node]
+                removed[target] += 1
+            for source, target, seconds, metres in needed:
+                if target not in outgoing[source] or seconds < outgoing[source][target][0]:
+                    outgoing[source][target] = (seconds, metres)
+                    incoming[target][source] = (seconds, metres)
+            outgoing[node] = incoming[node] = {}
+
+        hierarchy = (rank,) + _csr(up) + _csr(down)
+        return RoadGraph(self.lats, self.lngs, self.indptr, self.targets, self.metres, self.seconds, hierarchy)
+
+    def save(self, path):
+        """Write the arrays, and the hierarchy if there is one, to an .npz file"""
+        arrays = dict(lats=self.lats, lngs=self.lngs, indptr=self.indptr,
+                      targets=self.targets, metres=self.metres, seconds=self.seconds)
+        if self.hierarchy is not None:
+            arrays.update(zip(HIERARCHY_ARRAYS, self.hierarchy))
+        np.savez(path, **arrays)
+
+    @staticmethod
+    def compiled_path(path):
+        """Where migrations/road_graph.py writes the compiled graph of an extract"""
+        return path if path.endswith('.npz') else path + '.npz'
+
+    @staticmethod
+    def load(path):
+        """Load a compiled graph, given either the .npz or the extract it was compiled from"""
+        with np.load(RoadGraph.compiled_path(path)) as data:
+            hierarchy = tuple(data[name] for name in HIERARCHY_ARRAYS) if 'rank' in data.files else None
+            return RoadGraph(data['lats'], data['lngs'], data['indptr'],
+                             data['targets'], data['metres'], data['seconds'], hierarchy)
+
+    @staticmethod
+    def load_default(path=None):
+        """
+        Load the process-wide graph once; None when no compiled road data is available
+
+        Never compiles an extract: contraction takes minutes and would run in every
+        worker, so migrations/road_graph.py builds the .npz ahead of a deploy.
+        """
+        if not RoadGraph._default_tried and path:
+            with RoadGraph._lock:
+                if not RoadGraph._default_tried:
+                    # One attempt per process; a missing or broken file is not retried per query
+                    RoadGraph._default_tried = True
+                    compiled = RoadGraph.compiled_path(path)
+                    if not os.path.exists(compiled):
+                        logger.warning(f'No compiled road graph at {compiled}; distances are straight lines '
+                                       f'until python -m migrations.road_graph is run')
+                        return None
+                    if compiled != path and os.path.exists(path) and os.path.getmtime(compiled) < os.path.getmtime(path):
+                        logger.warning(f'{compiled} is older than {path}; run python -m migrations.road_graph')
+                    RoadGraph._default = RoadGraph.load(compiled)
+        return RoadGraph._default
+
+    def nearest(self, lat, lng):
+        """(node, metres away) of the graph node closest to a point"""
+        distance, node = self._tree.query((lng * METRES_PER_DEGREE * self._cos_lat, lat * METRES_PER_DEGREE))
+        return int(node), float(distance)
+
+    def shortest_path(self, source, target):
+        """
+        Fastest route between two nodes
+
+        Returns:
+            Tuple of (metres, seconds), or None when target can't be reached
+        """
+        if source == target:
+            return 0.0, 0.0
+        if self.hierarchy is not None:
+            return self._hierarchy_path(source, target)
+        return self._a_star(source, target)
+
+    def _hierarchy_path(self, source, target):
+        """Bidirectional Dijkstra that only climbs the hierarchy; the searches meet at the top"""
+        times = ({source: 0.0}, {target: 0.0})
+        metres = ({source: 0.0}, {target: 0.0})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        graphs = (self._up, self._down)
+        best, best_metres = math.inf, None
+
+        while True:
+            forward_key = heaps[0][0][0] if heaps[0] else math.inf
+            backward_key = heaps[1][0][0] if heaps[1] else math.inf
+            if min(forward_key, backward_key) >= best:
+                break
+            side = 0 if forward_key <= backward_key else 1
+            time, node = heapq.heappop(heaps[side])
+            if time > times[side][node]:
+                continue
+
+            other = times[1 - side].get(node)
+            if other is not None and time + other < best:
+                best = time + other
+                best_metres = metres[side][node] + metres[1 - side][node]
+
+            side_times, side_metres = times[side], metres[side]
+            # Stall-on-demand: a higher node already reached this one faster, so nothing
+            # found by expanding it can be part of the shortest route
+            indptr, targets, _, edge_seconds = graphs[1 - side]
+            if any(side_times.get(targets[edge], math.inf) + edge_seconds[edge] < time
+                   for edge in range(indptr[node], indptr[node + 1])):
+                continue
+
+            indptr, targets, edge_metres, edge_seconds = graphs[side]
+            node_metres = side_metres[node]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = targets[edge]
+                candidate = time + edge_seconds[edge]
+                if candidate < side_times.get(neighbour, math.inf):
+                    side_times[neighbour] = candidate
+                    side_metres[neighbour] = node_metres + edge_metres[edge]
+                    heapq.heappush(heaps[side], (candidate, neighbour))
+
+        return None if best_metres is None else (best_metres, best)
+
+    def distance_table(self, sources, targets):
+        """
+        Fastest routes from every source node to every target node
+
+        With a hierarchy, each target's backward search leaves its distances in
+        buckets at the nodes it settles, and each source's forward search joins
+        with the buckets it meets: one small upward search per node instead of a
+        route query per pair. Without one, it runs a Dijkstra per source.
+
+        Returns:
+            Tuple of (metres, seconds) arrays of shape (len(sources), len(targets)),
+            inf where a target can't be reached
+        """
+        metres = [[math.inf] * len(targets) for _ in sources]
+        seconds = [[math.inf] * len(targets) for _ in sources]
+
+        if self.hierarchy is None:
+            for row, source in enumerate(sources):
+                reached = self._dijkstra(source, set(targets))
+                for column, target in enumerate(targets):
+                    if target in reached:
+                        seconds[row][column], metres[row][column] = reached[target]
+        else:
+            buckets = {}
+            for column, target in enumerate(targets):
+                for node, (time, distance) in self._upward_search(target, 1).items():
+                    buckets.setdefault(node, []).append((column, time, distance))
+
+            for row, source in enumerate(sources):
+                row_metres, row_seconds = metres[row], seconds[row]
+                for node, (time, distance) in self._upward_search(source, 0).items():
+                    for column, target_time, target_distance in buckets.get(node, ()):
+                        if time + target_time < row_seconds[column]:
+                            row_seconds[column] = time + target_time
+                            row_metres[column] = distance + target_distance
+
+        shape = (len(sources), len(targets))
+        return np.array(metres, dtype=np.float64).reshape(shape), np.array(seconds, dtype=np.float64).reshape(shape)
+
+    def _upward_search(self, node, side):
+        """Unstalled nodes an exhaustive forward (0) or backward (1) upward search settles, as {node: (seconds, metres)}"""
+        indptr, targets, edge_metres, edge_seconds = (self._up, self._down)[side]
+        stall_indptr, stall_targets, _, stall_seconds = (self._up, self._down)[1 - side]
+        times = {node: 0.0}
+        metres = {node: 0.0}
+        heap = [(0.0, node)]
+        settled = {}
+        while heap:
+            time, current = heapq.heappop(heap)
+            if time > times[current] or current in settled:
+                continue
+            # Same stall-on-demand as _hierarchy_path; a stalled node's distance is not its shortest
+            if any(times.get(stall_targets[edge], math.inf) + stall_seconds[edge] < time
+                   for edge in range(stall_indptr[current], stall_indptr[current + 1])):
+                continue
+            settled[current] = (time, metres[current])
+
+            current_metres = metres[current]
+            for edge in range(indptr[current], indptr[current + 1]):
+                neighbour = targets[edge]
+                candidate = time + edge_seconds[edge]
+                if candidate < times.get(neighbour, math.inf):
+                    times[neighbour] = candidate
+                    metres[neighbour] = current_metres + edge_metres[edge]
+                    heapq.heappush(heap, (candidate, neighbour))
+        return settled
+
+    def _dijkstra(self, source, targets):
+        """{target: (seconds, metres)} over the base graph, stopping once every target is settled"""
+        indptr, targets_of = self._indptr, self._targets
+        edge_metres, edge_seconds = self._edge_metres, self._edge_seconds
+        best = {source: 0.0}
+        metres = {source: 0.0}
+        remaining = set(targets)
+        reached = {}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            seconds, node = heapq.heappop(heap)
+            if seconds > best[node] or node in reached:
+                continue
+            reached[node] = (seconds, metres[node])
+            remaining.discard(node)
+
+            node_metres = metres[node]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = targets_of[edge]
+                candidate = seconds + edge_seconds[edge]
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    metres[neighbour] = node_metres + edge_metres[edge]
+                    heapq.heappush(heap, (candidate, neighbour))
+        return {target: reached[target] for target in targets if target in reached}
+
+    def _a_star(self, source, target):
+        """A* over the base graph, for graphs without a hierarchy"""
+        x, y = self._x, self._y
+        indptr, targets = self._indptr, self._targets
+        edge_metres, edge_seconds = self._edge_metres, self._edge_seconds
+        # Slightly under the straight-line time so projection error can't make it overestimate
+        scale = 0.99 / self._max_speed
+        goal_x, goal_y = x[target], y[target]
+        hypot = math.hypot
+
+        best = {source: 0.0}
+        metres = {source: 0.0}
+        done = set()
+        heap = [(hypot(x[source] - goal_x, y[source] - goal_y) * scale, 0.0, source)]
+        while heap:
+            _, seconds, node = heapq.heappop(heap)
+            if node == target:
+                return metres[node], seconds
+            if node in done:
+                continue
+            done.add(node)
+
+            node_metres = metres[node]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = targets[edge]
+                candidate = seconds + edge_seconds[edge]
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    metres[neighbour] = node_metres + edge_metres[edge]
+                    estimate = candidate + hypot(x[neighbour] - goal_x, y[neighbour] - goal_y) * scale
+                    heapq.heappush(heap, (estimate, candidate, neighbour))
+        return None
@@ -0,0 +1,147 @@
+import itertools
+import time
+
+import numpy as np
+
+
+class RouteOptimizer:
+    """Orders pickups on a path from a fixed start to an optional fixed end"""
+
+    def __init__(self, time_budget_ms=50, exhaustive_limit=7):
+        self.time_budget_ms = time_budget_ms
+        # Up to this many stops every ordering is tried; beyond it local search is used
+        self.exhaustive_limit = exhaustive_limit
+
+    @staticmethod
+    def path_length(matrix, path):
+        return float(sum(matrix[a, b] for a, b in zip(path, path[1:])))
+
+    def optimize(self, matrix, has_end=True):
+        """
+        Find a short path over every node of a distance matrix
+
+        Args:
+            matrix: (n, n) distances; node 0 is the start, node n-1 the end when has_end
+            has_end: Whether the last node is a fixed destination
+
+        Returns:
+            Tuple of (stop order as node indices excluding start and end, path length)
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if not has_end:
+            # A zero-cost dummy end turns the open path into a fixed-end one
+            size = matrix.shape[0]
+            padded = np.zeros((size + 1, size + 1))
+            padded[:size, :size] = matrix
+            matrix = padded
+
+        end = matrix.shape[0] - 1
+        stops = list(range(1, end))
+        if len(stops) <= 1:
+            path = [0] + stops + [end]
+            return stops, self.path_length(matrix, path)
+
+        if len(stops) <= self.exhaustive_limit:
+            best = min(
+                itertools.permutations(stops),
+                key=lambda order: self.path_length(matrix, (0,) + order + (end,))
+            )
+            path = [0] + list(best) + [end]
+        else:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+            path = self._nearest_neighbour(matrix, stops, end)
+            improved = True
+            while improved and time.perf_counter() < deadline:
+                improved = self._two_opt(matrix, path, deadline) | self._or_opt(matrix, path, deadline)
+
+        return path[1:-1], self.path_length(matrix, path)
+
+    @staticmethod
+    def insertion_costs(legs, to_new, from_new, has_end=True):
+        """
+        Added cost of inserting one stop at each position of an existing path
+
+        The path is start, n stops, then the end when has_end. Position i puts the
+        new stop after the i-th node (0 is the start), so only the legs next to it
+        change; with no fixed end, position n appends it after the last stop.
+
+        Args:
+            legs: Cost of each consecutive leg of the current path
+            to_new: Cost from each node before a position (start and the n stops) to the new stop
+            from_new: Cost from the new stop to each node after a position (the n stops and the end)
+            has_end: Whether the path finishes at a fixed end
+
+        Returns:
+            Array of n + 1 added costs, one per position
+        """
+        legs = np.asarray(legs, dtype=np.float64)
+        to_new = np.asarray(to_new, dtype=np.float64)
+        from_new = np.asarray(from_new, dtype=np.float64)
+        between = to_new[:len(legs)] + from_new - legs
+        if has_end:
+            return between
+        return np.concatenate((between, to_new[-1:]))
+
+    @staticmethod
+    def _nearest_neighbour(matrix, stops, end):
+        path = [0]
+        remaining = set(stops)
+        while remaining:
+            current = path[-1]
+            nearest = min(remaining, key=lambda node: (matrix[current, node], node))
+            path.append(nearest)
+            remaining.remove(nearest)
+        path.append(end)
+        return path
+
+    @staticmethod
+    def _two_opt(matrix, path, deadline):
+        """Reverse segments while that shortens the path; start and end stay fixed"""
+        improved = False
+        last = len(path) - 1
+        for i in range(1, last - 1):
+            if time.perf_counter() >= deadline:
+                break
+            # Road distances differ by direction, so the reversed segment's own legs change
+            # too; both directions of path[i..j] are summed as j grows
+            inner = reversed_inner = 0.0
+            for j in range(i + 1, last):
+                inner += matrix[path[j - 1], path[j]]
+                reversed_inner += matrix[path[j], path[j - 1]]
+                a, b, c, d = path[i - 1], path[i], path[j], path[j + 1]
+                if (matrix[a, c] + reversed_inner + matrix[b, d] <
+                        matrix[a, b] + inner + matrix[c, d] - 1e-9):
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    inner, reversed_inner = reversed_inner, inner
+                    improved = True
+        return improved
+
+    @staticmethod
+    def _or_opt(matrix, path, deadline):
+        """Move runs of one to three stops to a cheaper position"""
+        improved = False
+        for length in (1, 2, 3):
+            i = 1
+            while i + length < len(path):
+                if time.perf_counter() >= deadline:
+                    return improved
+                segment = path[i:i + length]
+                before, after = path[i - 1], path[i + length]
+                removed = matrix[before, segment[0]] + matrix[segment[-1], after] - matrix[before, after]
+                rest = path[:i] + path[i + length:]
+
+                best_gain, best_at = 1e-9, None
+                for k in range(len(rest) - 1):
+                    if k == i - 1:
+                        continue
+                    u, v = rest[k], rest[k + 1]
+                    added = matrix[u, segment[0]] + matrix[segment[-1], v] - matrix[u, v]
+                    if removed - added > best_gain:
+                        best_gain, best_at = removed - added, k + 1
+
+                if best_at is not None:
+                    path[:] = rest[:best_at] + segment + rest[best_at:]
+                    improved = True
+                else:
+                    i += 1
+        return improved
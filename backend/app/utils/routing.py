@@ -0,0 +1,191 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .geo_utils import GeoUtils
+from .geo_point import Point
+from .road_graph import RoadGraph, METRES_PER_DEGREE
+
+# Fare multiplier per car type, matching the prices the app shows when creating a ride
+CAR_TYPE_FARE_MULTIPLIERS = {'Basic': 1.0, 'Premium': 1.3, 'Premium+': 1.6, 'SUV': 1.6}
+
+
+class Routing:
+    """Road distance and travel time between points, with fares derived from them"""
+
+    GRAPH_FILE = None
+    # Queries are answered between the centres of cells this size and cached per cell pair
+    CELL_METRES = 150
+    CACHE_SIZE = 200000
+    # Points further than this from any road fall back to straight-line distance
+    MAX_SNAP_METRES = 500
+    # Used when there is no road route
+    FALLBACK_SPEED_KMH = 40
+
+    FARE_BASE = 50
+    FARE_PER_KM = 25
+    FARE_MINIMUM = 50
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def configure(config):
+        """Apply routing and fare settings from the Flask config"""
+        Routing.GRAPH_FILE = config.get('ROAD_GRAPH_FILE')
+        Routing.CELL_METRES = config.get('ROUTE_CACHE_CELL_METRES', 150)
+        Routing.CACHE_SIZE = config.get('ROUTE_CACHE_SIZE', 200000)
+        Routing.MAX_SNAP_METRES = config.get('ROUTE_MAX_SNAP_METRES', 500)
+        Routing.FARE_BASE = config.get('FARE_BASE', 50)
+        Routing.FARE_PER_KM = config.get('FARE_PER_KM', 25)
+        Routing.FARE_MINIMUM = config.get('FARE_MINIMUM', 50)
+        with Routing._lock:
+            Routing._cache.clear()
+
+    @staticmethod
+    def _cell(point):
+        size = Routing.CELL_METRES / METRES_PER_DEGREE
+        return math.floor(point.lat / size), math.floor(point.lng / size)
+
+    @staticmethod
+    def _centre(cell):
+        size = Routing.CELL_METRES / METRES_PER_DEGREE
+        return Point((cell[0] + 0.5) * size, (cell[1] + 0.5) * size)
+
+    @staticmethod
+    def _road(graph, origin, destination):
+        """(metres, seconds) by road between two points, or None"""
+        source, source_off = graph.nearest(origin.lat, origin.lng)
+        target, target_off = graph.nearest(destination.lat, destination.lng)
+        if max(source_off, target_off) > Routing.MAX_SNAP_METRES:
+            return None
+        return graph.shortest_path(source, target)
+
+    @staticmethod
+    def leg(origin, destination):
+        """
+        Unrounded road distance and time between two points
+
+        Returns:
+            Tuple of (km, minutes, source) with source 'road' or 'straight_line'
+        """
+        origin = Point.parse(origin)
+        destination = Point.parse(destination)
+        straight_km = GeoUtils.calculate_distance(origin, destination)
+
+        graph = RoadGraph.load_default(Routing.GRAPH_FILE)
+        cells = (Routing._cell(origin), Routing._cell(destination))
+        result = None
+        if graph is not None and cells[0] != cells[1]:
+            with Routing._lock:
+                result = Routing._cache.get(cells)
+                if result is not None:
+                    Routing._cache.move_to_end(cells)
+            if result is None:
+                # Misses are computed outside the lock; two threads may race to fill the same pair
+                result = Routing._road(graph, Routing._centre(cells[0]), Routing._centre(cells[1])) or False
+                Routing._remember({cells: result})
+        return Routing._measure(result, straight_km)
+
+    @staticmethod
+    def _remember(results):
+        """Add cell pair results to the LRU cache"""
+        with Routing._lock:
+            for cells, result in results.items():
+                Routing._cache[cells] = result
+            while len(Routing._cache) > Routing.CACHE_SIZE:
+                Routing._cache.popitem(last=False)
+
+    @staticmethod
+    def _measure(result, straight_km):
+        """(km, minutes, source) from a cached road result, or the straight line without one"""
+        if result:
+            metres, seconds = result
+            # Cell centres approximate the endpoints, so never report less than the straight line
+            return max(metres / 1000, straight_km), seconds / 60, 'road'
+        return straight_km, straight_km / Routing.FALLBACK_SPEED_KMH * 60, 'straight_line'
+
+    @staticmethod
+    def _road_table(graph, cells):
+        """Road results between every pair of cell centres, from one distance table"""
+        snapped = [graph.nearest(centre.lat, centre.lng) for centre in map(Routing._centre, cells)]
+        usable = [k for k, (_, offset) in enumerate(snapped) if offset <= Routing.MAX_SNAP_METRES]
+        nodes = [snapped[k][0] for k in usable]
+        metres, seconds = graph.distance_table(nodes, nodes)
+
+        results = {(a, b): False for a in cells for b in cells if a != b}
+        for row, k in enumerate(usable):
+            for column, m in enumerate(usable):
+                if k != m and math.isfinite(seconds[row, column]):
+                    results[cells[k], cells[m]] = (float(metres[row, column]), float(seconds[row, column]))
+        return results
+
+    @staticmethod
+    def matrix(points):
+        """
+        (km, minutes) arrays from every point to every other, measured like leg()
+
+        Uncached pairs are priced with one distance table over their cells, a
+        small search per point rather than a route query per pair.
+        """
+        points = [Point.parse(point) for point in points]
+        size = len(points)
+        km = np.zeros((size, size))
+        minutes = np.zeros((size, size))
+        graph = RoadGraph.load_default(Routing.GRAPH_FILE)
+        cells = [Routing._cell(point) for point in points]
+
+        results = {}
+        if graph is not None:
+            pairs = {(a, b) for a in cells for b in cells if a != b}
+            with Routing._lock:
+                for pair in pairs:
+                    if pair in Routing._cache:
+                        results[pair] = Routing._cache[pair]
+                        Routing._cache.move_to_end(pair)
+            missing = pairs - set(results)
+            if missing:
+                computed = Routing._road_table(graph, sorted({cell for pair in missing for cell in pair}))
+                Routing._remember(computed)
+                results.update(computed)
+
+        for i, origin in enumerate(points):
+            for j, destination in enumerate(points):
+                if i != j:
+                    straight_km = GeoUtils.calculate_distance(origin, destination)
+                    km[i, j], minutes[i, j], _ = Routing._measure(results.get((cells[i], cells[j])), straight_km)
+        return km, minutes
+
+    @staticmethod
+    def distance_matrix(points):
+        """(n, n) km from every point to every other, measured like leg()"""
+        return Routing.matrix(points)[0]
+
+    @staticmethod
+    def route(origin, destination):
+        """
+        Road distance and time between two locations
+
+        Args:
+            origin, destination: Points or any location format Point.parse reads
+
+        Returns:
+            Dict with distance_km, minutes and source ('road' or 'straight_line')
+        """
+        km, minutes, source = Routing.leg(origin, destination)
+        return {'distance_km': round(km, 2), 'minutes': max(1, round(minutes)), 'source': source}
+
+    @staticmethod
+    def fare(distance_km, car_type='Basic'):
+        """Fare in rupees for a trip, as base plus per-km rate scaled by the car type"""
+        base = max(Routing.FARE_MINIMUM, round(Routing.FARE_BASE + distance_km * Routing.FARE_PER_KM))
+        return round(base * CAR_TYPE_FARE_MULTIPLIERS.get(car_type, 1.0))
+
+    @staticmethod
+    def quote(origin, destination, car_type='Basic'):
+        """Route plus fare for a trip"""
+        route = Routing.route(origin, destination)
+        route['fare'] = Routing.fare(route['distance_km'], car_type)
+        return route
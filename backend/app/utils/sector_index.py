@@ -0,0 +1,131 @@
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+# Sector outlines shipped with the app; SECTOR_DATA_FILE can point at a newer version
+DEFAULT_SECTOR_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'sectors.geojson')
+
+
+def _ring_contains(ring, x, y):
+    """Even-odd ray casting for one point against one closed [lng, lat] ring"""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def _ring_contains_many(ring, xs, ys):
+    """Vectorized _ring_contains over arrays of longitudes and latitudes"""
+    inside = np.zeros(xs.shape, dtype=bool)
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if y1 != y2:
+            crosses = (y1 > ys) != (y2 > ys)
+            inside ^= crosses & (xs < (x2 - x1) * (ys - y1) / (y2 - y1) + x1)
+        x1, y1 = x2, y2
+    return inside
+
+
+class SectorIndex:
+    """Sector polygons from a GeoJSON file, indexed by a uniform lat/lng grid"""
+
+    UNKNOWN = 'unknown'
+
+    _default = None
+    _lock = threading.Lock()
+
+    def __init__(self, features, version=None, cell_size=0.005):
+        self.version = version
+        self.cell_size = cell_size
+        self.codes = []
+        self.polygons = []
+        self.bounds = []
+        self.grid = {}
+
+        for feature in features:
+            geometry = feature.get('geometry') or {}
+            code = (feature.get('properties') or {}).get('code')
+            if geometry.get('type') == 'Polygon':
+                parts = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                parts = geometry['coordinates']
+            else:
+                continue
+
+            for rings in parts:
+                # Outer ring first, holes after, each as (lng, lat) tuples
+                rings = [[(float(x), float(y)) for x, y in ring] for ring in rings]
+                xs = [x for x, _ in rings[0]]
+                ys = [y for _, y in rings[0]]
+                self.codes.append(code)
+                self.polygons.append(rings)
+                self.bounds.append((min(xs), min(ys), max(xs), max(ys)))
+
+        # Every grid cell lists the polygons whose bounding box touches it, in file order
+        for index, (min_x, min_y, max_x, max_y) in enumerate(self.bounds):
+            for cx in range(self._cell(min_x), self._cell(max_x) + 1):
+                for cy in range(self._cell(min_y), self._cell(max_y) + 1):
+                    self.grid.setdefault((cx, cy), []).append(index)
+
+    @staticmethod
+    def load(path=None):
+        """Read a sector GeoJSON FeatureCollection"""
+        with open(path or DEFAULT_SECTOR_FILE) as f:
+            data = json.load(f)
+        return SectorIndex(data.get('features', []), version=data.get('version'))
+
+    @staticmethod
+    def load_default(path=None):
+        """Load the process-wide index once; later calls return the same instance"""
+        if SectorIndex._default is None:
+            with SectorIndex._lock:
+                if SectorIndex._default is None:
+                    SectorIndex._default = SectorIndex.load(path)
+        return SectorIndex._default
+
+    def _cell(self, value):
+        return math.floor(value / self.cell_size)
+
+    def _contains(self, index, x, y):
+        rings = self.polygons[index]
+        return _ring_contains(rings[0], x, y) and not any(_ring_contains(hole, x, y) for hole in rings[1:])
+
+    def sector_at(self, lat, lng):
+        """Return the sector code containing the point, or 'unknown'"""
+        if lat is None or lng is None:
+            return SectorIndex.UNKNOWN
+
+        for index in self.grid.get((self._cell(lng), self._cell(lat)), ()):
+            if self._contains(index, lng, lat):
+                return self.codes[index]
+
+        return SectorIndex.UNKNOWN
+
+    def classify(self, lats, lngs):
+        """Return one sector code per (lat, lng) pair, computed with array operations"""
+        ys = np.asarray(lats, dtype=np.float64)
+        xs = np.asarray(lngs, dtype=np.float64)
+        found = np.full(ys.shape, -1, dtype=np.int32)
+
+        # With a few dozen polygons a bounding box pass per polygon beats grouping points by cell
+        for index, (min_x, min_y, max_x, max_y) in enumerate(self.bounds):
+            candidates = np.flatnonzero(
+                (found < 0) & (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+            )
+            if not candidates.size:
+                continue
+
+            rings = self.polygons[index]
+            inside = _ring_contains_many(rings[0], xs[candidates], ys[candidates])
+            for hole in rings[1:]:
+                inside &= ~_ring_contains_many(hole, xs[candidates], ys[candidates])
+            found[candidates[inside]] = index
+
+        codes = self.codes
+        return [codes[index] if index >= 0 else SectorIndex.UNKNOWN for index in found.tolist()]
@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+
+METRES_PER_DEGREE = 111320.0
+
+
+class TrailCodec:
+    """Downsampling and compact text encoding for timestamped GPS trails"""
+
+    @staticmethod
+    def simplify(lats, lngs, times, tolerance_metres=10):
+        """
+        Douglas-Peucker over a trail, measuring error in space and time
+
+        Each dropped point is compared with where the vehicle would be at that
+        moment moving at constant speed along the kept segment (synchronized
+        Euclidean distance), so stops and speed changes survive along with shape.
+
+        Args:
+            lats, lngs: Point coordinates in degrees
+            times: Seconds for each point, non-decreasing
+            tolerance_metres: Largest error a dropped point may have
+
+        Returns:
+            Sorted indices of the points to keep, always including both ends
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        size = len(lats)
+        if size <= 2:
+            return np.arange(size)
+
+        cos_lat = math.cos(math.radians(float(lats.mean())))
+        x = np.asarray(lngs, dtype=np.float64) * METRES_PER_DEGREE * cos_lat
+        y = lats * METRES_PER_DEGREE
+        t = np.asarray(times, dtype=np.float64)
+
+        keep = np.zeros(size, dtype=bool)
+        keep[0] = keep[-1] = True
+        # Explicit stack: hour-long trails would overflow recursion
+        stack = [(0, size - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+            inner = slice(first + 1, last)
+            span = t[last] - t[first]
+            ratio = (t[inner] - t[first]) / span if span > 0 else np.full(last - first - 1, 0.5)
+            errors = np.hypot(x[inner] - (x[first] + (x[last] - x[first]) * ratio),
+                              y[inner] - (y[first] + (y[last] - y[first]) * ratio))
+            worst = int(np.argmax(errors))
+            if errors[worst] > tolerance_metres:
+                split = first + 1 + worst
+                keep[split] = True
+                stack.append((first, split))
+                stack.append((split, last))
+
+        return np.flatnonzero(keep)
+
+    @staticmethod
+    def _encode_signed(deltas):
+        """Zigzag each integer so small negatives stay short, then emit 5-bit groups low first"""
+        chunks = []
+        for delta in deltas:
+            delta = int(delta)
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                chunks.append(chr((0x20 | (delta & 0x1f)) + 63))
+                delta >>= 5
+            chunks.append(chr(delta + 63))
+        return ''.join(chunks)
+
+    @staticmethod
+    def _decode_signed(text):
+        deltas = []
+        shift = result = 0
+        for char in text:
+            byte = ord(char) - 63
+            result |= (byte & 0x1f) << shift
+            shift += 5
+            if byte < 0x20:
+                deltas.append(~(result >> 1) if result & 1 else result >> 1)
+                shift = result = 0
+        return deltas
+
+    @staticmethod
+    def encode_deltas(values):
+        """Integers as differences between neighbours, in the polyline alphabet"""
+        return TrailCodec._encode_signed(np.diff(np.asarray(values, dtype=np.int64), prepend=0))
+
+    @staticmethod
+    def decode_deltas(text):
+        """Inverse of encode_deltas"""
+        return np.cumsum(TrailCodec._decode_signed(text), dtype=np.int64).tolist()
+
+    @staticmethod
+    def encode_polyline(lats, lngs, precision=5):
+        """Google encoded polyline of a list of points"""
+        factor = 10 ** precision
+        lats = np.round(np.asarray(lats, dtype=np.float64) * factor).astype(np.int64)
+        lngs = np.round(np.asarray(lngs, dtype=np.float64) * factor).astype(np.int64)
+        # Latitudes and longitudes are delta-coded separately and interleaved
+        deltas = np.empty(2 * len(lats), dtype=np.int64)
+        deltas[0::2] = np.diff(lats, prepend=0)
+        deltas[1::2] = np.diff(lngs, prepend=0)
+        return TrailCodec._encode_signed(deltas)
+
+    @staticmethod
+    def decode_polyline(text, precision=5):
+        """(lats, lngs) lists from a Google encoded polyline"""
+        deltas = np.asarray(TrailCodec._decode_signed(text), dtype=np.int64)
+        factor = 10 ** precision
+        return (np.cumsum(deltas[0::2]) / factor).tolist(), (np.cumsum(deltas[1::2]) / factor).tolist()
+
+    @staticmethod
+    def length_metres(lats, lngs):
+        """Length of a trail along its points, treating each short step as flat"""
+        if len(lats) < 2:
+            return 0.0
+        lats = np.radians(np.asarray(lats, dtype=np.float64))
+        lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+        mid = (lats[1:] + lats[:-1]) / 2
+        steps = np.hypot(np.diff(lats), np.diff(lngs) * np.cos(mid))
+        return float(steps.sum() * 6371000.0)
@@ -0,0 +1,4 @@
+"""Offline benchmarks and evaluations for the RideMatch backend.
+
+Run modules from the backend directory, e.g. ``python -m benchmarks.lsh_recall``.
+"""
@@ -0,0 +1,81 @@
+import random
+
+
+def generate_keyword_sets(users, vocabulary_size=2000, keywords_per_user=8,
+                          communities=200, community_bias=0.8, seed=42):
+    """Generate synthetic keyword sets with community structure.
+
+    Each user belongs to one interest community and draws most keywords
+    from that community's slice of the vocabulary, so similar users exist
+    the way they do in real hobby descriptions.
+    """
+    rng = random.Random(seed)
+    vocabulary = [f'term{i}' for i in range(vocabulary_size)]
+    slice_size = max(1, vocabulary_size // communities)
+
+    keyword_sets = []
+    for _ in range(users):
+        community = rng.randrange(communities)
+        own_terms = vocabulary[community * slice_size:(community + 1) * slice_size]
+        count = max(1, int(rng.gauss(keywords_per_user, keywords_per_user / 4)))
+
+        keywords = set()
+        while len(keywords) < count:
+            pool = own_terms if rng.random() < community_bias else vocabulary
+            keywords.add(rng.choice(pool))
+        keyword_sets.append(keywords)
+
+    return keyword_sets
+
+
+def _synthetic_word(index):
+    """Deterministic alphabetic filler word (the extractor drops anything non-alpha)"""
+    letters = []
+    index += 26 * 26
+    while index:
+        index, remainder = divmod(index, 26)
+        letters.append(chr(ord('a') + remainder))
+    return 'hob' + ''.join(letters)
+
+
+def zipf_vocabulary(size, hobby_terms=()):
+    """Vocabulary led by real hobby terms so category matching is exercised"""
+    vocabulary = list(dict.fromkeys(hobby_terms))[:size]
+    index = 0
+    while len(vocabulary) < size:
+        vocabulary.append(_synthetic_word(index))
+        index += 1
+    return vocabulary
+
+
+def generate_zipf_descriptions(users, vocabulary_size=5000, words_per_description=12,
+                               exponent=1.1, hobby_terms=(), seed=42):
+    """Generate free-text hobby descriptions whose terms follow a Zipf distribution.
+
+    A few popular hobbies appear in most descriptions and a long tail of
+    rare ones in very few, which is what makes posting lists skewed.
+    """
+    rng = random.Random(seed)
+    vocabulary = zipf_vocabulary(vocabulary_size, hobby_terms)
+
+    # Real hobbies take the popular ranks, shuffled so popularity is not tied
+    # to category order; synthetic words form the long tail
+    head = vocabulary[:len(set(hobby_terms))]
+    tail = vocabulary[len(head):]
+    rng.shuffle(head)
+    ranked = head + tail
+    weights = [1.0 / (rank + 1) ** exponent for rank in range(len(ranked))]
+    fillers = ['i', 'love', 'and', 'the', 'with', 'my', 'friends', 'really', 'enjoy']
+
+    descriptions = []
+    for _ in range(users):
+        count = max(1, int(rng.gauss(words_per_description, words_per_description / 4)))
+        terms = rng.choices(ranked, weights=weights, k=count)
+        words = []
+        for term in terms:
+            if rng.random() < 0.3:
+                words.append(rng.choice(fillers))
+            words.append(term)
+        descriptions.append(' '.join(words) + rng.choice(['.', '!', '', ', etc.']))
+
+    return descriptions
@@ -0,0 +1,147 @@
+"""Compare the MinHash LSH matching mode against exact Jaccard matching.
+
+Reports recall@k and per-query latency for each band/row layout on a
+synthetic corpus, so MATCH_LSH_BANDS / MATCH_LSH_ROWS can be chosen
+from data:
+
+    python -m benchmarks.lsh_recall --users 20000 --layouts 16x2,32x2,64x1
+"""
+import argparse
+import heapq
+import random
+import statistics
+import time
+
+from app.utils.match_engine import BatchMatchEngine
+from app.utils.minhash import MinHashLSH
+from .corpus import generate_keyword_sets
+
+
+def jaccard(a, b):
+    common = len(a & b)
+    return common / (len(a) + len(b) - common) if common else 0.0
+
+
+def top_k(query, keyword_sets, candidates, k):
+    """Score candidates exactly and keep the k best (the compute_matches step)"""
+    scored = (
+        (jaccard(keyword_sets[query], keyword_sets[c]), c)
+        for c in candidates if c != query
+    )
+    return [item for item in heapq.nlargest(k, scored) if item[0] > 0]
+
+
+def build_inverted_index(keyword_sets):
+    postings = {}
+    for user, keywords in enumerate(keyword_sets):
+        for keyword in keywords:
+            postings.setdefault(keyword, []).append(user)
+    return postings
+
+
+def build_lsh_index(keyword_sets, lsh):
+    buckets = {}
+    user_buckets = []
+    for user, keywords in enumerate(keyword_sets):
+        _, keys = lsh.buckets_for(keywords)
+        user_buckets.append(keys)
+        for key in keys:
+            buckets.setdefault(key, []).append(user)
+    return buckets, user_buckets
+
+
+def recall_at_k(approximate, exact):
+    """Share of the exact top k recovered, counting ties at the cut-off as hits"""
+    if not exact:
+        return 1.0
+    threshold = exact[-1][0]
+    hits = sum(1 for score, _ in approximate if score >= threshold)
+    return min(hits, len(exact)) / len(exact)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def evaluate(keyword_sets, layouts, k, queries, seed):
+    rng = random.Random(seed)
+    sample = rng.sample(range(len(keyword_sets)), min(queries, len(keyword_sets)))
+
+    # Ground truth from the exact batch engine
+    start = time.perf_counter()
+    exact_rows = BatchMatchEngine(top_k=k, workers=1).compute(keyword_sets)
+    batch_seconds = time.perf_counter() - start
+    exact = {
+        query: sorted(
+            ((jaccard(keyword_sets[query], keyword_sets[c]), c) for c in exact_rows[query][0]),
+            reverse=True
+        )
+        for query in sample
+    }
+    print(f'exact batch engine: {len(keyword_sets)} users in {batch_seconds:.2f}s')
+
+    # Per-query latency of the exact inverted-index path
+    postings = build_inverted_index(keyword_sets)
+    latencies = []
+    candidate_counts = []
+    for query in sample:
+        start = time.perf_counter()
+        candidates = set()
+        for keyword in keyword_sets[query]:
+            candidates.update(postings[keyword])
+        top_k(query, keyword_sets, candidates, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        candidate_counts.append(len(candidates))
+    print(f'{"exact":>8}  recall@{k}=1.000  candidates={statistics.mean(candidate_counts):>7.0f}  '
+          f'p50={percentile(latencies, 50):.3f}ms  p99={percentile(latencies, 99):.3f}ms')
+
+    for bands, rows in layouts:
+        lsh = MinHashLSH(bands=bands, rows=rows)
+        buckets, user_buckets = build_lsh_index(keyword_sets, lsh)
+
+        recalls = []
+        latencies = []
+        candidate_counts = []
+        for query in sample:
+            start = time.perf_counter()
+            candidates = set()
+            for key in user_buckets[query]:
+                candidates.update(buckets[key])
+            approximate = top_k(query, keyword_sets, candidates, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            candidate_counts.append(len(candidates))
+            recalls.append(recall_at_k(approximate, exact[query]))
+
+        print(f'{lsh.params:>8}  recall@{k}={statistics.mean(recalls):.3f}  '
+              f'candidates={statistics.mean(candidate_counts):>7.0f}  '
+              f'p50={percentile(latencies, 50):.3f}ms  p99={percentile(latencies, 99):.3f}ms')
+
+
+def parse_layouts(value):
+    layouts = []
+    for item in value.split(','):
+        bands, rows = item.lower().split('x')
+        layouts.append((int(bands), int(rows)))
+    return layouts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--vocabulary', type=int, default=2000)
+    parser.add_argument('--keywords', type=int, default=8, help='mean keywords per user')
+    parser.add_argument('--layouts', type=parse_layouts, default=parse_layouts('16x4,16x2,32x2,64x1'),
+                        help='comma separated BANDSxROWS layouts')
+    parser.add_argument('--k', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    keyword_sets = generate_keyword_sets(args.users, args.vocabulary, args.keywords, seed=args.seed)
+    evaluate(keyword_sets, args.layouts, args.k, args.queries, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+"""In-memory stand-in for the parts of the pymongo API the matching code uses.
+
+Unlike general-purpose mocks it keeps hash indexes for fields passed to
+create_index, so equality and $in lookups cost what they would on a real
+indexed collection. Without that, benchmarks at 100k users would only
+measure full collection scans inside the stand-in.
+"""
+from types import SimpleNamespace
+
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _values(value):
+    """Values a field contributes to an index or equality match (arrays are multikey)"""
+    if value is _MISSING:
+        return []
+    if isinstance(value, list):
+        return value + [tuple(value)] if value else [()]
+    return [value]
+
+
+def _key(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _compare(value, op, operand):
+    candidates = value if isinstance(value, list) else [value]
+    if op == '$ne':
+        return operand not in candidates and value != operand
+    if op == '$in':
+        return any(v in operand for v in candidates) or (value is None and None in operand)
+    if op == '$nin':
+        return not any(v in operand for v in candidates)
+    if op == '$exists':
+        return (value is not _MISSING) == bool(operand)
+    if value is _MISSING or value is None:
+        return False
+    if op == '$bitsAnySet':
+        return isinstance(value, int) and bool(value & operand)
+    if op == '$gt':
+        return any(v > operand for v in candidates)
+    if op == '$gte':
+        return any(v >= operand for v in candidates)
+    if op == '$lt':
+        return any(v < operand for v in candidates)
+    if op == '$lte':
+        return any(v <= operand for v in candidates)
+    raise NotImplementedError(f'Unsupported query operator {op}')
+
+
+def _prepare(query):
+    """Turn $in/$nin operand lists into sets so membership tests are O(1)"""
+    prepared = {}
+    for field, condition in query.items():
+        if field in ('$or', '$and'):
+            prepared[field] = [_prepare(sub) for sub in condition]
+        elif isinstance(condition, dict):
+            prepared[field] = {
+                op: _hashable_set(operand) if op in ('$in', '$nin') else operand
+                for op, operand in condition.items()
+            }
+        else:
+            prepared[field] = condition
+    return prepared
+
+
+def _hashable_set(values):
+    try:
+        return frozenset(values)
+    except TypeError:
+        return values
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        if field == '$or':
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        if field == '$and':
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+            continue
+
+        value = _get(doc, field)
+        if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+            for op, operand in condition.items():
+                if op == '$exists':
+                    if not _compare(value, op, operand):
+                        return False
+                elif value is _MISSING:
+                    if op not in ('$ne', '$nin') or (op == '$ne' and operand is None):
+                        return False
+                elif not _compare(value, op, operand):
+                    return False
+        else:
+            if value is _MISSING:
+                if condition is not None:
+                    return False
+            elif value != condition and not (isinstance(value, list) and condition in value):
+                return False
+    return True
+
+
+def _sort_key(value):
+    # Missing and null sort before everything else, as in MongoDB
+    if value is _MISSING or value is None:
+        return (0, 0)
+    return (1, value)
+
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    include_id = projection.get('_id', 1)
+    fields = [f for f, on in projection.items() if on and f != '_id']
+    if not fields:
+        result = {k: v for k, v in doc.items() if projection.get(k, 1)}
+    else:
+        result = {f: doc[f] for f in fields if f in doc}
+        if include_id and '_id' in doc:
+            result['_id'] = doc['_id']
+    return result
+
+
+class Cursor:
+    def __init__(self, docs, projection):
+        self._docs = docs
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction=None):
+        self._sort = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        docs = self._docs
+        if self._sort:
+            for field, direction in reversed(self._sort):
+                docs = sorted(docs, key=lambda d: _sort_key(_get(d, field)), reverse=direction < 0)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return (_project(doc, self._projection) for doc in docs)
+
+
+class Collection:
+    def __init__(self, name):
+        self.name = name
+        self._docs = {}
+        self._indexes = {}
+        self._unique = []
+
+    # Indexes
+
+    def create_index(self, keys, unique=False, partialFilterExpression=None, **kwargs):
+        fields = [keys] if isinstance(keys, str) else [k for k, _ in keys]
+        field = fields[0]
+        if field not in self._indexes:
+            self._indexes[field] = {}
+            for doc in self._docs.values():
+                self._index_doc(doc, only=field)
+        if unique:
+            self._unique.append((tuple(fields), partialFilterExpression or {}))
+        return '_'.join(fields)
+
+    def _index_doc(self, doc, only=None):
+        for field, index in self._indexes.items():
+            if only and field != only:
+                continue
+            for value in _values(_get(doc, field)):
+                index.setdefault(_key(value), set()).add(doc['_id'])
+
+    def _unindex_doc(self, doc):
+        for field, index in self._indexes.items():
+            for value in _values(_get(doc, field)):
+                bucket = index.get(_key(value))
+                if bucket:
+                    bucket.discard(doc['_id'])
+                    if not bucket:
+                        del index[_key(value)]
+
+    def _check_unique(self, doc):
+        for fields, partial in self._unique:
+            if partial and not matches(doc, partial):
+                continue
+            query = {f: _get(doc, f) for f in fields if _get(doc, f) is not _MISSING}
+            query.update(partial)
+            for other in self._candidates(query):
+                if other['_id'] != doc['_id'] and matches(other, query):
+                    raise DuplicateKeyError(f'E11000 duplicate key in {self.name}: {query}')
+
+    def _candidates(self, query):
+        """Narrow the scan with an index on an equality or $in condition"""
+        if '_id' in query and not isinstance(query['_id'], dict):
+            doc = self._docs.get(query['_id'])
+            return [doc] if doc else []
+
+        for field, condition in query.items():
+            index = self._indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(condition, dict) and set(condition) == {'$in'}:
+                ids = set()
+                for value in condition['$in']:
+                    ids.update(index.get(_key(value), ()))
+            elif not isinstance(condition, dict) and condition is not None:
+                ids = index.get(_key(condition), set())
+            else:
+                continue
+            return [self._docs[i] for i in ids]
+
+        return list(self._docs.values())
+
+    def _find_docs(self, query):
+        query = _prepare(query or {})
+        return [doc for doc in self._candidates(query) if matches(doc, query)]
+
+    # Reads
+
+    def find(self, query=None, projection=None):
+        return Cursor(self._find_docs(query), projection)
+
+    def find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor.limit(1)), None)
+
+    def count_documents(self, query):
+        return len(self._find_docs(query))
+
+    def estimated_document_count(self):
+        return len(self._docs)
+
+    # Writes
+
+    def insert_one(self, doc):
+        doc.setdefault('_id', ObjectId())
+        stored = dict(doc)
+        self._check_unique(stored)
+        self._docs[stored['_id']] = stored
+        self._index_doc(stored)
+        return SimpleNamespace(inserted_id=stored['_id'])
+
+    def insert_many(self, docs, ordered=True):
+        return SimpleNamespace(inserted_ids=[self.insert_one(doc).inserted_id for doc in docs])
+
+    def _apply(self, doc, update, inserting=False):
+        for op, fields in update.items():
+            for field, value in fields.items():
+                if op == '$set' or (op == '$setOnInsert' and inserting):
+                    doc[field] = value
+                elif op == '$unset':
+                    doc.pop(field, None)
+                elif op == '$inc':
+                    doc[field] = doc.get(field, 0) + value
+                elif op == '$addToSet':
+                    items = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                    current = list(doc.get(field, []))
+                    present = set(_key(v) for v in current)
+                    for item in items:
+                        if _key(item) not in present:
+                            current.append(item)
+                            present.add(_key(item))
+                    doc[field] = current
+                elif op == '$push':
+                    items = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                    doc[field] = list(doc.get(field, [])) + list(items)
+                elif op == '$pull':
+                    doc[field] = [v for v in doc.get(field, []) if v != value]
+                elif op != '$setOnInsert':
+                    raise NotImplementedError(f'Unsupported update operator {op}')
+
+    def _update(self, query, update, upsert, many):
+        docs = self._find_docs(query)
+        if not many:
+            docs = docs[:1]
+
+        for doc in docs:
+            self._unindex_doc(doc)
+            original = dict(doc)
+            self._apply(doc, update)
+            try:
+                self._check_unique(doc)
+            except DuplicateKeyError:
+                doc.clear()
+                doc.update(original)
+                self._index_doc(doc)
+                raise
+            self._index_doc(doc)
+
+        if docs or not upsert:
+            return SimpleNamespace(matched_count=len(docs), modified_count=len(docs), upserted_id=None), docs
+
+        doc = {
+            field: condition for field, condition in query.items()
+            if not field.startswith('$') and not isinstance(condition, dict)
+        }
+        self._apply(doc, update, inserting=True)
+        self.insert_one(doc)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc['_id']), [self._docs[doc['_id']]]
+
+    def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=False)[0]
+
+    def update_many(self, query, update, upsert=False):
+        return self._update(query, update, upsert, many=True)[0]
+
+    def find_one_and_update(self, query, update, projection=None, sort=None,
+                            upsert=False, return_document=False):
+        existing = self.find_one(query, sort=sort)
+        if existing:
+            before = dict(existing)
+            self._update({'_id': existing['_id']}, update, False, many=False)
+            after = self._docs[existing['_id']]
+        elif upsert:
+            before = None
+            _, docs = self._update(query, update, True, many=False)
+            after = docs[0]
+        else:
+            return None
+        result = after if return_document else before
+        return _project(result, projection) if result else None
+
+    def delete_one(self, query):
+        doc = next(iter(self._find_docs(query)), None)
+        if doc:
+            self._unindex_doc(doc)
+            del self._docs[doc['_id']]
+        return SimpleNamespace(deleted_count=1 if doc else 0)
+
+    def delete_many(self, query):
+        docs = self._find_docs(query)
+        for doc in docs:
+            self._unindex_doc(doc)
+            del self._docs[doc['_id']]
+        return SimpleNamespace(deleted_count=len(docs))
+
+    def find_one_and_delete(self, query, projection=None, sort=None):
+        doc = self.find_one(query, sort=sort)
+        if doc:
+            self.delete_one({'_id': doc['_id']})
+        return _project(doc, projection) if doc else None
+
+    def drop(self):
+        self._docs = {}
+        self._indexes = {}
+        self._unique = []
+
+    def bulk_write(self, operations, ordered=True):
+        matched = modified = upserted = 0
+        for operation in operations:
+            document = operation._doc
+            if type(operation).__name__ == 'UpdateMany':
+                result = self.update_many(operation._filter, document, upsert=bool(operation._upsert))
+            elif type(operation).__name__ == 'InsertOne':
+                self.insert_one(document)
+                continue
+            else:
+                result = self.update_one(operation._filter, document, upsert=bool(operation._upsert))
+            matched += result.matched_count
+            modified += result.modified_count
+            upserted += 1 if result.upserted_id is not None else 0
+        return SimpleNamespace(matched_count=matched, modified_count=modified, upserted_count=upserted)
+
+
+class Database:
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = Collection(name)
+        return self._collections[name]
+
+    def create_collection(self, name, **kwargs):
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self._collections)
@@ -0,0 +1,208 @@
+"""Benchmark suite for the companion matching engine.
+
+Generates Zipf-distributed hobby corpora, loads them into an in-memory
+Mongo stand-in and measures keyword extraction, per-user matching and the
+full update_all_user_hobbies run. Reports throughput, p50/p99 latency and
+peak traced memory, and exits non-zero when a metric regresses past the
+threshold relative to a stored baseline:
+
+    python -m benchmarks.run --sizes 1000,10000,100000
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.25
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from app import mongo
+from app.models.match import Match
+from app.models.vocabulary import Vocabulary
+from app.utils.nlp_processor import NLPProcessor
+from .corpus import generate_zipf_descriptions
+from .memory_mongo import Database
+
+# Metrics where a larger value is a regression; throughput is the reverse
+LOWER_IS_BETTER = ('p50_ms', 'p99_ms', 'peak_mb')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure(name, calls, memory_calls=50):
+    """Time each call, then re-run a prefix under tracemalloc for peak memory"""
+    gc.collect()
+    latencies = []
+    start = time.perf_counter()
+    for call in calls:
+        began = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - began) * 1000)
+    elapsed = time.perf_counter() - start
+
+    # Tracing slows allocation-heavy code, so it is kept out of the timed pass
+    gc.collect()
+    tracemalloc.start()
+    for call in calls[:memory_calls]:
+        call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'benchmark': name,
+        'calls': len(latencies),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 4),
+        'p99_ms': round(percentile(latencies, 99), 4),
+        'peak_mb': round(peak / (1024 * 1024), 3)
+    }
+
+
+def load_corpus(users, seed):
+    """Fresh in-memory database holding one user_hobbies document per synthetic user"""
+    mongo.db = Database()
+    Vocabulary.reset()
+    Match.ensure_indexes()
+
+    hobby_terms = [term for terms in NLPProcessor.HOBBY_CATEGORIES.values() for term in terms]
+    descriptions = generate_zipf_descriptions(users, hobby_terms=hobby_terms, seed=seed)
+    extracted = NLPProcessor.extract_keywords_batch(descriptions)
+
+    now = datetime.utcnow()
+    mongo.db.user_hobbies.insert_many([
+        {
+            'user_id': f'bench-user-{i}',
+            'raw_description': description,
+            **Match.hobby_fields(description, keywords),
+            'description_updated_at': now,
+            'created_at': now
+        }
+        for i, (description, keywords) in enumerate(zip(descriptions, extracted))
+    ])
+    Match.rebuild_keyword_index()
+    Match.rebuild_category_pools()
+
+    return descriptions
+
+
+def run_size(users, queries, seed, workers):
+    rng = random.Random(seed)
+    descriptions = load_corpus(users, seed)
+    results = []
+
+    # Keyword extraction, cold cache for every description
+    sample = rng.sample(descriptions, min(queries * 10, len(descriptions)))
+
+    def extract(text):
+        def call():
+            NLPProcessor._extract_cached.cache_clear()
+            NLPProcessor.extract_keywords(text)
+        return call
+
+    results.append(measure('extract_keywords', [extract(text) for text in sample]))
+
+    # Per-user match computation through the keyword index
+    user_ids = [f'bench-user-{i}' for i in rng.sample(range(users), min(queries, users))]
+    results.append(measure(
+        'compute_matches',
+        [lambda uid=uid: Match.compute_matches(uid) for uid in user_ids]
+    ))
+
+    # Full nightly run: every description stale, then a batch recompute
+    def full_update():
+        mongo.db.user_hobbies.update_many({}, {'$set': {'extractor_version': None}})
+        NLPProcessor._extract_cached.cache_clear()
+        Match.update_all_user_hobbies(full_recompute=True, workers=workers)
+
+    update = measure('update_all_user_hobbies', [full_update], memory_calls=1)
+    # One call per run; report users processed per second instead
+    update['throughput_per_s'] = round(users / (update['p50_ms'] / 1000), 2) if update['p50_ms'] else 0.0
+    results.append(update)
+
+    for result in results:
+        result['users'] = users
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of human readable regressions against the baseline"""
+    expected = {(r['users'], r['benchmark']): r for r in baseline.get('results', [])}
+    regressions = []
+
+    for result in results:
+        reference = expected.get((result['users'], result['benchmark']))
+        if not reference:
+            continue
+
+        for metric in LOWER_IS_BETTER:
+            if reference.get(metric) and result[metric] > reference[metric] * (1 + threshold):
+                regressions.append(
+                    f"{result['benchmark']}@{result['users']}: {metric} "
+                    f"{result[metric]} > {reference[metric]} (+{threshold:.0%})"
+                )
+
+        if reference.get('throughput_per_s') and \
+                result['throughput_per_s'] < reference['throughput_per_s'] * (1 - threshold):
+            regressions.append(
+                f"{result['benchmark']}@{result['users']}: throughput_per_s "
+                f"{result['throughput_per_s']} < {reference['throughput_per_s']} (-{threshold:.0%})"
+            )
+
+    return regressions
+
+
+def print_table(results):
+    print(f"{'benchmark':<26}{'users':>8}{'calls':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+    for r in results:
+        print(f"{r['benchmark']:<26}{r['users']:>8}{r['calls']:>8}{r['throughput_per_s']:>12}"
+              f"{r['p50_ms']:>10}{r['p99_ms']:>10}{r['peak_mb']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma separated corpus sizes (users)')
+    parser.add_argument('--queries', type=int, default=100,
+                        help='compute_matches calls per size (extraction uses 10x)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='process pool size for the batch engine')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed relative regression before failing (0.2 = 20%%)')
+    parser.add_argument('--save-baseline', help='write these results as a new baseline')
+    args = parser.parse_args()
+
+    NLPProcessor.warm_up()
+
+    results = []
+    for users in [int(size) for size in args.sizes.split(',')]:
+        print(f'Running {users} users...', file=sys.stderr)
+        results.extend(run_size(users, args.queries, args.seed, args.workers))
+
+    print_table(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'created_at': datetime.utcnow().isoformat(), 'results': results}, f, indent=2)
+        print(f'Baseline written to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print('\nRegressions:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print('\nNo regressions beyond threshold')
+
+
+if __name__ == '__main__':
+    main()
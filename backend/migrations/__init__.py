@@ -0,0 +1 @@
+"""One-off data migrations, run from the backend directory with python -m migrations.<name>."""
@@ -0,0 +1,29 @@
+"""Store available_rides.location as GeoJSON Points and build the 2dsphere index.
+
+Rewrites {'address', 'coordinates': {'latitude', 'longitude'}} locations as
+{'type': 'Point', 'coordinates': [lng, lat], 'address'} so the address the
+clients display stays on the document. Locations without coordinates are
+removed. Safe to re-run.
+
+    cd backend && python -m migrations.available_rides_geojson
+"""
+from flask import Flask
+
+from app import mongo
+from app.config import Config
+from app.models.ride import Ride
+
+
+def main():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    mongo.init_app(app)
+
+    with app.app_context():
+        migrated = Ride.migrate_available_ride_locations()
+        Ride.ensure_indexes()
+        print(f'Converted {migrated} available_rides locations')
+
+
+if __name__ == '__main__':
+    main()
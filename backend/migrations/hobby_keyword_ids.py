@@ -0,0 +1,29 @@
+"""Store user_hobbies keywords as vocabulary term ids and categories as a bitmask.
+
+Interns every stored keyword into hobby_vocabulary, replaces extracted_keywords,
+extracted_csv, categories and categories_csv with keyword_ids and category_mask,
+and rebuilds the term posting lists. Safe to re-run; converted documents are skipped.
+
+    cd backend && python -m migrations.hobby_keyword_ids
+"""
+from flask import Flask
+
+from app import mongo
+from app.config import Config
+from app.models.match import Match
+from app.models.vocabulary import Vocabulary
+
+
+def main():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    mongo.init_app(app)
+
+    with app.app_context():
+        Vocabulary.ensure_indexes()
+        migrated = Match.migrate_keyword_ids()
+        print(f'Converted {migrated} user_hobbies documents')
+
+
+if __name__ == '__main__':
+    main()
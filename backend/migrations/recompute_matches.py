@@ -0,0 +1,31 @@
+"""Rebuild every user's stored matches from their hobby descriptions.
+
+Reprocesses all user_hobbies descriptions with the current extractor, then
+recomputes user_best_matches for everyone with the batch engine. The interest
+updater runs the rebuild (without reprocessing) every MATCH_FULL_RECOMPUTE_DAYS;
+run this after changing Match.TOP_MATCHES, the vocabulary or the extractor,
+or when that schedule is disabled.
+
+    cd backend && python -m migrations.recompute_matches
+"""
+from flask import Flask
+
+from app import mongo
+from app.config import Config
+from app.models.match import Match
+from app.tasks.interest_updater import run_full_recompute
+
+
+def main():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    mongo.init_app(app)
+
+    with app.app_context():
+        Match.configure(app.config)
+        stats = run_full_recompute(reprocess=True)
+        print(f"Recomputed matches for {stats['users']} users in {stats['duration_seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
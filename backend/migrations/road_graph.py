@@ -0,0 +1,33 @@
+"""Compile the OSM extract at ROAD_GRAPH_FILE into the .npz graph the app loads.
+
+Parses the driveable ways, keeps the largest strongly connected road network and
+builds its contraction hierarchy, writing <extract>.npz next to the extract. The
+app only loads the .npz, since contraction takes minutes for a city; without it
+distances are straight lines. Run this before deploying a new extract. An
+explicit path overrides ROAD_GRAPH_FILE.
+
+    cd backend && python -m migrations.road_graph [path/to/city.osm.bz2]
+"""
+import sys
+import time
+
+from app.config import Config
+from app.utils.road_graph import RoadGraph
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else Config.ROAD_GRAPH_FILE
+    if not path:
+        print('Set ROAD_GRAPH_FILE or pass the path of an OSM extract')
+        sys.exit(1)
+
+    started = time.monotonic()
+    graph = RoadGraph.from_osm(path)
+    print(f'Parsed {len(graph)} nodes and {len(graph.targets)} edges')
+    graph = graph.contract()
+    graph.save(RoadGraph.compiled_path(path))
+    print(f'Wrote {RoadGraph.compiled_path(path)} in {time.monotonic() - started:.0f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Recompute the stored sector of rides from their pickup coordinates.
+
+Classifies pickup points in chunks with the vectorized sector index and writes
+back only documents whose sector changed, stamping sector_version so a re-run
+after a geometry update only touches documents classified with older data.
+Covers rides and ride_history (pickup_location) and available_rides (location).
+user_profiles carry a user-entered sector but no coordinates, so they are left alone.
+
+    cd backend && python -m migrations.sectors
+"""
+from flask import Flask
+from pymongo import UpdateOne
+
+from app import mongo
+from app.config import Config
+from app.utils.geo_utils import GeoUtils
+from app.utils.sector_index import SectorIndex
+
+# Collection -> field holding the {'address', 'coordinates'} location to classify
+TARGETS = {
+    'rides': 'pickup_location',
+    'ride_history': 'pickup_location',
+    'available_rides': 'location',
+}
+
+
+def backfill_collection(collection, field, version, chunk_size=5000):
+    """Reclassify one collection, returning (scanned, changed)"""
+    scanned = changed = 0
+    cursor = collection.find(
+        {'sector_version': {'$ne': version}, f'{field}.coordinates': {'$exists': True}},
+        {field: 1, 'sector': 1}
+    )
+
+    def flush(chunk):
+        points = [GeoUtils.location_lat_lng(doc.get(field)) for doc in chunk]
+        sectors = GeoUtils.get_sectors_from_coordinates(
+            [lat if lat is not None else float('nan') for lat, _ in points],
+            [lng if lng is not None else float('nan') for _, lng in points]
+        )
+        operations = []
+        modified = 0
+        for doc, sector in zip(chunk, sectors):
+            # Keep a previously stored sector for points outside every known sector
+            if sector == SectorIndex.UNKNOWN and doc.get('sector'):
+                sector = doc['sector']
+            modified += sector != doc.get('sector')
+            operations.append(UpdateOne(
+                {'_id': doc['_id']},
+                {'$set': {'sector': sector, 'sector_version': version}}
+            ))
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+        return modified
+
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            changed += flush(chunk)
+            scanned += len(chunk)
+            chunk = []
+    if chunk:
+        changed += flush(chunk)
+        scanned += len(chunk)
+
+    return scanned, changed
+
+
+def main():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    mongo.init_app(app)
+
+    with app.app_context():
+        SectorIndex.load_default(app.config.get('SECTOR_DATA_FILE'))
+        version = GeoUtils.sector_version()
+        for name, field in TARGETS.items():
+            scanned, changed = backfill_collection(mongo.db[name], field, version)
+            print(f'{name}: {scanned} scanned, {changed} sectors changed (geometry v{version})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""Every test runs against an empty in-memory database in place of MongoDB."""
+import pytest
+
+from app import mongo
+from app.models.ride_index import RideIndex
+from app.utils.nlp_processor import NLPProcessor
+from benchmarks.memory_mongo import Database
+
+# NLTK's stopword corpus is a download; keyword extraction only needs a fixed list here
+NLPProcessor._stop_words = frozenset(
+    'i me my we our you the and a an to of in on at for with is are was love like enjoy really'.split()
+)
+
+
+@pytest.fixture(autouse=True)
+def db():
+    mongo.db = Database()
+    with RideIndex._lock:
+        RideIndex._rides, RideIndex._points, RideIndex._buckets, RideIndex._sectors = {}, {}, {}, {}
+        RideIndex.ready = False
+    yield mongo.db
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app import mongo
+from app.models.dispatch import Dispatch
+from app.models.ride import Ride
+from app.models.ride_index import RideIndex
+from app.utils.dispatch_solver import DispatchSolver
+from app.utils.geo_utils import GeoUtils
+
+
+def location(lat, lng):
+    return {'address': 'Test', 'coordinates': {'latitude': lat, 'longitude': lng}}
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_solver_never_overbooks(seed):
+    rng = np.random.default_rng(seed)
+    # Far more seats asked for than offered, all within pickup range of each other
+    riders = np.column_stack((33.60 + rng.random(300) * 0.03, 73.00 + rng.random(300) * 0.03))
+    starts = np.column_stack((33.60 + rng.random(25) * 0.03, 73.00 + rng.random(25) * 0.03))
+    ends = starts + 0.02
+    seats = rng.choice([1, 1, 2, 3], 300)
+    slots = rng.integers(1, 5, 25)
+    rider_types = rng.choice([None, 'Basic', 'SUV'], 300).tolist()
+    ride_types = rng.choice(['Basic', 'SUV'], 25).tolist()
+    excluded = {(int(rider), int(ride)) for rider, ride in zip(rng.integers(0, 300, 40), rng.integers(0, 25, 40))}
+
+    solver = DispatchSolver(max_pickup_km=3, max_detour_km=5)
+    assignments = solver.solve(riders, seats, rider_types, starts, ends, slots, ride_types, excluded)
+
+    assert assignments
+    used = np.zeros(25, dtype=int)
+    placed = set()
+    for rider, ride, detour in assignments:
+        assert rider not in placed
+        placed.add(rider)
+        assert (rider, ride) not in excluded
+        assert rider_types[rider] in (None, ride_types[ride])
+        assert GeoUtils._haversine(*riders[rider], *starts[ride]) <= 3 + 1e-9
+        assert detour <= 5 + 1e-9
+        used[ride] += seats[rider]
+    assert (used <= slots).all()
+
+
+class CancellingSolver:
+    """Runs the real solver, then lets riders change their minds before seats are reserved"""
+
+    def __init__(self, solver, during_solve):
+        self.solver = solver
+        self.during_solve = during_solve
+
+    def solve(self, *args, **kwargs):
+        assignments = self.solver.solve(*args, **kwargs)
+        self.during_solve()
+        return assignments
+
+
+def test_reserve_skips_intents_cancelled_or_resubmitted_during_the_window(monkeypatch):
+    Dispatch.ensure_indexes()
+    ride_id = Ride.create({
+        'creator_user_id': 'driver',
+        'pickup_location': location(33.600, 73.000),
+        'dropoff_location': location(33.650, 73.050),
+        'passenger_slots': 3,
+        'car_type': 'Basic'
+    })
+    RideIndex.reconcile()
+    for user_id, lng in (('stays', 73.001), ('cancels', 73.002), ('resubmits', 73.003)):
+        Dispatch.submit(user_id, location(33.601, lng))
+
+    def change_minds():
+        assert Dispatch.cancel('cancels')
+        Dispatch.submit('resubmits', location(33.610, 73.010))
+
+    monkeypatch.setattr(Dispatch, 'SOLVER', CancellingSolver(Dispatch.SOLVER, change_minds))
+    stats = Dispatch.run_window()
+
+    assert [user_id for user_id, _, _ in stats['assignments']] == ['stays']
+    assert [p['user_id'] for p in mongo.db.ride_passengers.find({'ride_id': ride_id})] == ['stays']
+    available = mongo.db.available_rides.find_one({'ride_id': ride_id})
+    assert available['passenger_slots'] == 2
+    assert available['active']
+    assert RideIndex._rides[ride_id]['passenger_slots'] == 2
+
+    statuses = {intent['user_id']: intent['status'] for intent in mongo.db.join_intents.find()}
+    assert statuses == {'stays': 'assigned', 'cancels': 'cancelled', 'resubmits': 'pending'}
+    # The changed request is served by the next window from its new pickup
+    resubmitted = Dispatch.get_latest('resubmits')
+    assert resubmitted['pickup_location'] == location(33.610, 73.010)
+    monkeypatch.setattr(Dispatch, 'SOLVER', DispatchSolver())
+    assert [user_id for user_id, _, _ in Dispatch.run_window()['assignments']] == ['resubmits']
+    assert mongo.db.available_rides.find_one({'ride_id': ride_id})['passenger_slots'] == 1
@@ -0,0 +1,58 @@
+import pytest
+
+from app import mongo
+from app.models.match import Match
+
+
+@pytest.fixture
+def users():
+    Match.ensure_indexes()
+    descriptions = {
+        'alice': 'hiking chess photography',
+        'bob': 'hiking climbing mountains',
+        'carol': 'chess poker nights'
+    }
+    for user_id, description in descriptions.items():
+        Match.store_hobbies(user_id, description, recompute_self=False)
+    return {entry['user_id']: set(entry['keyword_ids']) for entry in mongo.db.user_hobbies.find()}
+
+
+def stored_matches(user_id):
+    entry = mongo.db.user_best_matches.find_one({'user_id': user_id})
+    return None if entry is None else {m['matched_user_id']: m['similarity_score'] for m in entry['matches']}
+
+
+def test_reverse_matches_skip_users_without_a_stored_list(users):
+    Match.compute_matches('bob')
+    assert 'carol' not in Match.get_candidate_user_ids('alice', users['bob'])
+
+    Match.update_reverse_matches('alice', ['bob', 'carol'])
+
+    # carol shares chess with alice but was never computed; a one-entry list would pass for complete
+    assert stored_matches('carol') is None
+    shared = users['alice'] & users['bob']
+    assert stored_matches('bob') == {'alice': pytest.approx(len(shared) / len(users['alice'] | users['bob']))}
+
+
+def test_reverse_matches_drop_a_user_who_no_longer_shares_anything(users):
+    Match.compute_matches('bob')
+    assert 'alice' in stored_matches('bob')
+
+    Match.store_hobbies('alice', 'poker nights', recompute_self=False)
+    Match.update_reverse_matches('alice', ['bob'])
+
+    assert stored_matches('bob') == {}
+
+
+def test_term_postings_follow_keyword_changes(users):
+    postings = mongo.db.hobby_term_postings
+    assert postings.count_documents({'user_id': 'alice'}) == len(users['alice'])
+    assert Match.get_candidate_user_ids('alice', users['alice']) == {'bob', 'carol'}
+
+    Match.store_hobbies('alice', 'poker nights', recompute_self=False)
+    alice = set(mongo.db.user_hobbies.find_one({'user_id': 'alice'})['keyword_ids'])
+
+    assert {p['term_id'] for p in postings.find({'user_id': 'alice'})} == alice
+    assert Match.get_candidate_user_ids('alice', alice) == {'carol'}
+    # One document per term and user; nothing holds a growing array of users
+    assert postings.find_one({'user_ids': {'$exists': True}}) is None
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from app.utils.road_graph import RoadGraph, METRES_PER_DEGREE
+
+
+def grid_graph(seed, size=14, step=0.001):
+    """A street grid with random speeds, some one-way streets and some missing blocks"""
+    rng = np.random.default_rng(seed)
+    lats, lngs = np.meshgrid(33.6 + np.arange(size) * step, 73.0 + np.arange(size) * step, indexing='ij')
+    coords = np.column_stack((lats.ravel(), lngs.ravel()))
+    sources, targets = [], []
+    for row in range(size):
+        for column in range(size):
+            node = row * size + column
+            for neighbour in ((node + 1) if column + 1 < size else None, (node + size) if row + 1 < size else None):
+                if neighbour is None or rng.random() < 0.1:
+                    continue
+                direction = rng.random()
+                if direction < 0.85:
+                    sources += [node, neighbour]
+                    targets += [neighbour, node]
+                elif direction < 0.93:
+                    sources.append(node)
+                    targets.append(neighbour)
+                else:
+                    sources.append(neighbour)
+                    targets.append(node)
+    sources, targets = np.array(sources), np.array(targets)
+    metres = np.full(len(sources), step * METRES_PER_DEGREE) * rng.uniform(1.0, 1.3, len(sources))
+    seconds = metres / rng.uniform(5, 25, len(sources))
+    return RoadGraph._compact(coords, sources, targets, metres, seconds)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_hierarchy_distances_match_a_star(seed):
+    graph = grid_graph(seed)
+    hierarchy = graph.contract()
+    rng = np.random.default_rng(seed)
+    for source, target in rng.integers(0, len(graph), (150, 2)):
+        expected = graph.shortest_path(int(source), int(target))
+        found = hierarchy.shortest_path(int(source), int(target))
+        assert found is not None and expected is not None
+        assert found[1] == pytest.approx(expected[1], rel=1e-4)
+        assert found[0] == pytest.approx(expected[0], rel=1e-4)
+
+
+@pytest.mark.parametrize('contracted', [False, True])
+def test_distance_table_matches_pairwise_routes(contracted):
+    graph = grid_graph(7)
+    if contracted:
+        graph = graph.contract()
+    nodes = [int(node) for node in np.random.default_rng(7).choice(len(graph), 12, replace=False)]
+
+    metres, seconds = graph.distance_table(nodes, nodes[:8])
+
+    assert metres.shape == seconds.shape == (12, 8)
+    for row, source in enumerate(nodes):
+        for column, target in enumerate(nodes[:8]):
+            expected_metres, expected_seconds = graph.shortest_path(source, target)
+            assert seconds[row, column] == pytest.approx(expected_seconds, rel=1e-4, abs=1e-6)
+            assert metres[row, column] == pytest.approx(expected_metres, rel=1e-4, abs=1e-6)
@@ -0,0 +1,75 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from app.utils.route_optimizer import RouteOptimizer
+
+
+def brute_force(matrix, has_end):
+    """Shortest length over every ordering of the stops"""
+    size = matrix.shape[0]
+    stops = range(1, size - 1 if has_end else size)
+    orders = np.array(list(itertools.permutations(stops)))
+    columns = [np.zeros((len(orders), 1), dtype=int), orders]
+    if has_end:
+        columns.append(np.full((len(orders), 1), size - 1))
+    paths = np.hstack(columns)
+    return float(matrix[paths[:, :-1], paths[:, 1:]].sum(axis=1).min())
+
+
+def road_matrix(rng, nodes):
+    """Straight-line distances scaled by an asymmetric detour factor, like road legs"""
+    points = rng.random((nodes, 2)) * 10
+    straight = np.hypot(*(points[:, None] - points[None]).transpose(2, 0, 1))
+    return straight * rng.uniform(1.0, 1.4, (nodes, nodes))
+
+
+def path_of(order, matrix, has_end):
+    return [0] + list(order) + ([matrix.shape[0] - 1] if has_end else [])
+
+
+@pytest.mark.parametrize('has_end', [True, False])
+@pytest.mark.parametrize('stops', range(2, 8))
+def test_exhaustive_search_finds_the_optimum(stops, has_end):
+    optimizer = RouteOptimizer()
+    for seed in range(5):
+        matrix = road_matrix(np.random.default_rng(seed), stops + 1 + has_end)
+        order, length = optimizer.optimize(matrix, has_end=has_end)
+
+        assert sorted(order) == list(range(1, stops + 1))
+        assert length == pytest.approx(RouteOptimizer.path_length(matrix, path_of(order, matrix, has_end)))
+        assert length == pytest.approx(brute_force(matrix, has_end))
+
+
+@pytest.mark.parametrize('has_end', [True, False])
+def test_local_search_stays_close_to_the_optimum(has_end):
+    # A generous budget so the result doesn't depend on machine speed
+    optimizer = RouteOptimizer(time_budget_ms=10000)
+    for seed in range(10):
+        matrix = road_matrix(np.random.default_rng(seed), 9 + has_end)
+        order, length = optimizer.optimize(matrix, has_end=has_end)
+
+        assert sorted(order) == list(range(1, 9))
+        assert length == pytest.approx(RouteOptimizer.path_length(matrix, path_of(order, matrix, has_end)))
+        assert length <= brute_force(matrix, has_end) * 1.2
+
+
+@pytest.mark.parametrize('has_end', [True, False])
+def test_insertion_costs_match_recomputed_paths(has_end):
+    rng = np.random.default_rng(3)
+    # Node 0 is the start, then four stops, the end when has_end, and the new stop last
+    matrix = road_matrix(rng, 7)
+    path = list(range(5 + has_end))
+    new = 6
+    legs = [matrix[a, b] for a, b in zip(path, path[1:])]
+    to_new = [matrix[node, new] for node in path[:5]]
+    from_new = [matrix[new, node] for node in path[1:]]
+
+    added = RouteOptimizer.insertion_costs(legs, to_new, from_new, has_end)
+
+    assert len(added) == 5
+    base = RouteOptimizer.path_length(matrix, path)
+    for position, cost in enumerate(added):
+        inserted = path[:position + 1] + [new] + path[position + 1:]
+        assert cost == pytest.approx(RouteOptimizer.path_length(matrix, inserted) - base)
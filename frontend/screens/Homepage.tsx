@@ -97,7 +97,7 @@ const AvailableRidesSection = ({ rides, onPressRide }: any) => {
                   resizeMode="contain"
                 />
                 <Text style={styles.detailText} numberOfLines={1}>
-                  {item.location.address}
+                  {item.location?.address}
                 </Text>
               </View>
             </View>
@@ -31,12 +31,11 @@ interface Ride {
   fare: number | null;
   distance: number | null;
   group_join: boolean;
-  location: {
+  // GeoJSON point ([longitude, latitude]); missing when the pickup had no coordinates
+  location?: {
+    type: 'Point';
+    coordinates: [number, number];
     address: string;
-    coordinates: {
-      latitude: number;
-      longitude: number;
-    };
   };
   created_at: string;
 }
@@ -82,7 +81,7 @@ const JoinRide: React.FC = () => {
     const filtered = rides.filter(
       (ride) =>
         ride.creator_name.toLowerCase().includes(text.toLowerCase()) ||
-        ride.location.address.toLowerCase().includes(text.toLowerCase()) ||
+        (ride.location?.address || '').toLowerCase().includes(text.toLowerCase()) ||
         ride.car_type.toLowerCase().includes(text.toLowerCase())
     );
     setFilteredRides(filtered);
@@ -144,7 +143,7 @@ const JoinRide: React.FC = () => {
             resizeMode="contain"
           />
           <Text style={styles.detailText} numberOfLines={1}>
-            {item.location.address}
+            {item.location?.address}
           </Text>
         </View>
       </View>
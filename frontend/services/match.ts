@@ -12,7 +12,20 @@ export interface Companion {
 
 export interface ProcessHobbiesResponse {
   message: string;
-  keywords: string[];
+  job_id: string;
+  status: string;
+}
+
+export interface MatchStatus {
+  job_id?: string;
+  status: 'none' | 'pending' | 'running' | 'done' | 'failed';
+  submissions?: number;
+  requested_at?: string | null;
+  started_at?: string | null;
+  finished_at?: string | null;
+  keywords?: string[];
+  match_count?: number;
+  error?: string | null;
 }
 
 export const MatchService = {
@@ -34,5 +47,15 @@ export const MatchService = {
       console.error('Error processing hobbies:', error);
       throw error;
     }
+  },
+
+  async getMatchStatus(): Promise<MatchStatus> {
+    try {
+      const response = await api.get('/matches/status');
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching match status:', error);
+      throw error;
+    }
   }
 };
\ No newline at end of file
@@ -55,6 +55,12 @@ export const RideService = {
     return response.data;
   },
   
+  async getNearbyRides(lat: number, lng: number, radius: number = 5, limit: number = 20, offset: number = 0) {
+    // radius is in kilometres; next_offset is null on the last page
+    const response = await api.get('/rides/nearby', { params: { lat, lng, radius, limit, offset } });
+    return response.data;
+  },
+  
   async joinRide(data: JoinRideForm) {
     const response = await api.post('/rides/join', data);
     return response.data;